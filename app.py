@@ -8,6 +8,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from concurrent.futures import ProcessPoolExecutor
 from utils.calculos import (
     calcular_emisiones_materias_primas,
     calcular_emisiones_empaques,
@@ -18,9 +19,34 @@ from utils.calculos import (
     calcular_emisiones_residuos,
     exportar_resultados_excel,
     obtener_factor,
-    calcular_emisiones_detalladas_completas
+    calcular_balance_masa
 )
 from utils.units import convertir_unidad, formatear_numero, obtener_unidades_disponibles
+from utils.motor import (
+    ETAPAS,
+    HORIZONTES_GWP,
+    ORIGENES_CARBONO,
+    desglose_gwp_por_etapa,
+    detectar_categorias_impacto,
+    leer_factores,
+    preparar_matriz_factores,
+    tiene_desglose_gwp,
+    totales_coproductos
+)
+from utils.modelo_lineal import compilar_partidas, contribuciones
+from utils.escenarios import evaluar_escenarios
+from utils.sensibilidad import indices_sobol
+from utils.montecarlo import simular_montecarlo
+from utils.incertidumbre import propagar_incertidumbre
+from utils.muestreo import METODOS_MUESTREO, simular_adaptativo
+from utils.optimizacion import DECISIONES_SUSTITUCION, frontera_pareto
+from utils.cache_resultados import abrir_cache, calcular_resultado_con_cache, estadisticas_cache
+from utils.versiones_factores import abrir_historial, cargar_version, listar_versiones, registrar_version
+from utils.regiones import REGION_PADRE
+from utils.perfiles_horarios import PERFILES_CARGA, cargar_perfiles
+from utils.coproductos import METODOS_ASIGNACION
+from utils.lineas import compactar_lineas
+from utils.figuras import crear_cache_figuras, obtener_figura
 
 # Configuración de la página
 st.set_page_config(
@@ -70,6 +96,9 @@ def inicializar_session_state():
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
+    
+    # Las líneas editadas en la ejecución anterior se guardan como registros compactos
+    compactar_lineas(st.session_state)
 
 inicializar_session_state()
 
@@ -84,14 +113,18 @@ def validar_coherencia_datos():
         any(mp.get('producto') for mp in st.session_state.materias_primas)):
         
         peso_producto_kg = st.session_state.producto.get('peso_neto_kg', 0)
-        total_mp_usadas_kg = sum(mp.get('cantidad_teorica_kg', 0) for mp in st.session_state.materias_primas if mp.get('producto'))
+        balance = calcular_balance_masa(
+            st.session_state.materias_primas,
+            st.session_state.empaques,
+            st.session_state.producto,
+            st.session_state.produccion,
+            tolerancia_pct=10
+        )
         
-        if peso_producto_kg > 0 and total_mp_usadas_kg > 0:
-            diferencia = abs(peso_producto_kg - total_mp_usadas_kg)
-            porcentaje_diferencia = (diferencia / max(peso_producto_kg, total_mp_usadas_kg)) * 100
-            
-            if porcentaje_diferencia > 10:
-                alertas.append(f"📊 **Incoherencia en pesos:** Producto {formatear_numero(peso_producto_kg)} kg vs MP {formatear_numero(total_mp_usadas_kg)} kg ({porcentaje_diferencia:.1f}% diferencia)")
+        if peso_producto_kg > 0 and balance['entradas']['total_entradas_kg'] > 0 and not balance['cierra']:
+            alertas.append(f"📊 **Balance de masa no cierra:** Entradas {formatear_numero(balance['entradas']['total_entradas_kg'])} kg "
+                           f"vs salidas {formatear_numero(balance['salidas']['total_salidas_kg'])} kg "
+                           f"({abs(balance['error_cierre_pct']):.1f}% error de cierre)")
     
     return alertas
 
@@ -99,12 +132,8 @@ def validar_coherencia_datos():
 @st.cache_data
 def cargar_factores():
     try:
-        factores = pd.read_csv('data/factors.csv')
-        # Asegurarnos de que la columna factor_kgCO2e_per_unit sea numérica
-        factores['factor_kgCO2e_per_unit'] = pd.to_numeric(factores['factor_kgCO2e_per_unit'], errors='coerce')
-        # Llenar valores NaN con valores por defecto
-        factores['factor_kgCO2e_per_unit'] = factores['factor_kgCO2e_per_unit'].fillna(1.0)
-        return factores
+        # Columnas de impacto numéricas (GWP sin dato = 1.0; otras categorías sin dato = sin aporte)
+        return leer_factores('data/factors.csv')
     except FileNotFoundError:
         st.error("No se encontró el archivo de factores. Usando valores por defecto.")
         return pd.DataFrame({
@@ -128,6 +157,49 @@ def cargar_factores():
 
 factores = cargar_factores()
 
+# Caché de resultados en disco, compartida por todas las sesiones
+@st.cache_resource
+def obtener_cache_resultados():
+    return abrir_cache()
+
+# Figuras de la pestaña de resultados por resultado, compartidas por todas las sesiones
+@st.cache_resource
+def obtener_cache_figuras():
+    return crear_cache_figuras()
+
+# Matriz de cada versión de factores, compartida por todas las sesiones: el modelo lineal,
+# los escenarios y el optimizador de un resultado usan la de la versión con la que se calculó
+@st.cache_resource(max_entries=8)
+def matriz_de_version(version, _factores_df):
+    return preparar_matriz_factores(_factores_df)
+
+# Modelo lineal de un resultado para los análisis: se compila desde la tabla del resultado
+# al usarlo y se comparte entre las sesiones con el mismo resultado (clave del producto + factores)
+@st.cache_resource(max_entries=32)
+def modelo_de_resultado(clave, _resultado, _matriz_factores):
+    return compilar_partidas(_resultado.partidas(), _matriz_factores)
+
+# Pool de procesos de Monte Carlo compartido por todas las sesiones: el número de
+# procesos del servidor no crece con el número de personas que simulan a la vez
+PROCESOS_MONTECARLO = 2
+
+@st.cache_resource
+def obtener_ejecutor_montecarlo():
+    return ProcessPoolExecutor(max_workers=PROCESOS_MONTECARLO)
+
+# Historial de versiones de la tabla de factores (por hash de contenido)
+@st.cache_resource
+def obtener_historial_factores():
+    return abrir_historial()
+
+@st.cache_data
+def factores_de_version(version):
+    return cargar_version(obtener_historial_factores(), version)
+
+historial_factores = obtener_historial_factores()
+version_factores_actual = registrar_version(historial_factores, factores, origen='data/factors.csv')
+version_factores_en_uso = version_factores_actual
+
 # Función para obtener opciones de cada categoría
 def obtener_opciones_categoria(categoria):
     try:
@@ -137,6 +209,35 @@ def obtener_opciones_categoria(categoria):
         print(f"Error obteniendo opciones para {categoria}: {str(e)}")
         return []
 
+# Países y regiones seleccionables ('' = sin especificar: factor sin respaldo regional)
+opciones_regiones = [''] + list(dict.fromkeys(list(REGION_PADRE) + factores['region'].dropna().astype(str).tolist()))
+
+# Perfiles horarios de intensidad de la red (data/perfiles_horarios.npy, mapeado en memoria)
+perfiles_horarios = cargar_perfiles()
+
+def selector_perfiles_horarios(datos_energia, clave):
+    """Perfil horario de red y de carga de un consumo eléctrico (solo si hay perfiles de red guardados)"""
+    if not perfiles_horarios['nombres']:
+        return
+    opciones_red = [''] + perfiles_horarios['nombres']
+    opciones_carga = [''] + list(PERFILES_CARGA) + perfiles_horarios['nombres']
+    red_actual, carga_actual = datos_energia.get('perfil_red', ''), datos_energia.get('perfil_carga', '')
+    datos_energia['perfil_red'] = st.selectbox(
+        "**Perfil horario de la red**",
+        options=opciones_red,
+        format_func=lambda p: p or "Factor anual",
+        index=opciones_red.index(red_actual) if red_actual in opciones_red else 0,
+        key=f"perfil_red_{clave}"
+    )
+    datos_energia['perfil_carga'] = st.selectbox(
+        "**Perfil de carga**",
+        options=opciones_carga,
+        format_func=lambda p: p or "Sin perfil",
+        index=opciones_carga.index(carga_actual) if carga_actual in opciones_carga else 0,
+        key=f"perfil_carga_{clave}",
+        help="Horas en que se consume la energía: la intensidad de la red se pondera por este perfil"
+    )
+
 # =============================================================================
 # NUEVO SISTEMA DE NAVEGACIÓN SUPERIOR - CON PESTAÑAS
 # =============================================================================
@@ -144,6 +245,21 @@ def obtener_opciones_categoria(categoria):
 st.sidebar.title("🌍 Calculadora de Huella de Carbono")
 st.sidebar.markdown("---")
 
+# Fijar una versión anterior de los factores para reproducir un cálculo
+versiones_factores = listar_versiones(historial_factores)
+if len(versiones_factores) > 1:
+    descripcion_versiones = {
+        fila.version: f"{fila.version[:8]} · {fila.fecha}" + (" (actual)" if fila.version == version_factores_actual else "")
+        for fila in versiones_factores.itertuples()
+    }
+    version_factores_en_uso = st.sidebar.selectbox(
+        "📌 Versión de factores", list(descripcion_versiones),
+        index=list(descripcion_versiones).index(version_factores_actual),
+        format_func=descripcion_versiones.get, key='version_factores_fijada')
+    if version_factores_en_uso != version_factores_actual:
+        factores = factores_de_version(version_factores_en_uso)
+        st.sidebar.caption("Se está usando una versión anterior de los factores")
+
 # Mostrar alertas globales en el sidebar
 alertas_globales = validar_coherencia_datos()
 if alertas_globales:
@@ -444,6 +560,17 @@ with tabs[1]:
                 )
                 st.session_state.producto['unidad_empaque'] = unidad_empaque
             
+            # Año de producción: factores vigentes ese año (0 = primera versión de cada factor)
+            st.session_state.producto['anio'] = int(st.number_input(
+                "**Año de producción**",
+                min_value=0,
+                max_value=2100,
+                value=int(st.session_state.producto.get('anio', 0) or 0),
+                step=1,
+                help="0 = sin año: se usa la primera versión de cada factor en factors.csv",
+                key="anio_produccion_input"
+            ))
+            
             # Convertir a kg para cálculos internos (SIEMPRE hacerlo)
             st.session_state.producto['peso_neto_kg'] = convertir_unidad(peso_neto, unidad_peso, 'kg')
             st.session_state.producto['peso_empaque_kg'] = convertir_unidad(peso_empaque, unidad_empaque, 'kg')
@@ -551,6 +678,16 @@ with tabs[2]:
                         index=0
                     )
                     
+                    # País o región de origen (factor regional con respaldo a región y Global)
+                    region_origen = st.selectbox(
+                        f"**Origen (país o región)**",
+                        options=opciones_regiones,
+                        format_func=lambda r: r or "Sin especificar",
+                        key=f"region_{i}",
+                        index=opciones_regiones.index(st.session_state.materias_primas[i].get('region', ''))
+                        if st.session_state.materias_primas[i].get('region', '') in opciones_regiones else 0
+                    )
+                    
                     # Cantidad TEÓRICA (usada en el producto)
                     st.write("**Cantidad USADA en el producto (teórica):**")
                     col_teo1, col_teo2 = st.columns(2)
@@ -661,6 +798,7 @@ with tabs[2]:
                 
                 # Guardar datos principales (en kg para cálculos)
                 st.session_state.materias_primas[i]['producto'] = producto_seleccionado
+                st.session_state.materias_primas[i]['region'] = region_origen
                 st.session_state.materias_primas[i]['cantidad_teorica'] = cantidad_teorica
                 st.session_state.materias_primas[i]['unidad_teorica'] = unidad_teorica
                 st.session_state.materias_primas[i]['cantidad_teorica_kg'] = convertir_unidad(cantidad_teorica, unidad_teorica, 'kg')
@@ -1226,6 +1364,15 @@ with tabs[6]:
                     options=opciones_energia,
                     index=indice_actual
                 )
+                
+                region_actual = st.session_state.produccion.get('region', '')
+                st.session_state.produccion['region'] = st.selectbox(
+                    "**País o región de la planta**",
+                    options=opciones_regiones,
+                    format_func=lambda r: r or "Sin especificar",
+                    index=opciones_regiones.index(region_actual) if region_actual in opciones_regiones else 0
+                )
+                selector_perfiles_horarios(st.session_state.produccion, 'produccion')
             
             with col2:
                 # CONSUMO DE AGUA - FORMATEO MEJORADO
@@ -1249,6 +1396,64 @@ with tabs[6]:
                 # Mostrar el valor formateado para feedback visual
                 if agua_input > 0:
                     st.caption(f"Valor actual: {formatear_numero(agua_input)} m³")
+                
+                # Pérdidas sin emisiones (evaporación, humedad) para el balance de masa
+                perdidas_input = st.number_input(
+                    "**Pérdidas sin emisiones (kg)**",
+                    min_value=0.0,
+                    value=float(st.session_state.produccion.get('perdidas_sin_emisiones_kg', 0.0)),
+                    format="%.10g",
+                    step=0.0000000001,
+                    help="Masa perdida sin gestión de residuos, p. ej. evaporación durante el horneado",
+                    key="perdidas_produccion_input"
+                )
+                st.session_state.produccion['perdidas_sin_emisiones_kg'] = perdidas_input
+            
+            # COPRODUCTOS: reparto de las etapas compartidas (por unidad del producto principal)
+            with st.expander("🧀 **Coproductos del proceso (opcional)**"):
+                coproductos = st.session_state.get('coproductos') or {'metodo': 'masa', 'lista': []}
+                coproductos['metodo'] = st.selectbox(
+                    "**Método de asignación**",
+                    options=list(METODOS_ASIGNACION),
+                    format_func=METODOS_ASIGNACION.get,
+                    index=list(METODOS_ASIGNACION).index(coproductos.get('metodo', 'masa')),
+                    key="metodo_coproductos"
+                )
+                if coproductos['metodo'] == 'economica':
+                    st.session_state.producto['precio_kg'] = st.number_input(
+                        "**Precio del producto principal (por kg)**",
+                        min_value=0.0,
+                        value=float(st.session_state.producto.get('precio_kg', 0.0)),
+                        key="precio_producto_kg"
+                    )
+                num_coproductos = st.number_input("**Número de coproductos**", min_value=0, max_value=20,
+                                                  value=len(coproductos['lista']), step=1, key="num_coproductos")
+                lista = (coproductos['lista'] + [{} for _ in range(num_coproductos)])[:num_coproductos]
+                for j, coproducto in enumerate(lista):
+                    col_cp1, col_cp2, col_cp3 = st.columns(3)
+                    with col_cp1:
+                        coproducto['nombre'] = st.text_input("Nombre", value=coproducto.get('nombre', f'Coproducto {j+1}'),
+                                                             key=f"coproducto_nombre_{j}")
+                    with col_cp2:
+                        coproducto['masa_kg'] = st.number_input("Masa (kg)", min_value=0.0,
+                                                                value=float(coproducto.get('masa_kg', 0.0)),
+                                                                key=f"coproducto_masa_{j}")
+                    with col_cp3:
+                        if coproductos['metodo'] == 'economica':
+                            coproducto['precio_kg'] = st.number_input("Precio por kg", min_value=0.0,
+                                                                      value=float(coproducto.get('precio_kg', 0.0)),
+                                                                      key=f"coproducto_precio_{j}")
+                        elif coproductos['metodo'] == 'sustitucion':
+                            opciones_sustituidos = obtener_opciones_categoria('materia_prima')
+                            actual = coproducto.get('item_sustituido')
+                            coproducto['item_sustituido'] = st.selectbox(
+                                "Producto sustituido",
+                                options=opciones_sustituidos,
+                                index=opciones_sustituidos.index(actual) if actual in opciones_sustituidos else 0,
+                                key=f"coproducto_sustituido_{j}"
+                            )
+                coproductos['lista'] = lista
+                st.session_state.coproductos = coproductos
                  
             # SECCIÓN 2: GESTIÓN DE MERMAS (AUTOMÁTICA DESDE PÁGINA 2)
             st.subheader("📊 Gestión de Mermas")
@@ -1453,12 +1658,15 @@ with tabs[6]:
                     st.success("✅ Eficiencia dentro de rangos razonables")
             
             # Balance de masa
-            total_entradas_kg = total_mp_usadas_kg
-            total_salidas_kg = peso_producto_kg + sum(m['merma_kg'] for m in mermas_calculadas)
-            
-            diferencia_balance = total_entradas_kg - total_salidas_kg
-            if abs(diferencia_balance) > 0.001:  # Tolerancia de 1g
-                st.warning(f"⚠️ Desbalance de masa: {formatear_numero(diferencia_balance)} kg")
+            balance = calcular_balance_masa(
+                st.session_state.materias_primas,
+                st.session_state.empaques,
+                st.session_state.producto,
+                st.session_state.produccion
+            )
+            if not balance['cierra']:
+                st.warning(f"⚠️ Desbalance de masa: {formatear_numero(balance['error_cierre_kg'])} kg "
+                           f"({balance['error_cierre_pct']:.1f}% de las entradas)")
             
             if st.form_submit_button("💾 **Guardar Datos de Producción**", type="primary"):
                 st.success("✅ **Datos de producción guardados correctamente**")
@@ -1862,6 +2070,8 @@ with tabs[8]:
                 except Exception as e:
                     st.error(f"❌ Error al guardar configuración: {str(e)}")
         
+        selector_perfiles_horarios(st.session_state.retail, 'retail')
+        
         # Mostrar resumen si hay datos
         if st.session_state.retail.get('emisiones_estimadas') is not None:
             st.markdown("---")
@@ -2080,7 +2290,7 @@ with tabs[9]:
                     cantidad = empaque.get('cantidad', 1)
                     peso_total_kg = peso_unitario_kg * cantidad
                     
-                    emisiones = calcular_emisiones_residuos(peso_total_kg, factores, porcentajes)
+                    emisiones = calcular_emisiones_residuos(peso_total_kg, factores, porcentajes, empaque.get('material'))
                     emisiones_totales_fin_vida += emisiones
                     
                     # Mostrar emisiones estimadas
@@ -2215,19 +2425,40 @@ with tabs[10]:
                         if not st.session_state.materias_primas or not any(mp.get('producto') for mp in st.session_state.materias_primas):
                             st.error("❌ Debe ingresar al menos una materia prima en la página 2")
                         else:
-                            # Ejecutar cálculos DETALLADOS usando la nueva función
-                            emisiones_totales, desglose_detallado = calcular_emisiones_detalladas_completas(st.session_state, factores)
+                            # Todas las categorías de impacto en una sola pasada del motor vectorizado
+                            # Si el mismo producto ya se calculó con estos factores, se reutiliza la tabla guardada
+                            # (con las vistas del detalle por etapa ya agrupadas)
+                            cache_resultados = obtener_cache_resultados()
+                            matriz_factores = matriz_de_version(version_factores_en_uso, factores)
+                            clave_calculo, resultado = calcular_resultado_con_cache(
+                                cache_resultados, st.session_state, factores, version_factores_en_uso, matriz_factores)
+                            
+                            # Reparto entre coproductos (GWP por etapa de cada uno)
+                            tabla_coproductos = None
+                            if (st.session_state.get('coproductos') or {}).get('lista'):
+                                nombres_coproductos, repartidos = totales_coproductos(st.session_state, factores,
+                                                                                      matriz_factores)
+                                tabla_coproductos = pd.DataFrame(repartidos[:, :, 0], index=nombres_coproductos,
+                                                                 columns=ETAPAS)
                             
-                            # Guardar resultados en session_state
+                            # Guardar resultados en session_state: la tabla del resultado es la única copia
+                            # por partida (el modelo lineal de los análisis se compila desde ella al usarlo)
                             st.session_state.resultados_calculados = {
-                                'emisiones_totales': emisiones_totales,
-                                'desglose_detallado': desglose_detallado,
+                                'resultado': resultado,
+                                'tabla_coproductos': tabla_coproductos,
+                                'categorias_impacto': detectar_categorias_impacto(factores),
                                 'fecha_calculo': pd.Timestamp.now(),
+                                'version_factores': version_factores_en_uso,
+                                'clave_resultado': clave_calculo,
                                 'producto_nombre': st.session_state.producto['nombre'],
                                 'peso_producto_kg': st.session_state.producto.get('peso_neto_kg', 0)
                             }
                             
-                            st.success(f"✅ Cálculos completados: {formatear_numero(emisiones_totales, 4)} kg CO₂e")
+                            st.success(f"✅ Cálculos completados: {formatear_numero(resultado.total(), 4)} kg CO₂e")
+                            estadisticas = estadisticas_cache(cache_resultados)
+                            st.caption(f"Caché de resultados: {estadisticas['aciertos_acumulados']} aciertos, "
+                                       f"{estadisticas['fallos_acumulados']} fallos "
+                                       f"({estadisticas['tasa_aciertos_acumulada']:.0%} de aciertos)")
                             
                 except Exception as e:
                     st.error(f"❌ Error en los cálculos: {str(e)}")
@@ -2242,9 +2473,16 @@ with tabs[10]:
         # Mostrar resultados si existen
         if 'resultados_calculados' in st.session_state:
             resultados = st.session_state.resultados_calculados
-            emisiones_totales = resultados['emisiones_totales']
-            desglose_detallado = resultados['desglose_detallado']
             peso_producto_kg = resultados['peso_producto_kg']
+            # La tabla del resultado (una fila por partida) alimenta el total, los gráficos, las tablas y la exportación
+            resultado = resultados['resultado']
+            totales_etapa = resultado.por_etapa()
+            emisiones_totales = resultado.total()
+            # Las figuras se reutilizan mientras no cambie el resultado (clave del producto + factores)
+            cache_figuras = obtener_cache_figuras()
+            clave_figuras = resultados.get('clave_resultado')
+            if resultados.get('version_factores'):
+                st.caption(f"Calculado con la versión de factores {resultados['version_factores']}")
             
             # 0. SUPUESTOS Y METODOLOGÍA
             st.header("📋 Supuestos y Metodología")
@@ -2288,8 +2526,7 @@ with tabs[10]:
                 ('Retail', 'retail'),
                 ('Uso/Fin Vida', 'fin_vida')
             ]:
-                etapa = desglose_detallado.get(etapa_key, {})
-                total_etapa = etapa.get('total', 0)
+                total_etapa = totales_etapa[etapa_key]
                 
                 if total_etapa > 0.0001:
                     etapas_calculadas.append(etapa_nombre)
@@ -2352,320 +2589,276 @@ with tabs[10]:
             st.subheader("📈 Distribución de Huella de Carbono por Etapa")
             
             # Preparar datos para gráficos - INCLUIR TODAS LAS ETAPAS CON NOMBRES CLAROS
+            nombres_etapas_grafico = {
+                'materias_primas': '1. Materias Primas',
+                'empaques': '2. Empaques Producto',
+                'transporte': '3. Transporte (MP + Emp)',
+                'procesamiento': '4. Producción',
+                'distribucion': '5. Distribución',
+                'retail': '6. Retail',
+                'fin_vida': '7. Uso/Fin Vida'
+            }
             etapas_totales = {
-                '1. Materias Primas': desglose_detallado.get('materias_primas', {}).get('total', 0),
-                '2. Empaques Producto': desglose_detallado.get('empaques', {}).get('total', 0),
-                '3. Transporte (MP + Emp)': desglose_detallado.get('transporte', {}).get('total', 0),
-                '4. Producción': desglose_detallado.get('procesamiento', {}).get('total', 0),
-                '5. Distribución': desglose_detallado.get('distribucion', {}).get('total', 0),
-                '6. Retail': desglose_detallado.get('retail', {}).get('total', 0),
-                '7. Uso/Fin Vida': desglose_detallado.get('fin_vida', {}).get('total', 0)
+                nombre: totales_etapa[etapa]
+                for etapa, nombre in nombres_etapas_grafico.items()
             }
             
             # Filtrar etapas con emisiones significativas (> 0.0001 kg CO₂e)
             etapas_significativas = {k: v for k, v in etapas_totales.items() if v > 0.0001}
             
             if etapas_significativas:
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Gráfico de barras - CON COLORES DIFERENTIADOS
-                    fig_barras = px.bar(
-                        x=list(etapas_significativas.keys()),
-                        y=list(etapas_significativas.values()),
-                        title=f"Huella de Carbono por Etapa (kg CO₂e por {unidad_funcional})",
-                        labels={'x': 'Etapa del Ciclo de Vida', 'y': 'kg CO₂e'},
-                        color=list(etapas_significativas.keys()),  # Color por categoría
-                        color_discrete_sequence=px.colors.qualitative.Set3
-                    )
-                    fig_barras.update_traces(
-                        text=[f"{formatear_numero(v, 4)} kg" for v in etapas_significativas.values()],
-                        textposition='auto',
-                        textfont_size=12
+                # Selector de categoría de impacto: usa la tabla del motor, sin recalcular
+                categorias_impacto = resultados.get('categorias_impacto') or {}
+                categoria_impacto = 'gwp'
+                if len(categorias_impacto) > 1:
+                    categoria_impacto = st.selectbox(
+                        "**Categoría de impacto**",
+                        options=list(categorias_impacto),
+                        format_func=lambda c: f"{categorias_impacto[c]['nombre']} ({categorias_impacto[c]['unidad']})",
+                        key="categoria_impacto_resultados"
                     )
-                    fig_barras.update_layout(
-                        showlegend=False,
-                        xaxis_title="Etapa del Ciclo de Vida",
-                        yaxis_title=f"kg CO₂e por {unidad_funcional}",
-                        height=500
-                    )
-                    st.plotly_chart(fig_barras, use_container_width=True)
                 
-                with col2:
-                    # Gráfico de torta - CON PORCENTAJES EXACTOS
-                    fig_torta = px.pie(
-                        names=list(etapas_significativas.keys()),
-                        values=list(etapas_significativas.values()),
-                        title=f"Distribución Porcentual por Etapa",
-                        hole=0.3,
-                        color_discrete_sequence=px.colors.qualitative.Set3
-                    )
-                    fig_torta.update_traces(
-                        textinfo='percent+label',
-                        textposition='inside',
-                        textfont_size=12,
-                        hovertemplate='<b>%{label}</b><br>%{value:.4f} kg CO₂e<br>%{percent}'
-                    )
-                    fig_torta.update_layout(
-                        height=500,
-                        showlegend=True,
-                        legend=dict(
-                            orientation="v",
-                            yanchor="middle",
-                            y=0.5,
-                            xanchor="left",
-                            x=1.05
-                        )
-                    )
-                    st.plotly_chart(fig_torta, use_container_width=True)
-                
-                # Mostrar tabla de resumen debajo de los gráficos
-                st.subheader("📋 Resumen Numérico por Etapa")
-                
-                datos_resumen_grafico = []
-                for etapa, valor in etapas_significativas.items():
-                    porcentaje = (valor / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    datos_resumen_grafico.append({
-                        'Etapa': etapa,
-                        'Huella (kg CO₂e)': formatear_numero(valor, 4),
-                        'Huella (g CO₂e)': formatear_numero(valor * 1000, 4),
-                        'Porcentaje': f"{porcentaje:.2f}%"
-                    })
+                if categoria_impacto == 'gwp':
+                    nombre_impacto = 'Huella de Carbono'
+                    unidad_impacto = 'kg CO₂e'
+                    valores_grafico = etapas_significativas
+                    total_impacto = emisiones_totales
+                else:
+                    nombre_impacto = categorias_impacto[categoria_impacto]['nombre']
+                    unidad_impacto = categorias_impacto[categoria_impacto]['unidad']
+                    totales_categoria = resultado.por_etapa(categoria_impacto)
+                    valores_grafico = {
+                        nombre: float(totales_categoria[etapa])
+                        for etapa, nombre in nombres_etapas_grafico.items()
+                        if totales_categoria[etapa] > 0.0001
+                    }
+                    total_impacto = float(totales_categoria.sum())
                 
-                df_resumen_grafico = pd.DataFrame(datos_resumen_grafico)
-                st.dataframe(df_resumen_grafico, use_container_width=True)
+                if not valores_grafico:
+                    st.info(f"ℹ️ No hay datos de {nombre_impacto.lower()} en la tabla de factores para las etapas de este producto")
+                else:
+                    col1, col2 = st.columns(2)
+                    
+                    with col1:
+                        # Gráfico de barras - CON COLORES DIFERENTIADOS
+                        def construir_barras():
+                            fig_barras = px.bar(
+                                x=list(valores_grafico.keys()),
+                                y=list(valores_grafico.values()),
+                                title=f"{nombre_impacto} por Etapa ({unidad_impacto} por {unidad_funcional})",
+                                labels={'x': 'Etapa del Ciclo de Vida', 'y': unidad_impacto},
+                                color=list(valores_grafico.keys()),  # Color por categoría
+                                color_discrete_sequence=px.colors.qualitative.Set3
+                            )
+                            fig_barras.update_traces(
+                                text=[f"{formatear_numero(v, 4)} {unidad_impacto.split()[0]}" for v in valores_grafico.values()],
+                                textposition='auto',
+                                textfont_size=12
+                            )
+                            fig_barras.update_layout(
+                                showlegend=False,
+                                xaxis_title="Etapa del Ciclo de Vida",
+                                yaxis_title=f"{unidad_impacto} por {unidad_funcional}",
+                                height=500
+                            )
+                            return fig_barras
+                        
+                        fig_barras = obtener_figura(cache_figuras, clave_figuras, 'barras_etapas', construir_barras,
+                                                    categoria=categoria_impacto, unidad_funcional=unidad_funcional)
+                        st.plotly_chart(fig_barras, use_container_width=True)
+                    
+                    with col2:
+                        # Gráfico de torta - CON PORCENTAJES EXACTOS
+                        def construir_torta():
+                            fig_torta = px.pie(
+                                names=list(valores_grafico.keys()),
+                                values=list(valores_grafico.values()),
+                                title=f"Distribución Porcentual por Etapa",
+                                hole=0.3,
+                                color_discrete_sequence=px.colors.qualitative.Set3
+                            )
+                            fig_torta.update_traces(
+                                textinfo='percent+label',
+                                textposition='inside',
+                                textfont_size=12,
+                                hovertemplate=f'<b>%{{label}}</b><br>%{{value:.4f}} {unidad_impacto}<br>%{{percent}}'
+                            )
+                            fig_torta.update_layout(
+                                height=500,
+                                showlegend=True,
+                                legend=dict(
+                                    orientation="v",
+                                    yanchor="middle",
+                                    y=0.5,
+                                    xanchor="left",
+                                    x=1.05
+                                )
+                            )
+                            return fig_torta
+                        
+                        fig_torta = obtener_figura(cache_figuras, clave_figuras, 'torta_etapas', construir_torta,
+                                                   categoria=categoria_impacto)
+                        st.plotly_chart(fig_torta, use_container_width=True)
+                    
+                    # Mostrar tabla de resumen debajo de los gráficos
+                    st.subheader("📋 Resumen Numérico por Etapa")
+                    
+                    datos_resumen_grafico = []
+                    for etapa, valor in valores_grafico.items():
+                        porcentaje = (valor / total_impacto * 100) if total_impacto > 0 else 0
+                        fila_resumen = {
+                            'Etapa': etapa,
+                            f'Huella ({unidad_impacto})': formatear_numero(valor, 4)
+                        }
+                        if categoria_impacto == 'gwp':
+                            fila_resumen['Huella (g CO₂e)'] = formatear_numero(valor * 1000, 4)
+                        fila_resumen['Porcentaje'] = f"{porcentaje:.2f}%"
+                        datos_resumen_grafico.append(fila_resumen)
+                    
+                    df_resumen_grafico = pd.DataFrame(datos_resumen_grafico)
+                    st.dataframe(df_resumen_grafico, use_container_width=True)
+                
+                # Desglose del GWP por origen del carbono y horizonte (misma evaluación del motor)
+                if tiene_desglose_gwp(resultado.tabla):
+                    st.subheader("🌱 Desglose por Origen del Carbono")
+                    df_origen = desglose_gwp_por_etapa(resultado.tabla)
+                    df_origen.index = [nombres_etapas_grafico[etapa] for etapa in df_origen.index]
+                    df_origen.columns = [f"{HORIZONTES_GWP[h]} {ORIGENES_CARBONO.get(o, 'sin desglose')} (kg CO₂e)"
+                                         for h, o in df_origen.columns]
+                    st.dataframe(df_origen.map(lambda v: formatear_numero(v, 4)), use_container_width=True)
+                    st.caption("La columna 'sin desglose' corresponde a factores sin sub-columnas de origen en factors.csv")
+                
+                # Principales contribuciones (etapa, fuente) de la tabla del resultado
+                st.subheader("🎯 Principales Fuentes de Emisión")
+                df_principales = resultado.principales(5).reset_index()
+                df_principales['etapa'] = df_principales['etapa'].map(nombres_etapas_grafico)
+                df_principales.columns = ['Etapa', 'Fuente', 'Huella (kg CO₂e)', 'Porcentaje (%)']
+                st.dataframe(df_principales.round({'Huella (kg CO₂e)': 4, 'Porcentaje (%)': 1}),
+                             use_container_width=True, hide_index=True)
+                
+                # Reparto de las etapas compartidas entre coproductos
+                tabla_coproductos = resultados.get('tabla_coproductos')
+                if tabla_coproductos is not None and len(tabla_coproductos) > 1:
+                    st.subheader("🧀 Reparto entre Coproductos")
+                    df_coproductos = tabla_coproductos.rename(columns=nombres_etapas_grafico)
+                    df_coproductos['Total (kg CO₂e)'] = tabla_coproductos.sum(axis=1)
+                    st.dataframe(df_coproductos.map(lambda v: formatear_numero(v, 4)), use_container_width=True)
                 
                 # 3. DESGLOSE DETALLADO POR ETAPA
                 st.header("🔍 Desglose Detallado por Etapa del Ciclo de Vida")
                 
+                # Vistas de cada etapa agrupadas una sola vez por resultado (se guardan con él)
+                detalle_etapas = resultado.detalle_etapas()
+                
+                def encabezado_etapa(etapa_key, titulo):
+                    total = totales_etapa[etapa_key]
+                    porcentaje = (total / emisiones_totales * 100) if emisiones_totales > 0 else 0
+                    st.metric(titulo, f"{formatear_numero(total, 4)} kg CO₂e ({porcentaje:.1f}%)")
+                    return detalle_etapas[etapa_key]
+                
+                def grafico_torta(nombres, valores_kg, columna_nombre, titulo):
+                    def construir():
+                        fig = px.pie(
+                            pd.DataFrame({columna_nombre: list(nombres), 'Huella (g CO₂e)': list(valores_kg * 1000)}),
+                            values='Huella (g CO₂e)',
+                            names=columna_nombre,
+                            title=titulo,
+                            hole=0.3
+                        )
+                        fig.update_traces(textinfo='percent+label')
+                        return fig
+                    # El título identifica el gráfico de cada etapa
+                    st.plotly_chart(obtener_figura(cache_figuras, clave_figuras, 'torta_detalle', construir, titulo=titulo),
+                                    use_container_width=True)
+                
                 # MATERIAS PRIMAS
                 with st.expander("📦 **1. Materias Primas**", expanded=True):
-                    etapa_mp = desglose_detallado.get('materias_primas', {})
-                    total_mp = etapa_mp.get('total', 0)
-                    porcentaje_mp = (total_mp / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Materias Primas", 
-                             f"{formatear_numero(total_mp, 4)} kg CO₂e ({porcentaje_mp:.1f}%)")
-                    
-                    fuentes_mp = etapa_mp.get('fuentes', {})
-                    if fuentes_mp:
+                    por_material = encabezado_etapa('materias_primas', "Huella Total Materias Primas")
+                    if len(por_material):
                         st.subheader("Desglose por Material")
-                        datos_mp = []
-                        for material, datos in fuentes_mp.items():
-                            datos_mp.append({
-                                'Material': material,
-                                'Cantidad (kg)': formatear_numero(datos.get('cantidad_kg', 0), 4),
-                                'Huella Material (kg CO₂e)': formatear_numero(datos.get('emisiones_material', 0), 4),
-                                'Huella Empaque MP (kg CO₂e)': formatear_numero(datos.get('emisiones_empaque', 0), 4),
-                                'Total (kg CO₂e)': formatear_numero(datos.get('total', 0), 4)
-                            })
-                        df_mp = pd.DataFrame(datos_mp)
-                        st.dataframe(df_mp, use_container_width=True)
-                        
-                        # Agregar gráfico de torta para materias primas
-                        datos_pie = []
-                        for material, datos in fuentes_mp.items():
-                            datos_pie.append({
-                                'Material': material,
-                                'Huella (g CO₂e)': datos.get('total', 0) * 1000  # Convertir a gramos
-                            })
-                        if datos_pie:
-                            df_pie = pd.DataFrame(datos_pie)
-                            fig = px.pie(
-                                df_pie,
-                                values='Huella (g CO₂e)',
-                                names='Material',
-                                title='Distribución de Huella por Material (g CO₂e)',
-                                hole=0.3
-                            )
-                            fig.update_traces(textinfo='percent+label')
-                            st.plotly_chart(fig, use_container_width=True)
+                        st.dataframe(pd.DataFrame({
+                            'Material': por_material.index,
+                            'Cantidad (kg)': por_material['cantidad_kg'],
+                            'Huella Material (kg CO₂e)': por_material['gwp_material'],
+                            'Huella Empaque MP (kg CO₂e)': por_material['gwp_empaque'],
+                            'Total (kg CO₂e)': por_material['gwp']
+                        }).reset_index(drop=True).map(lambda v: formatear_numero(v, 4) if isinstance(v, float) else v),
+                            use_container_width=True)
+                        grafico_torta(por_material.index, por_material['gwp'], 'Material',
+                                      'Distribución de Huella por Material (g CO₂e)')
                     else:
                         st.info("No hay datos detallados de materias primas")
                 
                 # EMPAQUES
                 with st.expander("📦 **2. Empaques del Producto**", expanded=True):
-                    etapa_emp = desglose_detallado.get('empaques', {})
-                    total_emp = etapa_emp.get('total', 0)
-                    porcentaje_emp = (total_emp / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Empaques", 
-                             f"{formatear_numero(total_emp, 4)} kg CO₂e ({porcentaje_emp:.1f}%)")
-                    
-                    fuentes_emp = etapa_emp.get('fuentes', {})
-                    if fuentes_emp:
+                    filas_emp = encabezado_etapa('empaques', "Huella Total Empaques")
+                    if len(filas_emp):
                         st.subheader("Desglose por Empaque")
-                        datos_emp = []
-                        for empaque, datos in fuentes_emp.items():
-                            datos_emp.append({
-                                'Empaque': empaque,
-                                'Material': datos.get('material', 'No especificado'),
-                                'Peso (kg)': formatear_numero(datos.get('peso_kg', 0), 4),
-                                'Huella Carbono (kg CO₂e)': formatear_numero(datos.get('emisiones', 0), 4)
-                            })
-                        df_emp = pd.DataFrame(datos_emp)
-                        st.dataframe(df_emp, use_container_width=True)
-                        
-                        # Agregar gráfico de torta para empaques
-                        datos_pie = []
-                        for empaque, datos in fuentes_emp.items():
-                            datos_pie.append({
-                                'Empaque': empaque,
-                                'Huella (g CO₂e)': datos.get('emisiones', 0) * 1000  # Convertir a gramos
-                            })
-                        if datos_pie:
-                            df_pie = pd.DataFrame(datos_pie)
-                            fig = px.pie(
-                                df_pie,
-                                values='Huella (g CO₂e)',
-                                names='Empaque',
-                                title='Distribución de Huella por Empaque (g CO₂e)',
-                                hole=0.3
-                            )
-                            fig.update_traces(textinfo='percent+label')
-                            st.plotly_chart(fig, use_container_width=True)
+                        st.dataframe(pd.DataFrame({
+                            'Empaque': filas_emp['fuente'],
+                            'Material': filas_emp['subfuente'].replace('', 'No especificado'),
+                            'Peso (kg)': filas_emp['masa_kg'].map(lambda v: formatear_numero(v, 4)),
+                            'Huella Carbono (kg CO₂e)': filas_emp['gwp'].map(lambda v: formatear_numero(v, 4))
+                        }).reset_index(drop=True), use_container_width=True)
+                        grafico_torta(filas_emp['fuente'], filas_emp['gwp'], 'Empaque',
+                                      'Distribución de Huella por Empaque (g CO₂e)')
                     else:
                         st.info("No hay datos detallados de empaques")
                 
-                # TRANSPORTE
+                # TRANSPORTE (una partida por ruta: 'fuente' es el origen, 'subfuente' el material o empaque)
                 with st.expander("🚚 **3. Transporte (MP + Empaques)**", expanded=True):
-                    etapa_trans = desglose_detallado.get('transporte', {})
-                    total_trans = etapa_trans.get('total', 0)
-                    porcentaje_trans = (total_trans / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Transporte", 
-                             f"{formatear_numero(total_trans, 4)} kg CO₂e ({porcentaje_trans:.1f}%)")
-                    
-                    fuentes_trans = etapa_trans.get('fuentes', {})
-                    if fuentes_trans:
+                    filas_trans = encabezado_etapa('transporte', "Huella Total Transporte")
+                    if len(filas_trans):
+                        por_origen = {}
                         col_t1, col_t2 = st.columns(2)
-                        with col_t1:
-                            st.subheader("📦 Transporte Materias Primas")
-                            trans_mp = fuentes_trans.get('materias_primas', {})
-                            st.metric("Huella MP", f"{formatear_numero(trans_mp.get('emisiones', 0), 4)} kg CO₂e")
-                            
-                            detalle_mp = trans_mp.get('detalle', [])
-                            if detalle_mp:
-                                datos_trans_mp = []
-                                for item in detalle_mp:
-                                    if 'producto' in item:
-                                        rutas = item.get('rutas', [])
-                                        for ruta in rutas:
-                                            datos_trans_mp.append({
-                                                'Material': item['producto'],
-                                                'Ruta': f"{ruta.get('origen', '')} → {ruta.get('destino', '')}",
-                                                'Distancia (km)': formatear_numero(ruta.get('distancia_km', 0), 1),
-                                                'Transporte': ruta.get('tipo_transporte', 'No especificado'),
-                                                'Huella (kg CO₂e)': formatear_numero(ruta.get('emisiones', 0), 4)
-                                            })
-                                if datos_trans_mp:
-                                    df_trans_mp = pd.DataFrame(datos_trans_mp)
-                                    st.dataframe(df_trans_mp, use_container_width=True)
-                                else:
-                                    st.info("No hay rutas detalladas de transporte MP")
-                            else:
-                                st.info("No hay datos de transporte MP")
-                        
-                        with col_t2:
-                            st.subheader("📦 Transporte Empaques")
-                            trans_emp = fuentes_trans.get('empaques', {})
-                            st.metric("Huella Empaques", f"{formatear_numero(trans_emp.get('emisiones', 0), 4)} kg CO₂e")
-                            
-                            detalle_emp = trans_emp.get('detalle', [])
-                            if detalle_emp:
-                                datos_trans_emp = []
-                                for item in detalle_emp:
-                                    if 'nombre' in item:
-                                        rutas = item.get('rutas', [])
-                                        for ruta in rutas:
-                                            datos_trans_emp.append({
-                                                'Empaque': item['nombre'],
-                                                'Ruta': f"{ruta.get('origen', '')} → {ruta.get('destino', '')}",
-                                                'Distancia (km)': formatear_numero(ruta.get('distancia_km', 0), 1),
-                                                'Transporte': ruta.get('tipo_transporte', 'No especificado'),
-                                                'Huella (kg CO₂e)': formatear_numero(ruta.get('emisiones', 0), 4)
-                                            })
-                                if datos_trans_emp:
-                                    df_trans_emp = pd.DataFrame(datos_trans_emp)
-                                    st.dataframe(df_trans_emp, use_container_width=True)
-                                    
-                                    # Agregar gráfico de torta para transporte total
-                                    datos_pie = [
-                                        {
-                                            'Tipo': 'Materias Primas',
-                                            'Huella (g CO₂e)': trans_mp.get('emisiones', 0) * 1000
-                                        },
-                                        {
-                                            'Tipo': 'Empaques',
-                                            'Huella (g CO₂e)': trans_emp.get('emisiones', 0) * 1000
-                                        }
-                                    ]
-                                    df_pie = pd.DataFrame(datos_pie)
-                                    fig = px.pie(
-                                        df_pie,
-                                        values='Huella (g CO₂e)',
-                                        names='Tipo',
-                                        title='Distribución de Huella por Tipo de Transporte (g CO₂e)',
-                                        hole=0.3
-                                    )
-                                    fig.update_traces(textinfo='percent+label')
-                                    st.plotly_chart(fig, use_container_width=True)
+                        for columna, origen, titulo, etiqueta, nombre_fuente in (
+                                (col_t1, 'materias_primas', "📦 Transporte Materias Primas", "Huella MP", 'Material'),
+                                (col_t2, 'empaques', "📦 Transporte Empaques", "Huella Empaques", 'Empaque')):
+                            with columna:
+                                st.subheader(titulo)
+                                rutas = filas_trans[filas_trans['fuente'] == origen]
+                                por_origen[origen] = float(rutas['gwp'].sum())
+                                st.metric(etiqueta, f"{formatear_numero(por_origen[origen], 4)} kg CO₂e")
+                                if len(rutas):
+                                    st.dataframe(pd.DataFrame({
+                                        nombre_fuente: rutas['subfuente'],
+                                        'Ruta': rutas['ruta'],
+                                        'Distancia (km)': rutas['distancia_km'].map(lambda v: formatear_numero(v, 1)),
+                                        'Transporte': rutas['item'].replace('', 'No especificado'),
+                                        'Huella (kg CO₂e)': rutas['gwp'].map(lambda v: formatear_numero(v, 4))
+                                    }).reset_index(drop=True), use_container_width=True)
                                 else:
-                                    st.info("No hay rutas detalladas de transporte empaques")
-                            else:
-                                st.info("No hay datos de transporte empaques")
+                                    st.info(f"No hay rutas detalladas de transporte {'MP' if origen == 'materias_primas' else 'empaques'}")
+                        if (filas_trans['fuente'] == 'empaques').any():
+                            grafico_torta(['Materias Primas', 'Empaques'],
+                                          pd.Series(por_origen).reindex(['materias_primas', 'empaques']).to_numpy(),
+                                          'Tipo', 'Distribución de Huella por Tipo de Transporte (g CO₂e)')
                     else:
                         st.info("No hay datos de transporte")
                 
                 # PROCESAMIENTO (MEJORADO)
                 with st.expander("⚡ **4. Procesamiento (Producción)**", expanded=True):
-                    etapa_proc = desglose_detallado.get('procesamiento', {})
-                    total_proc = etapa_proc.get('total', 0)
-                    porcentaje_proc = (total_proc / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Procesamiento", 
-                             f"{formatear_numero(total_proc, 4)} kg CO₂e ({porcentaje_proc:.1f}%)")
-                    
-                    fuentes_proc = etapa_proc.get('fuentes', {})
-                    if fuentes_proc:
+                    por_fuente_proc = encabezado_etapa('procesamiento', "Huella Total Procesamiento")
+                    if len(por_fuente_proc):
+                        # Solo las fuentes significativas, de mayor a menor huella
+                        por_fuente_proc = por_fuente_proc[por_fuente_proc > 0.0001].sort_values(ascending=False)
                         datos_proc = []
-                        
-                        # Procesar todas las fuentes de emisión en producción
-                        for fuente, valor in fuentes_proc.items():
-                            if valor > 0.0001:  # Solo mostrar fuentes significativas
-                                if fuente == 'Energía Producción':
-                                    datos_proc.append({
-                                        'Fuente de Emisión': 'Energía Eléctrica',
-                                        'Tipo': st.session_state.produccion.get('tipo_energia', 'Electricidad'),
-                                        'Consumo': f"{formatear_numero(st.session_state.produccion.get('energia_kwh', 0), 4)} kWh",
-                                        'Huella (kg CO₂e)': formatear_numero(valor, 4)
-                                    })
-                                elif fuente == 'Agua Producción':
-                                    datos_proc.append({
-                                        'Fuente de Emisión': 'Agua',
-                                        'Tipo': 'Agua potable',
-                                        'Consumo': f"{formatear_numero(st.session_state.produccion.get('agua_m3', 0), 4)} m³",
-                                        'Huella (kg CO₂e)': formatear_numero(valor, 4)
-                                    })
-                                elif fuente.startswith('Merma'):
-                                    # Gestión de mermas
-                                    nombre_material = fuente.replace('Merma ', '')
-                                    datos_proc.append({
-                                        'Fuente de Emisión': 'Gestión de Residuos',
-                                        'Tipo': f'Merma de {nombre_material}',
-                                        'Consumo': 'Gestión de residuos',
-                                        'Huella (kg CO₂e)': formatear_numero(valor, 4)
-                                    })
-                                else:
-                                    # Otras fuentes
-                                    datos_proc.append({
-                                        'Fuente de Emisión': fuente,
-                                        'Tipo': 'Otras emisiones',
-                                        'Consumo': '-',
-                                        'Huella (kg CO₂e)': formatear_numero(valor, 4)
-                                    })
+                        for fuente, valor in por_fuente_proc.items():
+                            if fuente == 'Energía Producción':
+                                fila_proc = ('Energía Eléctrica', st.session_state.produccion.get('tipo_energia', 'Electricidad'),
+                                             f"{formatear_numero(st.session_state.produccion.get('energia_kwh', 0), 4)} kWh")
+                            elif fuente == 'Agua Producción':
+                                fila_proc = ('Agua', 'Agua potable',
+                                             f"{formatear_numero(st.session_state.produccion.get('agua_m3', 0), 4)} m³")
+                            elif fuente.startswith('Merma'):
+                                fila_proc = ('Gestión de Residuos', f"Merma de {fuente.replace('Merma ', '')}", 'Gestión de residuos')
+                            else:
+                                fila_proc = (fuente, 'Otras emisiones', '-')
+                            datos_proc.append(dict(zip(['Fuente de Emisión', 'Tipo', 'Consumo'], fila_proc),
+                                                   **{'Huella (kg CO₂e)': formatear_numero(valor, 4)}))
                         
                         if datos_proc:
-                            df_proc = pd.DataFrame(datos_proc)
-                            # Ordenar por huella descendente
-                            df_proc = df_proc.sort_values('Huella (kg CO₂e)', ascending=False, key=lambda col: col.str.replace(',', '.').astype(float) if col.name == 'Huella (kg CO₂e)' else col)
-                            st.dataframe(df_proc, use_container_width=True)
+                            st.dataframe(pd.DataFrame(datos_proc), use_container_width=True)
                             
                             # Mostrar total de energía y agua consumida
                             st.info(f"**Consumos totales en producción:**")
@@ -2685,152 +2878,53 @@ with tabs[10]:
                 
                 # DISTRIBUCIÓN
                 with st.expander("🚛 **5. Distribución**", expanded=True):
-                    etapa_dist = desglose_detallado.get('distribucion', {})
-                    total_dist = etapa_dist.get('total', 0)
-                    porcentaje_dist = (total_dist / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Distribución", 
-                             f"{formatear_numero(total_dist, 4)} kg CO₂e ({porcentaje_dist:.1f}%)")
-                    
-                    fuentes_dist = etapa_dist.get('fuentes', {})
-                    if fuentes_dist:
-                        datos_dist = []
-                        for canal, datos in fuentes_dist.items():
-                            if canal.startswith('Distribución '):
-                                nombre_canal = canal.replace('Distribución ', '')
-                                datos_dist.append({
-                                    'Canal': nombre_canal,
-                                    'Porcentaje': f"{st.session_state.distribucion['canales'][0].get('porcentaje', 0):.1f}%",
-                                    'Huella Carbono (kg CO₂e)': formatear_numero(datos, 4)
-                                })
-                        
-                        if datos_dist:
-                            df_dist = pd.DataFrame(datos_dist)
-                            st.dataframe(df_dist, use_container_width=True)
-                        else:
-                            st.info("No hay datos detallados de distribución")
+                    filas_dist = encabezado_etapa('distribucion', "Huella Total Distribución").reset_index()
+                    filas_dist = filas_dist[filas_dist['fuente'].str.startswith('Distribución ')]
+                    if len(filas_dist):
+                        canales = st.session_state.distribucion.get('canales') or [{}]
+                        st.dataframe(pd.DataFrame({
+                            'Canal': filas_dist['fuente'].str.replace('Distribución ', '', n=1, regex=False),
+                            'Porcentaje': f"{canales[0].get('porcentaje', 0):.1f}%",
+                            'Huella Carbono (kg CO₂e)': filas_dist['gwp'].map(lambda v: formatear_numero(v, 4))
+                        }).reset_index(drop=True), use_container_width=True)
                     else:
                         st.info("No hay datos de distribución")
                 
                 # RETAIL
                 with st.expander("🏪 **6. Retail**", expanded=True):
-                    etapa_retail = desglose_detallado.get('retail', {})
-                    total_retail = etapa_retail.get('total', 0)
-                    porcentaje_retail = (total_retail / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Retail", 
-                             f"{formatear_numero(total_retail, 4)} kg CO₂e ({porcentaje_retail:.1f}%)")
-                    
-                    fuentes_retail = etapa_retail.get('fuentes', {})
-                    if fuentes_retail:
-                        for fuente, datos in fuentes_retail.items():
-                            if fuente == 'Energía Retail':
-                                st.write(f"**Energía para almacenamiento:**")
-                                st.write(f"- Consumo: {formatear_numero(st.session_state.retail.get('consumo_energia_kwh', 0), 4)} kWh")
-                                st.write(f"- Días almacenamiento: {st.session_state.retail.get('dias_almacenamiento', 0)} días")
-                                st.write(f"- Tipo almacenamiento: {st.session_state.retail.get('tipo_almacenamiento', 'No especificado')}")
-                                st.write(f"- Huella carbono: {formatear_numero(datos, 4)} kg CO₂e")
+                    energia_retail = encabezado_etapa('retail', "Huella Total Retail").get('Energía Retail')
+                    if energia_retail is not None:
+                        st.write(f"**Energía para almacenamiento:**")
+                        st.write(f"- Consumo: {formatear_numero(st.session_state.retail.get('consumo_energia_kwh', 0), 4)} kWh")
+                        st.write(f"- Días almacenamiento: {st.session_state.retail.get('dias_almacenamiento', 0)} días")
+                        st.write(f"- Tipo almacenamiento: {st.session_state.retail.get('tipo_almacenamiento', 'No especificado')}")
+                        st.write(f"- Huella carbono: {formatear_numero(energia_retail, 4)} kg CO₂e")
                     else:
                         st.info("No hay datos de retail")
                 
-                # FIN DE VIDA - SECCIÓN COMPLETA REEMPLAZADA
+                # USO Y FIN DE VIDA
                 with st.expander("♻️ **7. Uso y Fin de Vida**", expanded=True):
-                    etapa_fv = desglose_detallado.get('fin_vida', {})
-                    total_fv = etapa_fv.get('total', 0)
-                    porcentaje_fv = (total_fv / emisiones_totales * 100) if emisiones_totales > 0 else 0
-                    st.metric("Huella Total Uso y Fin de Vida", 
-                             f"{formatear_numero(total_fv, 4)} kg CO₂e ({porcentaje_fv:.1f}%)")
-                    
-                    fuentes_fv = etapa_fv.get('fuentes', {})
-                    if fuentes_fv:
-                        datos_fv = []
-                        
-                        # Consumo durante uso
-                        uso_data = fuentes_fv.get('uso', {})
-                        if uso_data:
-                            if uso_data.get('energia', 0) > 0:
-                                datos_fv.append({
-                                    'Fuente': 'Consumo Energético durante Uso',
-                                    'Detalle': f"{formatear_numero(st.session_state.uso_fin_vida.get('energia_uso_kwh', 0), 4)} kWh",
-                                    'Huella Carbono (kg CO₂e)': formatear_numero(uso_data['energia'], 4)
-                                })
-                            if uso_data.get('agua', 0) > 0:
-                                datos_fv.append({
-                                    'Fuente': 'Consumo de Agua durante Uso',
-                                    'Detalle': f"{formatear_numero(st.session_state.uso_fin_vida.get('agua_uso_m3', 0), 4)} m³",
-                                    'Huella Carbono (kg CO₂e)': formatear_numero(uso_data['agua'], 4)
-                                })
-                        
-                        # Gestión de empaques post-consumo
-                        fin_vida_data = fuentes_fv.get('fin_vida', {})
-                        if fin_vida_data:
-                            for empaque, datos in fin_vida_data.items():
-                                datos_fv.append({
-                                    'Fuente': f'Gestión de {empaque}',
-                                    'Detalle': 'Empaques al fin de vida',
-                                    'Huella Carbono (kg CO₂e)': formatear_numero(datos.get('emisiones', 0), 4)
-                                })
-                        
-                        if datos_fv:
-                            df_fv = pd.DataFrame(datos_fv)
-                            
-                            # SOLUCIÓN SIMPLE: Crear columna de gramos de manera directa
-                            def calcular_gramos(valor_str):
-                                """Convierte un string formateado a gramos CO₂e"""
-                                try:
-                                    # Extraer solo el número
-                                    if isinstance(valor_str, str):
-                                        # Quitar "kg CO₂e" y espacios
-                                        valor_limpio = valor_str.replace('kg CO₂e', '').replace('CO₂e', '').strip()
-                                        # Reemplazar comas por puntos para conversión
-                                        valor_limpio = valor_limpio.replace(',', '.')
-                                        # Convertir a float
-                                        valor_kg = float(valor_limpio)
-                                    else:
-                                        valor_kg = float(valor_str)
-                                    
-                                    # Calcular gramos y formatear
-                                    gramos = valor_kg * 1000
-                                    return f"{formatear_numero(gramos, 4)} g CO₂e"
-                                    
-                                except Exception as e:
-                                    return "0,0000 g CO₂e"
-                            
-                            # Aplicar la conversión
-                            df_fv['Huella Carbono (g CO₂e)'] = df_fv['Huella Carbono (kg CO₂e)'].apply(calcular_gramos)
-                            
-                            st.dataframe(df_fv, use_container_width=True)
-                            
-                            # Agregar gráfico de torta para uso y fin de vida
-                            datos_pie = []
-                            if uso_data:
-                                if uso_data.get('energia', 0) > 0:
-                                    datos_pie.append({
-                                        'Fuente': 'Consumo Energético',
-                                        'Huella (g CO₂e)': uso_data['energia'] * 1000
-                                    })
-                                if uso_data.get('agua', 0) > 0:
-                                    datos_pie.append({
-                                        'Fuente': 'Consumo Agua',
-                                        'Huella (g CO₂e)': uso_data['agua'] * 1000
-                                    })
-                            if fin_vida_data:
-                                for empaque, datos in fin_vida_data.items():
-                                    datos_pie.append({
-                                        'Fuente': f'Fin Vida {empaque}',
-                                        'Huella (g CO₂e)': datos.get('emisiones', 0) * 1000
-                                    })
-                            if datos_pie:
-                                df_pie = pd.DataFrame(datos_pie)
-                                fig = px.pie(
-                                    df_pie,
-                                    values='Huella (g CO₂e)',
-                                    names='Fuente',
-                                    title='Distribución de Huella en Uso y Fin de Vida (g CO₂e)',
-                                    hole=0.3
-                                )
-                                fig.update_traces(textinfo='percent+label')
-                                st.plotly_chart(fig, use_container_width=True)
-                        else:
-                            st.info("No hay datos detallados de uso y fin de vida")
+                    # Uso: 'subfuente' energía o agua; fin de vida: empaque ('subfuente') y tratamiento
+                    filas_fv = encabezado_etapa('fin_vida', "Huella Total Uso y Fin de Vida").reset_index()
+                    filas_fv = filas_fv[(filas_fv['fuente'] != 'uso') | (filas_fv['gwp'] > 0)]
+                    if len(filas_fv):
+                        etiquetas_uso = {
+                            'energia': ('Consumo Energético durante Uso', 'Consumo Energético',
+                                        f"{formatear_numero(st.session_state.uso_fin_vida.get('energia_uso_kwh', 0), 4)} kWh"),
+                            'agua': ('Consumo de Agua durante Uso', 'Consumo Agua',
+                                     f"{formatear_numero(st.session_state.uso_fin_vida.get('agua_uso_m3', 0), 4)} m³")
+                        }
+                        es_uso = (filas_fv['fuente'] == 'uso').to_numpy()
+                        fuentes_fv = [etiquetas_uso.get(f, (f,) * 3) if uso else (f'Gestión de {f}', f'Fin Vida {f}', 'Empaques al fin de vida')
+                                      for f, uso in zip(filas_fv['subfuente'], es_uso)]
+                        st.dataframe(pd.DataFrame({
+                            'Fuente': [f[0] for f in fuentes_fv],
+                            'Detalle': [f[2] for f in fuentes_fv],
+                            'Huella Carbono (kg CO₂e)': filas_fv['gwp'].map(lambda v: formatear_numero(v, 4)).to_numpy(),
+                            'Huella Carbono (g CO₂e)': filas_fv['gwp'].map(lambda v: f"{formatear_numero(v * 1000, 4)} g CO₂e").to_numpy()
+                        }), use_container_width=True)
+                        grafico_torta([f[1] for f in fuentes_fv], filas_fv['gwp'].to_numpy(), 'Fuente',
+                                      'Distribución de Huella en Uso y Fin de Vida (g CO₂e)')
                     else:
                         st.info("No hay datos de uso y fin de vida")
                 
@@ -2847,8 +2941,7 @@ with tabs[10]:
                     ('Retail', 'retail'),
                     ('Fin de Vida', 'fin_vida')
                 ]:
-                    etapa = desglose_detallado.get(etapa_key, {})
-                    total_etapa = etapa.get('total', 0)
+                    total_etapa = totales_etapa[etapa_key]
                     if total_etapa > 0.001:
                         porcentaje = (total_etapa / emisiones_totales) * 100
                         datos_resumen.append({
@@ -2865,14 +2958,324 @@ with tabs[10]:
                 else:
                     st.info("No hay emisiones significativas para mostrar")
                 
+                # CONTRIBUCIÓN POR PARTIDA (modelo lineal compilado)
+                # Modelo, escenarios, optimizador e incertidumbre usan la versión de factores del resultado
+                version_resultado = resultados.get('version_factores') or version_factores_en_uso
+                factores_resultado = factores if version_resultado == version_factores_en_uso \
+                    else factores_de_version(version_resultado)
+                matriz_resultado = matriz_de_version(version_resultado, factores_resultado)
+                if clave_figuras is None:
+                    modelo_lineal = compilar_partidas(resultado.partidas(), matriz_resultado)
+                else:
+                    modelo_lineal = modelo_de_resultado(clave_figuras, resultado, matriz_resultado)
+                if modelo_lineal is not None and len(modelo_lineal['partidas']) > 0:
+                    with st.expander("🔬 **Contribución por Partida**"):
+                        df_contrib = contribuciones(modelo_lineal).sort_values('contribucion', ascending=False).head(15)
+                        st.dataframe(pd.DataFrame({
+                            'Etapa': df_contrib['etapa'],
+                            'Fuente': df_contrib['fuente'],
+                            'Detalle': df_contrib['subfuente'],
+                            'Cantidad': df_contrib['cantidad'].map(lambda v: formatear_numero(v, 4)),
+                            'Factor (kg CO₂e/unidad)': df_contrib['factor'].map(lambda v: formatear_numero(v, 4)),
+                            'Huella (kg CO₂e)': df_contrib['contribucion'].map(lambda v: formatear_numero(v, 4)),
+                            'Porcentaje': df_contrib['porcentaje'].map(lambda v: f"{v:.1f}%")
+                        }), use_container_width=True, hide_index=True)
+                        st.caption("El factor es también la sensibilidad del total: kg CO₂e adicionales por cada unidad más de la partida")
+                
+                # ANÁLISIS DE ESCENARIOS (barrido sobre el modelo lineal compilado)
+                if modelo_lineal is not None and len(modelo_lineal['partidas']) > 0:
+                    with st.expander("🔀 **Análisis de Escenarios**"):
+                        st.caption("Se evalúan a la vez todas las combinaciones de las alternativas seleccionadas")
+                        partidas_modelo = modelo_lineal['partidas']
+                        opciones_energia_esc = obtener_opciones_categoria('energia')
+                        energia_actual = st.session_state.produccion.get('tipo_energia')
+                        
+                        col_esc1, col_esc2 = st.columns(2)
+                        with col_esc1:
+                            energias_escenario = st.multiselect(
+                                "**Energía de producción**",
+                                options=opciones_energia_esc,
+                                default=[energia_actual] if energia_actual in opciones_energia_esc else [],
+                                key="escenarios_energia"
+                            )
+                            modos_escenario = st.multiselect(
+                                "**Modo de transporte (MP y empaques)**",
+                                options=obtener_opciones_categoria('transporte'),
+                                key="escenarios_transporte"
+                            )
+                        with col_esc2:
+                            materiales_escenario = st.multiselect(
+                                "**Material de los empaques del producto**",
+                                options=obtener_opciones_categoria('material_empaque'),
+                                key="escenarios_material"
+                            )
+                            multiplicadores_texto = st.text_input(
+                                "**Multiplicadores de cantidad de materias primas**",
+                                value="1",
+                                help="Valores separados por punto y coma, por ejemplo: 0,9; 1; 1,1",
+                                key="escenarios_multiplicadores"
+                            )
+                        
+                        if st.button("▶️ Evaluar Escenarios", key="evaluar_escenarios"):
+                            parametros_escenarios = {}
+                            if energias_escenario and (partidas_modelo['etapa'] == 'procesamiento').any():
+                                parametros_escenarios['Energía producción'] = {
+                                    'tipo': 'sustitucion',
+                                    'filtro': {'etapa': 'procesamiento', 'categoria': 'energia'},
+                                    'opciones': energias_escenario
+                                }
+                            if modos_escenario:
+                                parametros_escenarios['Transporte'] = {
+                                    'tipo': 'sustitucion',
+                                    'filtro': {'etapa': 'transporte'},
+                                    'opciones': modos_escenario
+                                }
+                            if materiales_escenario:
+                                parametros_escenarios['Material empaque'] = {
+                                    'tipo': 'sustitucion',
+                                    'filtro': {'etapa': 'empaques'},
+                                    'opciones': materiales_escenario
+                                }
+                            try:
+                                multiplicadores = [float(v.strip().replace(',', '.'))
+                                                   for v in multiplicadores_texto.split(';') if v.strip()]
+                            except ValueError:
+                                multiplicadores = []
+                                st.warning("⚠️ Multiplicadores no válidos, se ignoran")
+                            if multiplicadores and multiplicadores != [1.0]:
+                                parametros_escenarios['Cantidad MP'] = {
+                                    'tipo': 'multiplicador',
+                                    'filtro': {'etapa': 'materias_primas', 'subfuente': 'material'},
+                                    'valores': multiplicadores
+                                }
+                            
+                            try:
+                                resultados['escenarios'] = evaluar_escenarios(
+                                    modelo_lineal, matriz_resultado, parametros_escenarios
+                                )
+                            except ValueError as e:
+                                st.error(f"❌ {str(e)}")
+                        
+                        df_escenarios = resultados.get('escenarios')
+                        if df_escenarios is not None:
+                            columnas_parametros = [c for c in df_escenarios.columns
+                                                   if not c.startswith(('total_', 'etapa_')) and c not in ('diferencia_pct', 'ranking')]
+                            top_escenarios = df_escenarios.head(20).copy()
+                            top_escenarios['Escenario'] = (top_escenarios[columnas_parametros].astype(str).agg(' | '.join, axis=1)
+                                                           if columnas_parametros else 'Actual')
+                            
+                            st.metric("Escenarios evaluados", formatear_numero(len(df_escenarios)))
+                            fig_escenarios = px.bar(
+                                top_escenarios.iloc[::-1],
+                                x='total_gwp',
+                                y='Escenario',
+                                orientation='h',
+                                title="Mejores escenarios (kg CO₂e)",
+                                labels={'total_gwp': 'kg CO₂e', 'Escenario': ''}
+                            )
+                            fig_escenarios.update_layout(height=max(300, 30 * len(top_escenarios)))
+                            st.plotly_chart(fig_escenarios, use_container_width=True)
+                            
+                            st.dataframe(pd.DataFrame({
+                                'Ranking': top_escenarios['ranking'],
+                                'Escenario': top_escenarios['Escenario'],
+                                'Huella (kg CO₂e)': top_escenarios['total_gwp'].map(lambda v: formatear_numero(v, 4)),
+                                'Diferencia': top_escenarios['diferencia_pct'].map(lambda v: f"{v:+.1f}%")
+                            }), use_container_width=True, hide_index=True)
+                
+                # ANÁLISIS DE SENSIBILIDAD GLOBAL (índices de Sobol)
+                if modelo_lineal is not None and len(modelo_lineal['partidas']) > 0:
+                    with st.expander("🎯 **Análisis de Sensibilidad**"):
+                        st.caption("Qué entradas explican la variabilidad de la huella cuando cantidades y factores varían dentro de su rango")
+                        col_sens1, col_sens2 = st.columns(2)
+                        with col_sens1:
+                            rango_cantidades_pct = st.slider("**Variación de cantidades (±%)**", 0, 50, 10, key="sensibilidad_rango_cantidades")
+                        with col_sens2:
+                            rango_factores_pct = st.slider("**Variación de factores (±%)**", 0, 50, 10, key="sensibilidad_rango_factores")
+                        
+                        if st.button("▶️ Calcular Sensibilidad", key="calcular_sensibilidad"):
+                            resultados['sensibilidad'] = indices_sobol(
+                                modelo_lineal,
+                                n_muestras=max(64, 50000 // (len(modelo_lineal['partidas']) + len(modelo_lineal['ids_factor']) + 2)),
+                                rango_cantidades=rango_cantidades_pct / 100,
+                                rango_factores=rango_factores_pct / 100,
+                                semilla=0
+                            )
+                        
+                        df_sensibilidad = resultados.get('sensibilidad')
+                        if df_sensibilidad is not None:
+                            top_sensibilidad = df_sensibilidad.head(15).reset_index()
+                            fig_sensibilidad = px.bar(
+                                top_sensibilidad.iloc[::-1],
+                                x=['S1', 'ST'],
+                                y='entrada',
+                                orientation='h',
+                                barmode='group',
+                                title="Índices de Sobol (primer orden y total)",
+                                labels={'value': 'Índice', 'entrada': '', 'variable': ''}
+                            )
+                            fig_sensibilidad.update_layout(height=max(350, 35 * len(top_sensibilidad)))
+                            st.plotly_chart(fig_sensibilidad, use_container_width=True)
+                            st.caption(f"{formatear_numero(df_sensibilidad.attrs.get('evaluaciones', 0))} evaluaciones del modelo")
+                
+                # INCERTIDUMBRE (Monte Carlo por bloques en paralelo)
+                if modelo_lineal is not None and len(modelo_lineal['partidas']) > 0:
+                    with st.expander("🎲 **Incertidumbre (Monte Carlo)**"):
+                        st.caption("Cantidades y factores lognormales con incertidumbre por categoría de factor (o columnas 'gsd' / 'pedigree' de la base de factores)")
+                        
+                        # Estimación analítica: instantánea, se recalcula en cada ejecución
+                        analitico = propagar_incertidumbre(modelo_lineal, factores_df=factores_resultado)
+                        st.markdown("**Estimación analítica (intervalo 95%)**")
+                        st.dataframe(pd.DataFrame({
+                            'Etapa': [nombres_etapas_grafico.get(e, 'TOTAL') for e in analitico.index],
+                            'Valor (kg CO₂e)': analitico['valor'].map(lambda v: formatear_numero(v, 4)),
+                            'Media': analitico['media'].map(lambda v: formatear_numero(v, 4)),
+                            'Desviación': analitico['desviacion'].map(lambda v: formatear_numero(v, 4)),
+                            'Intervalo 95%': [f"{formatear_numero(i, 4)} – {formatear_numero(s, 4)}"
+                                              for i, s in zip(analitico['inferior'], analitico['superior'])]
+                        }), use_container_width=True, hide_index=True)
+                        
+                        st.markdown("**Simulación Monte Carlo**")
+                        opciones_metodo_mc = {'bloques': 'Monte Carlo por bloques (iteraciones fijas)'}
+                        opciones_metodo_mc.update({m: f"{nombre} con parada adaptativa" for m, nombre in METODOS_MUESTREO.items()})
+                        metodo_mc = st.selectbox(
+                            "**Método de muestreo**",
+                            options=list(opciones_metodo_mc),
+                            format_func=lambda m: opciones_metodo_mc[m],
+                            key="montecarlo_metodo"
+                        )
+                        col_mc1, col_mc2 = st.columns(2)
+                        with col_mc1:
+                            if metodo_mc == 'bloques':
+                                iteraciones_mc = st.select_slider(
+                                    "**Iteraciones**",
+                                    options=[10_000, 50_000, 100_000, 500_000, 1_000_000],
+                                    value=100_000,
+                                    key="montecarlo_iteraciones"
+                                )
+                            else:
+                                tolerancia_mc = st.select_slider(
+                                    "**Error estándar relativo objetivo**",
+                                    options=[0.01, 0.005, 0.002, 0.001],
+                                    value=0.005,
+                                    format_func=lambda t: f"{t * 100:g}%",
+                                    key="montecarlo_tolerancia"
+                                )
+                        with col_mc2:
+                            semilla_mc = st.number_input("**Semilla**", min_value=0, value=0, step=1, key="montecarlo_semilla")
+                        
+                        if st.button("▶️ Simular", key="simular_montecarlo"):
+                            with st.spinner("Simulando..."):
+                                if metodo_mc == 'bloques':
+                                    resultados['montecarlo'] = simular_montecarlo(
+                                        modelo_lineal, n_iteraciones=iteraciones_mc, semilla=int(semilla_mc), factores_df=factores_resultado,
+                                        ejecutor=obtener_ejecutor_montecarlo()
+                                    )
+                                else:
+                                    resultados['montecarlo'] = simular_adaptativo(
+                                        modelo_lineal, metodo_mc, tolerancia=tolerancia_mc, semilla=int(semilla_mc), factores_df=factores_resultado
+                                    )
+                        
+                        montecarlo = resultados.get('montecarlo')
+                        if montecarlo is not None:
+                            col_mc3, col_mc4, col_mc5 = st.columns(3)
+                            col_mc3.metric("Media (kg CO₂e)", formatear_numero(montecarlo['media'], 4))
+                            col_mc4.metric("Desviación estándar", formatear_numero(montecarlo['desviacion'], 4))
+                            col_mc5.metric("Intervalo 95%",
+                                           f"{formatear_numero(montecarlo['percentiles'][2.5], 4)} – {formatear_numero(montecarlo['percentiles'][97.5], 4)}")
+                            
+                            if 'convergido' in montecarlo:
+                                if montecarlo['convergido']:
+                                    st.success(f"✅ Convergencia con {formatear_numero(montecarlo['n_iteraciones'])} iteraciones")
+                                else:
+                                    st.warning(f"⚠️ Sin convergencia tras {formatear_numero(montecarlo['n_iteraciones'])} iteraciones")
+                        
+                        if montecarlo is not None and 'histograma' in montecarlo:
+                            bordes_mc = montecarlo['histograma']['bordes']
+                            fig_montecarlo = px.bar(
+                                x=(bordes_mc[:-1] + bordes_mc[1:]) / 2,
+                                y=montecarlo['histograma']['conteos'],
+                                title=f"Distribución de la huella ({formatear_numero(montecarlo['n_iteraciones'])} iteraciones)",
+                                labels={'x': 'kg CO₂e', 'y': 'Iteraciones'}
+                            )
+                            fig_montecarlo.update_layout(bargap=0)
+                            st.plotly_chart(fig_montecarlo, use_container_width=True)
+                
+                # OPTIMIZADOR DE SUSTITUCIONES (programa entero con HiGHS)
+                if modelo_lineal is not None and len(modelo_lineal['partidas']) > 0:
+                    with st.expander("🛠️ **Optimizador de Sustituciones**"):
+                        st.caption("Menor huella alcanzable según el número de partidas que se cambien")
+                        nombres_sustitucion = {
+                            ('materias_primas', 'material_empaque'): 'Empaques de materias primas',
+                            ('empaques', 'material_empaque'): 'Empaques del producto',
+                            ('transporte', 'transporte'): 'Transporte de MP y empaques',
+                            ('distribucion', 'transporte'): 'Transporte de distribución',
+                            ('procesamiento', 'energia'): 'Energía de producción'
+                        }
+                        tipos_sustitucion = st.multiselect(
+                            "**Sustituciones permitidas**",
+                            options=DECISIONES_SUSTITUCION,
+                            default=DECISIONES_SUSTITUCION,
+                            format_func=lambda t: nombres_sustitucion.get(t, f"{t[0]} / {t[1]}"),
+                            key="optimizacion_tipos"
+                        )
+                        reduccion_objetivo = st.number_input(
+                            "**Reducción objetivo (%)**", min_value=0.0, max_value=100.0, value=20.0, step=5.0,
+                            key="optimizacion_objetivo"
+                        )
+                        
+                        if st.button("▶️ Optimizar", key="optimizar_sustituciones"):
+                            with st.spinner("Optimizando..."):
+                                resultados['optimizacion'] = frontera_pareto(
+                                    modelo_lineal, matriz_resultado, factores_resultado,
+                                    tipos=tipos_sustitucion
+                                )
+                        
+                        frontera = resultados.get('optimizacion')
+                        if frontera is not None and len(frontera) > 0:
+                            fig_pareto = px.line(
+                                frontera, x='cambios', y='huella', markers=True,
+                                title="Frontera de Pareto: huella vs. número de cambios",
+                                labels={'cambios': 'Número de cambios', 'huella': 'kg CO₂e'}
+                            )
+                            fig_pareto.add_hline(
+                                y=frontera['huella'].iloc[0] * (1 - reduccion_objetivo / 100),
+                                line_dash="dash", annotation_text=f"Objetivo -{reduccion_objetivo:g}%"
+                            )
+                            st.plotly_chart(fig_pareto, use_container_width=True)
+                            
+                            alcanzan = frontera.index[frontera['reduccion_pct'] >= reduccion_objetivo - 1e-9]
+                            if len(alcanzan) > 0:
+                                st.success(f"✅ El objetivo se alcanza con {int(frontera.loc[alcanzan[0], 'cambios'])} cambios")
+                            else:
+                                st.warning(f"⚠️ Reducción máxima alcanzable: {frontera['reduccion_pct'].max():.1f}%")
+                            
+                            punto_pareto = st.selectbox(
+                                "**Ver plan**",
+                                options=list(frontera.index),
+                                index=int(alcanzan[0]) if len(alcanzan) > 0 else len(frontera) - 1,
+                                format_func=lambda i: f"{int(frontera.loc[i, 'cambios'])} cambios: "
+                                                      f"{formatear_numero(frontera.loc[i, 'huella'], 4)} kg CO₂e "
+                                                      f"(-{frontera.loc[i, 'reduccion_pct']:.1f}%)",
+                                key="optimizacion_punto"
+                            )
+                            detalle_plan = frontera.loc[punto_pareto, 'detalle']
+                            if len(detalle_plan) > 0:
+                                st.dataframe(pd.DataFrame({
+                                    'Etapa': detalle_plan['etapa'].map(nombres_etapas_grafico),
+                                    'Partida': detalle_plan['fuente'] + ' / ' + detalle_plan['subfuente'],
+                                    'Actual': detalle_plan['actual'],
+                                    'Nuevo': detalle_plan['nuevo'],
+                                    'Reducción (kg CO₂e)': detalle_plan['reduccion'].map(lambda v: formatear_numero(v, 4))
+                                }), use_container_width=True, hide_index=True)
+                
                 # 5. RECOMENDACIONES
                 st.header("💡 Recomendaciones para Reducción")
                 
                 # Identificar las 3 etapas con mayor impacto
                 etapas_ordenadas = []
                 for etapa_key in ['materias_primas', 'empaques', 'transporte', 'procesamiento', 'distribucion', 'retail', 'fin_vida']:
-                    etapa_data = desglose_detallado.get(etapa_key, {})
-                    total_etapa = etapa_data.get('total', 0)
+                    total_etapa = totales_etapa[etapa_key]
                     if total_etapa > 0.001:
                         etapas_ordenadas.append((etapa_key, total_etapa))
                 
@@ -2975,8 +3378,7 @@ with tabs[10]:
                             ('Retail', 'retail'),
                             ('Fin de Vida', 'fin_vida')
                         ]:
-                            etapa = desglose_detallado.get(etapa_key, {})
-                            total_etapa = etapa.get('total', 0)
+                            total_etapa = totales_etapa[etapa_key]
                             if total_etapa > 0.001:
                                 datos_export.append({
                                     'Etapa': etapa_nombre,
@@ -2995,6 +3397,24 @@ with tabs[10]:
                         
                         with pd.ExcelWriter(archivo, engine='openpyxl') as writer:
                             df_export.to_excel(writer, sheet_name='Resumen por Etapa', index=False)
+                            resultado.tabla[['etapa', 'fuente', 'subfuente', 'item', 'ruta', 'cantidad', 'masa_kg', 'gwp']].rename(
+                                columns={'gwp': 'kg CO₂e'}).to_excel(writer, sheet_name='Detalle por Partida', index=False)
+                            
+                            # Todas las categorías de impacto calculadas (una columna por categoría)
+                            categorias_impacto = resultados.get('categorias_impacto') or {}
+                            if categorias_impacto:
+                                df_impactos = resultado.por_etapa(list(categorias_impacto))
+                                df_impactos.columns = [f"{categorias_impacto[c]['nombre']} ({categorias_impacto[c]['unidad']})"
+                                                       for c in df_impactos.columns]
+                                df_impactos.index.name = 'Etapa'
+                                df_impactos.to_excel(writer, sheet_name='Impactos por Etapa')
+                            
+                            if tiene_desglose_gwp(resultado.tabla):
+                                df_origen = desglose_gwp_por_etapa(resultado.tabla)
+                                df_origen.columns = [f"{HORIZONTES_GWP[h]} {ORIGENES_CARBONO.get(o, 'sin desglose')} (kg CO₂e)"
+                                                     for h, o in df_origen.columns]
+                                df_origen.index.name = 'Etapa'
+                                df_origen.to_excel(writer, sheet_name='Origen del Carbono')
                             
                             # Hoja de supuestos
                             supuestos_data = {
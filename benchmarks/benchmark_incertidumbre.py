@@ -0,0 +1,59 @@
+"""
+Benchmark: propagación analítica de la incertidumbre frente a Monte Carlo
+Compara tiempo, media, desviación e intervalo 95 % para productos de distinto tamaño
+USO: python benchmarks/benchmark_incertidumbre.py
+"""
+
+import copy
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from utils.incertidumbre import propagar_incertidumbre
+from utils.modelo_lineal import compilar_modelo
+from utils.montecarlo import simular_montecarlo
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def producto_ampliado(repeticiones):
+    """Producto de prueba con las materias primas repetidas"""
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['materias_primas'] = datos['materias_primas'] * repeticiones
+    return datos
+
+def medir(funcion, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+def main(iteraciones=100_000):
+    filas = []
+    for repeticiones in (1, 10, 50):
+        modelo = compilar_modelo(producto_ampliado(repeticiones), FACTORES)
+        analitico, t_analitico = medir(propagar_incertidumbre, modelo)
+        muestreo, t_muestreo = medir(simular_montecarlo, modelo, iteraciones, semilla=0, n_procesos=1)
+        total = analitico.loc['total']
+        filas.append({
+            'partidas': len(modelo['partidas']),
+            't_analitico_ms': t_analitico * 1000,
+            't_montecarlo_ms': t_muestreo * 1000,
+            'media_analitica': total['media'],
+            'media_montecarlo': muestreo['media'],
+            'desv_analitica': total['desviacion'],
+            'desv_montecarlo': muestreo['desviacion'],
+            'p2.5_analitico': total['inferior'],
+            'p2.5_montecarlo': muestreo['percentiles'][2.5],
+            'p97.5_analitico': total['superior'],
+            'p97.5_montecarlo': muestreo['percentiles'][97.5]
+        })
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(f"Monte Carlo con {iteraciones} iteraciones (1 proceso)")
+        print(pd.DataFrame(filas).round(5).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
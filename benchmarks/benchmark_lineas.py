@@ -0,0 +1,51 @@
+"""
+Benchmark: memoria por sesión de las líneas del producto en diccionarios frente a
+registros compactos (__slots__)
+Listas de materiales de distinto tamaño, con empaque y tres rutas por materia prima
+USO: python benchmarks/benchmark_lineas.py
+"""
+
+import copy
+import os
+import sys
+import tracemalloc
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.lineas import compactar_lineas
+
+def sesion_sintetica(n_materias):
+    ruta = {'origen': 'Atacama, Chile', 'destino': 'Fábrica Santiago', 'distancia_km': 850.0,
+            'tipo_transporte': 'Camión diesel HGV', 'carga': 20.0, 'unidad_carga': 'kg', 'carga_kg': 20.0}
+    materia = {'producto': 'Pasta de dátil', 'region': 'Chile', 'cantidad_teorica': 19.5, 'unidad_teorica': 'kg',
+               'cantidad_teorica_kg': 19.5, 'cantidad_real': 20.0, 'unidad_real': 'kg', 'cantidad_real_kg': 20.0,
+               'empaque': {'material': 'Cartón', 'peso': 0.2, 'unidad': 'kg', 'peso_kg': 0.2},
+               'transportes': [dict(ruta) for _ in range(3)]}
+    empaque = {'nombre': 'Caja', 'material': 'Cartón', 'peso': 0.01, 'unidad': 'kg', 'cantidad': 2,
+               'peso_kg': 0.01, 'transportes': [dict(ruta)]}
+    return {'materias_primas': [copy.deepcopy(materia) for _ in range(n_materias)],
+            'empaques': [copy.deepcopy(empaque) for _ in range(max(1, n_materias // 10))]}
+
+def memoria(construir):
+    tracemalloc.start()
+    datos = construir()
+    actual = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del datos
+    return actual
+
+def main(tamanos=(10, 100, 1000, 10_000)):
+    filas = []
+    for n in tamanos:
+        en_dicts = memoria(lambda: sesion_sintetica(n))
+        compacta = memoria(lambda: compactar_lineas(sesion_sintetica(n)))
+        filas.append({'materias_primas': n, 'dicts_kb': en_dicts / 1024, 'registros_kb': compacta / 1024,
+                      'reduccion_%': 100 * (1 - compacta / en_dicts),
+                      'ahorro_80_sesiones_mb': 80 * (en_dicts - compacta) / 1024 ** 2})
+    with pd.option_context('display.width', 200):
+        print(pd.DataFrame(filas).round(1).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark: iteraciones necesarias por método de muestreo con parada adaptativa
+Misma tolerancia (media del total, de cada etapa y P95) para Monte Carlo simple,
+hipercubo latino y Sobol aleatorizado
+USO: python benchmarks/benchmark_muestreo.py
+"""
+
+import copy
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from utils.modelo_lineal import compilar_modelo
+from utils.muestreo import METODOS_MUESTREO, simular_adaptativo
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def main(tolerancias=(0.005, 0.002)):
+    filas = []
+    for repeticiones in (1, 10):
+        datos = copy.deepcopy(PRODUCTO_PRUEBA)
+        datos['materias_primas'] = datos['materias_primas'] * repeticiones
+        modelo = compilar_modelo(datos, FACTORES)
+        for tolerancia in tolerancias:
+            for metodo in METODOS_MUESTREO:
+                inicio = time.perf_counter()
+                resultado = simular_adaptativo(modelo, metodo, tolerancia=tolerancia, semilla=0)
+                filas.append({
+                    'partidas': len(modelo['partidas']),
+                    'tolerancia': tolerancia,
+                    'metodo': metodo,
+                    'iteraciones': resultado['n_iteraciones'],
+                    'convergido': resultado['convergido'],
+                    'media': resultado['media'],
+                    'p95': resultado['percentiles'][95],
+                    'tiempo_ms': (time.perf_counter() - inicio) * 1000
+                })
+
+    with pd.option_context('display.width', 200):
+        print(pd.DataFrame(filas).round(5).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: núcleos compilados con Numba frente a las versiones NumPy
+Cartera sintética de 1 M de tramos: suma por (producto, etapa), fin de vida con
+porcentajes dispersos y acumulación de los totales de Monte Carlo
+USO: python benchmarks/benchmark_nucleos.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils import nucleos
+
+def cartera_sintetica(n_tramos=1_000_000, n_productos=10_000, n_categorias=6, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return {
+        'grupos': rng.integers(0, n_productos * 7, n_tramos),
+        'impactos': rng.random((n_tramos, n_categorias)),
+        'n_grupos': n_productos * 7,
+        'masas': rng.random(n_tramos),
+        'porcentajes': np.where(rng.random((n_tramos, 4)) < 0.25, rng.random((n_tramos, 4)), 0.0),
+        'factores_material': rng.random((200, 4)),
+        'materiales': rng.integers(0, 200, n_tramos),
+        'cantidades': rng.random(n_tramos // 1000),
+        'factores': rng.random(500),
+        'posiciones': rng.integers(0, 500, n_tramos // 1000),
+        'normales_cantidades': rng.standard_normal((1000, n_tramos // 1000)),
+        'normales_factores': rng.standard_normal((1000, 500))
+    }
+
+def medir(funcion, *args, repeticiones=3):
+    funcion(*args)  # compilación / calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, min(tiempos) * 1000
+
+def main():
+    c = cartera_sintetica()
+    pruebas = {
+        'suma por (producto, etapa)': (nucleos.sumar_por_grupo, c['grupos'], c['impactos'], c['n_grupos']),
+        'fin de vida disperso': (nucleos.emisiones_fin_vida, c['masas'], c['porcentajes'], c['factores_material'],
+                                 c['materiales']),
+        'Monte Carlo (1000 × 1000)': (nucleos.totales_montecarlo, c['cantidades'], c['factores'], c['posiciones'],
+                                      0.2, 0.3, c['normales_cantidades'], c['normales_factores'])
+    }
+    modos = [False, True] if nucleos.NUMBA_DISPONIBLE else [False]
+    filas = []
+    for nombre, (funcion, *args) in pruebas.items():
+        tiempos, resultados = {}, {}
+        for activo in modos:
+            anterior = nucleos.usar_numba(activo)
+            resultados[activo], tiempos[activo] = medir(funcion, *args)
+            nucleos.usar_numba(anterior)
+        fila = {'núcleo': nombre, 'numpy_ms': tiempos[False]}
+        if True in tiempos:
+            fila['numba_ms'] = tiempos[True]
+            fila['aceleracion'] = tiempos[False] / tiempos[True]
+            fila['diferencia_max'] = float(np.max(np.abs(resultados[True] - resultados[False])))
+        filas.append(fila)
+
+    if not nucleos.NUMBA_DISPONIBLE:
+        print("numba no está instalado: solo se miden las versiones NumPy")
+    with pd.option_context('display.width', 200):
+        print(pd.DataFrame(filas).round(3).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: tiempo de re-ejecución de la pestaña de resultados
+Ejecuta la app sin navegador (streamlit.testing) con y sin un resultado calculado
+en la sesión; la diferencia es el coste de la pestaña en cada re-ejecución
+USO: python benchmarks/benchmark_resultados.py
+"""
+
+import copy
+import logging
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'tests'))
+
+from streamlit.testing.v1 import AppTest
+from utils.cache_resultados import abrir_cache, calcular_resultado_con_cache
+from utils.motor import detectar_categorias_impacto, preparar_matriz_factores
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+RUTA_APP = os.path.join(os.path.dirname(__file__), '..', 'app.py')
+
+def producto_ampliado(repeticiones):
+    """Producto de prueba con materias primas y empaques distintos repetidos"""
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['producto'].update({'unidad_funcional': '1 unidad', 'peso_neto': 0.05, 'unidad_peso': 'kg',
+                              'peso_empaque': 0.0, 'unidad_empaque': 'kg'})
+    datos['materias_primas'] = [dict(mp, producto=f"{mp['producto']} {i}") if i else mp
+                                for i in range(repeticiones) for mp in copy.deepcopy(PRODUCTO_PRUEBA['materias_primas'])]
+    datos['empaques'] = [dict(emp, nombre=f"{emp['nombre']} {i}") if i else emp
+                         for i in range(repeticiones) for emp in copy.deepcopy(PRODUCTO_PRUEBA['empaques'])]
+    for gestion in datos['uso_fin_vida']['gestion_empaques']:
+        gestion.update(tipo_gestion='Vertedero', distancia_km=10.0, tipo_transporte='Camión diesel', emisiones=0.0)
+    return datos
+
+def resultados_calculados(datos):
+    """Lo que la app guarda en session_state.resultados_calculados tras calcular"""
+    clave, resultado = calcular_resultado_con_cache(abrir_cache(':memory:'), datos, FACTORES,
+                                                    matriz_factores=preparar_matriz_factores(FACTORES))
+    return {
+        'resultado': resultado,
+        'tabla_coproductos': None,
+        'categorias_impacto': detectar_categorias_impacto(FACTORES),
+        'fecha_calculo': pd.Timestamp.now(),
+        'version_factores': None,
+        'clave_resultado': clave,
+        'producto_nombre': datos['producto']['nombre'],
+        'peso_producto_kg': datos['producto']['peso_neto_kg']
+    }
+
+def tiempo_ejecucion(app):
+    inicio = time.perf_counter()
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    return (time.perf_counter() - inicio) * 1000
+
+def main(tamanos=(1, 20, 100), repeticiones=15):
+    filas = []
+    for repeticion in tamanos:
+        datos = producto_ampliado(repeticion)
+        resultados = resultados_calculados(datos)
+        app = AppTest.from_file(RUTA_APP, default_timeout=300)
+        # Las páginas de entrada admiten hasta 20 líneas: la sesión lleva el producto base
+        for clave, valor in producto_ampliado(1).items():
+            app.session_state[clave] = valor
+        app.run()
+        # Calentamiento (cachés de recursos y figuras) y ejecuciones alternas sin y con resultado,
+        # para que las variaciones de la máquina afecten por igual a las dos medidas
+        app.session_state['resultados_calculados'] = resultados
+        app.run()
+        sin_resultados, con_resultados = [], []
+        for _ in range(repeticiones):
+            del app.session_state['resultados_calculados']
+            sin_resultados.append(tiempo_ejecucion(app))
+            app.session_state['resultados_calculados'] = resultados
+            con_resultados.append(tiempo_ejecucion(app))
+        filas.append({'materias_primas': len(datos['materias_primas']),
+                      'sin_resultados_ms': np.median(sin_resultados),
+                      'con_resultados_ms': np.median(con_resultados),
+                      'pestana_resultados_ms': np.median(np.subtract(con_resultados, sin_resultados))})
+    with pd.option_context('display.width', 200):
+        print(pd.DataFrame(filas).round(1).to_string(index=False))
+
+if __name__ == '__main__':
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)
+    main()
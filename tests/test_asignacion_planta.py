@@ -0,0 +1,69 @@
+"""
+Tests para la asignación de energía y agua de planta a SKUs
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.asignacion_planta import asignar_consumos, datos_asignados, totales_asignados
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import ETAPAS, construir_partidas, preparar_matriz_factores
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+PLANTAS = pd.DataFrame({
+    'planta': ['Norte', 'Sur'],
+    'energia_kwh': [12000.0, 5000.0],
+    'agua_m3': [300.0, 0.0],
+    'inductor_energia': ['horas_maquina', 'masa'],
+    'inductor_agua': ['volumen', 'masa'],
+    'tipo_energia': ['Energía solar', None],
+    'region': ['España', '']
+})
+
+SKUS = pd.DataFrame({
+    'sku': ['A', 'B', 'C', 'D'],
+    'planta': ['Norte', 'Norte', 'Sur', 'Sur'],
+    'unidades': [10000, 30000, 5000, 20000],
+    'masa_kg': [500.0, 1500.0, 1000.0, 4000.0],
+    'horas_maquina': [100.0, 200.0, 0.0, 0.0]
+})
+
+def test_reparto_por_inductor():
+    asignacion = asignar_consumos(PLANTAS, SKUS).set_index('sku')
+    np.testing.assert_allclose(asignacion['energia_kwh'], [4000, 8000, 1000, 4000])
+    np.testing.assert_allclose(asignacion['agua_m3'], [75, 225, 0, 0])
+    np.testing.assert_allclose(asignacion['energia_kwh_unidad'], [0.4, 8000 / 30000, 0.2, 0.2])
+    # Lo asignado suma exactamente el total de cada planta
+    assert asignacion.groupby('planta')['energia_kwh'].sum().tolist() == pytest.approx([12000, 5000])
+
+def test_errores_de_asignacion():
+    with pytest.raises(ValueError, match='Oeste'):
+        asignar_consumos(PLANTAS, SKUS.assign(planta=['Norte', 'Norte', 'Sur', 'Oeste']))
+    with pytest.raises(ValueError, match='Inductor'):
+        asignar_consumos(PLANTAS.assign(inductor_agua=['superficie', 'masa']), SKUS)
+    with pytest.raises(ValueError, match='energia_kwh'):
+        asignar_consumos(PLANTAS, SKUS.drop(columns='horas_maquina'))
+
+def test_lote_igual_a_calculo_detallado():
+    asignacion = asignar_consumos(PLANTAS, SKUS)
+    cartera = []
+    for i in range(len(SKUS)):
+        datos = copy.deepcopy(PRODUCTO_PRUEBA)
+        datos['materias_primas'][0]['cantidad_real_kg'] = 0.01 * (i + 1)
+        cartera.append(datos)
+    totales = totales_asignados([construir_partidas(d, FACTORES) for d in cartera], asignacion, PLANTAS,
+                                FACTORES, preparar_matriz_factores(FACTORES))
+
+    plantas = PLANTAS.set_index('planta')
+    for i, datos in enumerate(cartera):
+        fila = asignacion.iloc[i]
+        total, desglose = calcular_emisiones_detalladas_completas(
+            datos_asignados(datos, fila, plantas.loc[fila['planta']]), FACTORES)
+        assert totales[i, :, 0].sum() == pytest.approx(total)
+        assert totales[i, ETAPAS.index('procesamiento'), 0] == pytest.approx(desglose['procesamiento']['total'])
@@ -0,0 +1,69 @@
+"""
+Tests para el motor de balance de masa
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.balance_masa import calcular_balance_masa_lote
+from utils.calculos import calcular_balance_masa
+
+def producto_prueba(peso_producto_kg=9.0, perdidas_kg=0.0):
+    return {
+        'producto': {'nombre': 'Barra', 'peso_neto_kg': peso_producto_kg},
+        'materias_primas': [
+            {'producto': 'Trigo', 'cantidad_real_kg': 10.0, 'cantidad_teorica_kg': 9.0,
+             'empaque': {'material': 'PET', 'peso_kg': 0.1}}
+        ],
+        'empaques': [{'nombre': 'Bolsa', 'peso_kg': 0.05, 'cantidad': 2}],
+        'produccion': {
+            'mermas_gestionadas': [{'cantidad_kg': 0.6, 'tipo_gestion': 'Compostaje'}],
+            'perdidas_sin_emisiones_kg': perdidas_kg
+        }
+    }
+
+def test_calcular_balance_masa_entradas_y_salidas():
+    datos = producto_prueba()
+    balance = calcular_balance_masa(datos['materias_primas'], datos['empaques'],
+                                    datos['producto'], datos['produccion'])
+
+    assert balance['entradas']['materias_primas_kg'] == 10.0
+    assert balance['entradas']['empaques_materias_primas_kg'] == 0.1
+    assert balance['entradas']['empaques_producto_kg'] == 0.1
+    assert balance['entradas']['total_entradas_kg'] == pytest.approx(10.2)
+    assert balance['salidas']['mermas_compostaje_kg'] == 0.6
+    assert balance['salidas']['mermas_sin_gestion_kg'] == pytest.approx(0.4)
+    assert balance['error_cierre_kg'] == pytest.approx(0.0)
+    assert balance['cierra']
+
+def test_balance_lote_marca_productos_que_no_cierran():
+    productos = [producto_prueba(), producto_prueba(peso_producto_kg=7.0), producto_prueba(7.0, perdidas_kg=2.0)]
+    balance = calcular_balance_masa_lote(productos, nombres=['ok', 'falta', 'evaporacion'])
+
+    assert balance.loc['falta', 'error_cierre_kg'] == pytest.approx(2.0)
+    assert balance.loc['falta', 'error_cierre_pct'] == pytest.approx(2.0 / 10.2 * 100)
+    assert balance.index[~balance['cierra']].tolist() == ['falta']
+
+def test_balance_lote_vacio():
+    balance = calcular_balance_masa_lote([])
+    assert len(balance) == 0
+    assert 'cierra' in balance.columns
+
+def test_mermas_con_tildes_y_tratamientos_desconocidos():
+    datos = producto_prueba()
+    datos['produccion']['mermas_gestionadas'] = [
+        {'cantidad_kg': 0.3, 'tipo_gestion': 'Incineración'},
+        {'cantidad_kg': 0.2, 'tipo_gestion': 'incineracion'},
+        {'cantidad_kg': 0.1, 'tipo_gestion': 'Biodigestión'}
+    ]
+    balance = calcular_balance_masa(datos['materias_primas'], datos['empaques'],
+                                    datos['producto'], datos['produccion'])
+
+    assert balance['salidas']['mermas_incineracion_kg'] == pytest.approx(0.5)
+    assert balance['salidas']['mermas_vertedero_kg'] == 0.0
+    assert balance['salidas']['mermas_otros_kg'] == pytest.approx(0.1)
+    assert balance['salidas']['mermas_sin_gestion_kg'] == pytest.approx(0.4)
+    assert balance['cierra']
@@ -0,0 +1,108 @@
+"""
+Tests para la caché de resultados por contenido
+"""
+
+import copy
+import numpy as np
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import utils.cache_resultados as cache_resultados
+from utils.cache_resultados import (
+    abrir_cache,
+    calcular_con_cache,
+    calcular_resultado_con_cache,
+    clave_resultado,
+    estadisticas_cache,
+    guardar_resultado,
+    hash_producto,
+    obtener_resultado
+)
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.perfiles_horarios import HORAS_ANIO, guardar_perfiles
+from utils.resultados import calcular_resultado
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_hash_canonico():
+    reordenado = {clave: PRODUCTO_PRUEBA[clave] for clave in reversed(list(PRODUCTO_PRUEBA))}
+    assert hash_producto(reordenado) == hash_producto(PRODUCTO_PRUEBA)
+
+    modificado = copy.deepcopy(PRODUCTO_PRUEBA)
+    modificado['materias_primas'][0]['cantidad_real_kg'] += 0.001
+    assert hash_producto(modificado) != hash_producto(PRODUCTO_PRUEBA)
+
+    factores = FACTORES.copy()
+    factores.loc[0, 'factor_kgCO2e_per_unit'] += 0.1
+    assert clave_resultado(PRODUCTO_PRUEBA, factores) != clave_resultado(PRODUCTO_PRUEBA, FACTORES)
+
+def test_clave_cambia_con_los_perfiles_horarios(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'perfiles')
+    monkeypatch.setattr('utils.perfiles_horarios.RUTA_PERFILES_DEFECTO', ruta)
+    guardar_perfiles({'Red': np.full(HORAS_ANIO, 0.3)}, ruta)
+    con_perfiles = copy.deepcopy(PRODUCTO_PRUEBA)
+    con_perfiles['produccion'].update({'perfil_red': 'Red', 'perfil_carga': 'Turno nocturno (22-6 h)'})
+    antes = clave_resultado(con_perfiles, FACTORES), clave_resultado(PRODUCTO_PRUEBA, FACTORES)
+
+    # Mismo producto, perfiles de red distintos en el archivo: otra clave
+    guardar_perfiles({'Red': np.where(np.arange(HORAS_ANIO) % 24 < 6, 0.5, 0.1)}, ruta)
+    assert clave_resultado(con_perfiles, FACTORES) != antes[0]
+    # Los productos sin perfiles conservan su clave
+    assert clave_resultado(PRODUCTO_PRUEBA, FACTORES) == antes[1]
+
+def test_acierto_no_ejecuta_etapas(tmp_path, monkeypatch):
+    cache = abrir_cache(str(tmp_path / 'cache.sqlite'))
+    total, desglose = calcular_con_cache(cache, PRODUCTO_PRUEBA, FACTORES)
+    esperado_total, esperado_desglose = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    assert total == pytest.approx(esperado_total)
+
+    def no_llamar(*args, **kwargs):
+        raise AssertionError("Un acierto no debe recalcular")
+    monkeypatch.setattr(cache_resultados, 'calcular_emisiones_detalladas_completas', no_llamar)
+
+    # También desde otra conexión (persistente en disco)
+    otra = abrir_cache(str(tmp_path / 'cache.sqlite'))
+    total_cache, desglose_cache = calcular_con_cache(otra, copy.deepcopy(PRODUCTO_PRUEBA), FACTORES)
+    assert total_cache == total
+    assert desglose_cache.keys() == esperado_desglose.keys()
+    assert desglose_cache['materias_primas']['total'] == desglose['materias_primas']['total']
+
+    estadisticas = estadisticas_cache(otra)
+    assert (estadisticas['aciertos'], estadisticas['fallos']) == (1, 0)
+    assert estadisticas['tasa_aciertos_acumulada'] == pytest.approx(0.5)
+
+def test_resultado_en_tabla_desde_la_cache(tmp_path, monkeypatch):
+    cache = abrir_cache(str(tmp_path / 'cache.sqlite'))
+    clave, resultado = calcular_resultado_con_cache(cache, PRODUCTO_PRUEBA, FACTORES)
+    assert clave == clave_resultado(PRODUCTO_PRUEBA, FACTORES)
+    assert resultado.total() == pytest.approx(calcular_resultado(PRODUCTO_PRUEBA, FACTORES).total())
+
+    def no_llamar(*args, **kwargs):
+        raise AssertionError("Un acierto no debe recalcular")
+    monkeypatch.setattr(cache_resultados, 'calcular_resultado', no_llamar)
+
+    otra = abrir_cache(str(tmp_path / 'cache.sqlite'))
+    clave_cache, resultado_cache = calcular_resultado_con_cache(otra, copy.deepcopy(PRODUCTO_PRUEBA), FACTORES)
+    assert clave_cache == clave
+    assert resultado_cache.tabla.equals(resultado.tabla)
+    assert resultado_cache.detalle_etapas()['materias_primas'].equals(resultado.detalle_etapas()['materias_primas'])
+
+    # El desglose y la tabla del mismo producto son entradas distintas
+    total, _ = calcular_con_cache(otra, PRODUCTO_PRUEBA, FACTORES)
+    assert total == pytest.approx(resultado.total())
+
+def test_expulsion_lru_por_tamano(tmp_path):
+    cache = abrir_cache(str(tmp_path / 'cache.sqlite'))
+    guardar_resultado(cache, 'a:v', 1.0, {'datos': 'x' * 10})
+    tamano = estadisticas_cache(cache)['tamano_bytes']
+    cache['tamano_maximo'] = 2 * tamano
+    guardar_resultado(cache, 'b:v', 2.0, {'datos': 'x' * 10})
+    assert obtener_resultado(cache, 'a:v') is not None  # 'a' pasa a ser la más reciente
+    guardar_resultado(cache, 'c:v', 3.0, {'datos': 'x' * 10})
+
+    assert obtener_resultado(cache, 'b:v') is None
+    assert obtener_resultado(cache, 'a:v')[0] == 1.0
+    assert obtener_resultado(cache, 'c:v')[0] == 3.0
+    assert estadisticas_cache(cache)['entradas'] == 2
@@ -0,0 +1,75 @@
+"""
+Tests para la asignación de cargas entre coproductos
+"""
+
+import copy
+import numpy as np
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas, obtener_factor
+from utils.coproductos import ETAPAS_COMPARTIDAS, fracciones_asignacion, matriz_asignacion, repartir_totales
+from utils.motor import ETAPAS, calcular_impactos_producto, totales_coproductos, totales_por_etapa
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def _con_coproductos(metodo):
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['producto']['precio_kg'] = 8.0
+    datos['coproductos'] = {'metodo': metodo, 'lista': [
+        {'nombre': 'Suero', 'masa_kg': 0.1, 'precio_kg': 0.5, 'item_sustituido': 'Leche entera'},
+        {'nombre': 'Salvado', 'masa_kg': 0.05, 'precio_kg': 1.0, 'item_sustituido': 'Avena en escama'}
+    ]}
+    return datos
+
+def test_fracciones():
+    masas, precios = [0.05, 0.1, 0.05], [8.0, 0.5, 1.0]
+    np.testing.assert_allclose(fracciones_asignacion(masas, precios, 'masa'), [0.25, 0.5, 0.25])
+    np.testing.assert_allclose(fracciones_asignacion(masas, precios, 'economica'), [0.4, 0.05, 0.05]
+                               / np.sum([0.4, 0.05, 0.05]))
+    np.testing.assert_allclose(fracciones_asignacion(masas, precios, 'sustitucion'), [1, 0, 0])
+    np.testing.assert_allclose(fracciones_asignacion([1.0, 2.0], [0.0, 0.0], 'economica'), [1, 0])
+
+def test_reparto_matricial_de_cientos_de_coproductos():
+    rng = np.random.default_rng(3)
+    configuracion = {'metodo': 'masa', 'etapas': ETAPAS_COMPARTIDAS,
+                     'masas': rng.random(300) + 0.1, 'precios': np.ones(300)}
+    totales = rng.random((len(ETAPAS), 4))
+    repartidos = repartir_totales(totales, matriz_asignacion(configuracion, ETAPAS))
+    assert repartidos.shape == (300, len(ETAPAS), 4)
+    # Las cargas compartidas se conservan; las demás etapas son solo del principal
+    np.testing.assert_allclose(repartidos.sum(axis=0), totales)
+    propias = [ETAPAS.index(e) for e in ETAPAS if e not in ETAPAS_COMPARTIDAS]
+    assert not repartidos[1:, propias].any()
+
+@pytest.mark.parametrize('metodo', ['masa', 'economica', 'sustitucion'])
+def test_mismo_resultado_que_calculo_detallado(metodo):
+    datos = _con_coproductos(metodo)
+    total, desglose = calcular_emisiones_detalladas_completas(datos, FACTORES)
+    por_etapa = totales_por_etapa(calcular_impactos_producto(datos, FACTORES))
+    assert por_etapa['gwp'].sum() == pytest.approx(total)
+    for etapa in ETAPAS:
+        assert por_etapa.loc[etapa, 'gwp'] == pytest.approx(desglose[etapa]['total'])
+
+    nombres, repartidos = totales_coproductos(datos, FACTORES)
+    assert nombres == ['Barra', 'Suero', 'Salvado']
+    np.testing.assert_allclose(repartidos[0, :, 0], por_etapa['gwp'].to_numpy())
+
+def test_sustitucion_acredita_productos_evitados():
+    sin_coproductos, _ = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    total, desglose = calcular_emisiones_detalladas_completas(_con_coproductos('sustitucion'), FACTORES)
+    credito = (0.1 * obtener_factor(FACTORES, 'materia_prima', 'Leche entera')[0]
+               + 0.05 * obtener_factor(FACTORES, 'materia_prima', 'Avena en escama')[0])
+    assert total == pytest.approx(sin_coproductos - credito)
+    assert desglose['procesamiento']['fuentes']['Crédito coproductos'] == pytest.approx(-credito)
+
+def test_masa_escala_fuentes_del_desglose():
+    _, base = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    _, desglose = calcular_emisiones_detalladas_completas(_con_coproductos('masa'), FACTORES)
+    fraccion = 0.05 / 0.2
+    fuente = desglose['materias_primas']['fuentes']['Pasta de dátil']
+    assert fuente['total'] == pytest.approx(base['materias_primas']['fuentes']['Pasta de dátil']['total'] * fraccion)
+    assert fuente['cantidad_kg'] == base['materias_primas']['fuentes']['Pasta de dátil']['cantidad_kg']
+    assert desglose['empaques']['total'] == pytest.approx(base['empaques']['total'])
@@ -0,0 +1,92 @@
+"""
+Tests para el barrido de escenarios
+"""
+
+import pandas as pd
+import pytest
+import copy
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.motor import preparar_matriz_factores
+from utils.modelo_lineal import compilar_modelo, total_modelo
+from utils.escenarios import evaluar_escenarios
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+PARAMETROS = {
+    'energia': {'tipo': 'sustitucion', 'filtro': {'etapa': 'procesamiento', 'categoria': 'energia'},
+                'opciones': ['Red eléctrica promedio', 'Energía solar', 'Energía eólica']},
+    'transporte': {'tipo': 'sustitucion', 'filtro': {'categoria': 'transporte', 'item': 'Camión diesel HGV'},
+                   'opciones': ['Camión diesel HGV', 'Tren eléctrico']},
+    'datil': {'tipo': 'multiplicador', 'filtro': {'fuente': 'Pasta de dátil', 'subfuente': 'material'},
+              'valores': [0.5, 1.0, 1.5]},
+    'pp': {'tipo': 'factor', 'filtro': {'item': 'PP'}, 'valores': [2.36, 1.0]}
+}
+
+def test_rejilla_completa_y_ranking():
+    matriz = preparar_matriz_factores(FACTORES)
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES, matriz)
+    resultado = evaluar_escenarios(modelo, matriz, PARAMETROS, tamano_bloque=5)
+
+    assert len(resultado) == 3 * 2 * 3 * 2
+    assert resultado['ranking'].tolist() == list(range(1, len(resultado) + 1))
+    assert resultado['total_gwp'].is_monotonic_increasing
+
+    actual = resultado[(resultado['energia'] == 'Energía solar') & (resultado['transporte'] == 'Camión diesel HGV')
+                       & (resultado['datil'] == '×1') & (resultado['pp'] == '2.36')]
+    assert actual['diferencia_pct'].iloc[0] == pytest.approx(0.0)
+
+def test_escenario_coincide_con_producto_modificado():
+    matriz = preparar_matriz_factores(FACTORES)
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES, matriz)
+    resultado = evaluar_escenarios(modelo, matriz, PARAMETROS)
+    fila = resultado[(resultado['energia'] == 'Red eléctrica promedio') & (resultado['transporte'] == 'Tren eléctrico')
+                     & (resultado['datil'] == '×1.5') & (resultado['pp'] == '2.36')].iloc[0]
+
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['produccion']['tipo_energia'] = 'Red eléctrica promedio'
+    datos['materias_primas'][0]['cantidad_real_kg'] *= 1.5
+    for elemento in datos['materias_primas'] + datos['empaques']:
+        for ruta in elemento.get('transportes', []):
+            if ruta['tipo_transporte'] == 'Camión diesel HGV':
+                ruta['tipo_transporte'] = 'Tren eléctrico'
+    for canal in datos['distribucion']['canales']:
+        for ruta in canal['rutas']:
+            ruta['tipo_transporte'] = 'Tren eléctrico'
+
+    assert fila['total_gwp'] == pytest.approx(total_modelo(compilar_modelo(datos, FACTORES)))
+
+def test_rejilla_demasiado_grande():
+    matriz = preparar_matriz_factores(FACTORES)
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES, matriz)
+    with pytest.raises(ValueError):
+        evaluar_escenarios(modelo, matriz, PARAMETROS, max_escenarios=10)
+
+def test_sin_parametros_devuelve_escenario_actual():
+    matriz = preparar_matriz_factores(FACTORES)
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES, matriz)
+    resultado = evaluar_escenarios(modelo, matriz, {})
+    assert len(resultado) == 1
+    assert resultado['total_gwp'].iloc[0] == pytest.approx(total_modelo(modelo))
+
+def test_sustitucion_en_la_region_de_la_partida():
+    avena = FACTORES[FACTORES['item'] == 'Avena en escama'].iloc[0]
+    trigo = FACTORES[FACTORES['item'] == 'Trigo'].iloc[0]
+    factores = pd.concat([FACTORES, pd.DataFrame([
+        avena.to_dict() | {'region': 'UE', 'factor_kgCO2e_per_unit': 0.7},
+        trigo.to_dict() | {'region': 'UE', 'factor_kgCO2e_per_unit': 0.3}
+    ])], ignore_index=True)
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['materias_primas'][1]['region'] = 'UE'
+    matriz = preparar_matriz_factores(factores)
+    modelo = compilar_modelo(datos, factores, matriz)
+    parametros = {'avena': {'tipo': 'sustitucion', 'filtro': {'fuente': 'Avena en escama', 'categoria': 'materia_prima'},
+                            'opciones': ['Avena en escama', 'Trigo']}}
+    resultado = evaluar_escenarios(modelo, matriz, parametros).set_index('avena')
+
+    assert resultado.loc['Avena en escama', 'total_gwp'] == pytest.approx(total_modelo(modelo))
+    assert resultado.loc['Avena en escama', 'diferencia_pct'] == pytest.approx(0.0)
+    datos['materias_primas'][1]['producto'] = 'Trigo'
+    assert resultado.loc['Trigo', 'total_gwp'] == pytest.approx(total_modelo(compilar_modelo(datos, factores)))
@@ -0,0 +1,62 @@
+"""
+Tests para la caché de figuras de la pestaña de resultados
+"""
+
+import sys
+import os
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.figuras import clave_figura, crear_cache_figuras, estadisticas_figuras, obtener_figura
+
+def _contador():
+    llamadas = []
+    def construir():
+        llamadas.append(1)
+        return {'figura': len(llamadas)}
+    return construir, llamadas
+
+def test_misma_clave_no_reconstruye():
+    cache = crear_cache_figuras()
+    construir, llamadas = _contador()
+    primera = obtener_figura(cache, 'abc:v1', 'barras_etapas', construir, categoria='gwp', unidad_funcional='1 kg')
+    segunda = obtener_figura(cache, 'abc:v1', 'barras_etapas', construir, unidad_funcional='1 kg', categoria='gwp')
+    assert primera is segunda and len(llamadas) == 1
+    # Otro resultado, tipo u opción es otra figura
+    obtener_figura(cache, 'abd:v1', 'barras_etapas', construir, categoria='gwp', unidad_funcional='1 kg')
+    obtener_figura(cache, 'abc:v1', 'torta_etapas', construir, categoria='gwp', unidad_funcional='1 kg')
+    obtener_figura(cache, 'abc:v1', 'barras_etapas', construir, categoria='agua', unidad_funcional='1 kg')
+    assert len(llamadas) == 4
+    estadisticas = estadisticas_figuras(cache)
+    assert (estadisticas['aciertos'], estadisticas['fallos'], estadisticas['figuras']) == (1, 4, 4)
+
+def test_expulsa_la_menos_usada_recientemente():
+    cache = crear_cache_figuras(maximo_figuras=2)
+    construir, llamadas = _contador()
+    obtener_figura(cache, 'a', 'torta', construir)
+    obtener_figura(cache, 'b', 'torta', construir)
+    obtener_figura(cache, 'a', 'torta', construir)
+    obtener_figura(cache, 'c', 'torta', construir)
+    assert list(cache['figuras']) == [clave_figura('a', 'torta', {}), clave_figura('c', 'torta', {})]
+    obtener_figura(cache, 'b', 'torta', construir)
+    assert len(llamadas) == 4
+
+def test_sin_clave_de_resultado_no_guarda():
+    cache = crear_cache_figuras()
+    construir, llamadas = _contador()
+    obtener_figura(cache, None, 'torta', construir)
+    obtener_figura(cache, None, 'torta', construir)
+    assert len(llamadas) == 2 and not cache['figuras']
+
+def test_compartida_entre_hilos():
+    cache = crear_cache_figuras(maximo_figuras=8)
+    construir, _ = _contador()
+    hilos = [threading.Thread(target=lambda i=i: [obtener_figura(cache, f'r{j % 12}', 'torta', construir)
+                                                  for j in range(i, i + 200)]) for i in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(cache['figuras']) == 8
+    assert estadisticas_figuras(cache)['aciertos'] + estadisticas_figuras(cache)['fallos'] == 1600
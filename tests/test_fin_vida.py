@@ -0,0 +1,78 @@
+"""
+Tests para el cálculo matricial de fin de vida
+"""
+
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import (
+    calcular_emisiones_residuos,
+    calcular_emisiones_fin_vida_matricial,
+    calcular_emisiones_uso_fin_vida,
+    construir_matriz_fin_vida,
+    construir_matriz_porcentajes
+)
+
+FACTORES_PRUEBA = pd.DataFrame({
+    'category': ['material_empaque', 'material_empaque', 'residuo', 'residuo', 'residuo',
+                 'residuo', 'residuo', 'residuo'],
+    'subcategory': ['plasticos', 'papel', 'disposicion', 'disposicion', 'disposicion',
+                    'disposicion', 'disposicion', 'disposicion'],
+    'item': ['PET', 'Cartón', 'Vertedero cartón', 'Vertedero general', 'Reciclaje general',
+             'Incineración', 'Compostaje', 'Reciclaje'],
+    'unit': ['kg'] * 8,
+    'factor_kgCO2e_per_unit': [3.0, 0.3, 1.75, 0.01, 0.006, 0.6, -0.1, -1.5]
+})
+
+def test_vertedero_usa_factor_del_material():
+    """El vertedero de PET no debe resolverse al primer ítem 'Vertedero cartón'"""
+    porcentajes = {'porcentaje_vertedero': 100}
+    assert calcular_emisiones_residuos(2.0, FACTORES_PRUEBA, porcentajes, 'PET') == pytest.approx(2.0 * 0.01)
+    assert calcular_emisiones_residuos(2.0, FACTORES_PRUEBA, porcentajes, 'Cartón') == pytest.approx(2.0 * 1.75)
+
+def test_matriz_factores_se_resuelve_por_material_unico():
+    materiales, matriz, indices = construir_matriz_fin_vida(FACTORES_PRUEBA, ['PET', 'Cartón', 'pet'])
+    assert len(materiales) == 2
+    assert matriz.shape == (2, 4)
+    assert indices[0] == indices[2]
+
+def test_calculo_matricial_coincide_con_calculo_por_empaque():
+    rng = np.random.default_rng(0)
+    n = 1000
+    materiales = rng.choice(['PET', 'Cartón', 'Desconocido'], size=n).tolist()
+    masas = rng.uniform(0.01, 1.0, size=n)
+    porcentajes = rng.dirichlet(np.ones(4), size=n)
+
+    emisiones = calcular_emisiones_fin_vida_matricial(masas, porcentajes, materiales, FACTORES_PRUEBA)
+
+    for i in range(0, n, 97):
+        distribucion = {
+            'porcentaje_vertedero': porcentajes[i, 0] * 100,
+            'porcentaje_incineracion': porcentajes[i, 1] * 100,
+            'porcentaje_compostaje': porcentajes[i, 2] * 100,
+            'porcentaje_reciclaje': porcentajes[i, 3] * 100
+        }
+        esperado = calcular_emisiones_residuos(masas[i], FACTORES_PRUEBA, distribucion, materiales[i])
+        assert emisiones[i] == pytest.approx(esperado)
+
+def test_construir_matriz_porcentajes():
+    matriz = construir_matriz_porcentajes([{'porcentaje_reciclaje': 50, 'porcentaje_vertedero': 50}, {}])
+    assert matriz.tolist() == [[0.5, 0.0, 0.0, 0.5], [0.0, 0.0, 0.0, 0.0]]
+
+def test_uso_fin_vida_con_varios_empaques():
+    datos = {
+        'gestion_empaques': [
+            {'nombre_empaque': 'Botella', 'material': 'PET', 'peso_kg': 1.0,
+             'porcentajes': {'porcentaje_reciclaje': 100}},
+            {'nombre_empaque': 'Caja', 'material': 'Cartón', 'peso_kg': 2.0,
+             'porcentajes': {'porcentaje_vertedero': 100}}
+        ]
+    }
+    total, desglose = calcular_emisiones_uso_fin_vida(datos, FACTORES_PRUEBA)
+    assert total == pytest.approx(1.0 * 0.006 + 2.0 * 1.75)
+    assert desglose['fin_vida']['Caja']['emisiones'] == pytest.approx(3.5)
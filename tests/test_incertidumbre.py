@@ -0,0 +1,51 @@
+"""
+Tests para la propagación analítica de la incertidumbre
+"""
+
+import pytest
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.incertidumbre import gsd_modelo, gsd_pedigri, propagar_incertidumbre
+from utils.modelo_lineal import compilar_modelo, totales_modelo
+from utils.montecarlo import simular_montecarlo
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_analitico_coincide_con_montecarlo():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    analitico = propagar_incertidumbre(modelo)
+    muestreo = simular_montecarlo(modelo, 200_000, semilla=1, n_procesos=1)
+
+    assert analitico.loc['total', 'media'] == pytest.approx(muestreo['media'], rel=0.005)
+    assert analitico.loc['total', 'desviacion'] == pytest.approx(muestreo['desviacion'], rel=0.02)
+    assert analitico.loc['total', 'inferior'] == pytest.approx(muestreo['percentiles'][2.5], rel=0.03)
+    assert analitico.loc['total', 'superior'] == pytest.approx(muestreo['percentiles'][97.5], rel=0.03)
+
+def test_valor_determinista_y_sin_incertidumbre():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    sin_incertidumbre = propagar_incertidumbre(modelo, np.ones(len(modelo['cantidades'])),
+                                               np.ones(len(modelo['ids_factor'])))
+    etapas = totales_modelo(modelo)['gwp']
+    assert sin_incertidumbre['valor'].drop('total').to_numpy() == pytest.approx(etapas.to_numpy())
+    assert sin_incertidumbre['media'].to_numpy() == pytest.approx(sin_incertidumbre['valor'].to_numpy())
+    assert sin_incertidumbre['desviacion'].sum() == pytest.approx(0.0, abs=1e-12)
+
+def test_gsd_por_columnas_de_la_tabla():
+    assert gsd_pedigri([1, 1, 1, 1, 1], 1.2) == pytest.approx(1.2)
+    assert gsd_pedigri([5, 5, 5, 5, 5]) == pytest.approx(np.exp(np.sqrt(0.21)))
+
+    factores = FACTORES.copy()
+    factores['gsd'] = np.nan
+    factores['pedigree'] = ''
+    factores.loc[factores['item'] == 'PP', 'gsd'] = 2.0
+    factores.loc[factores['item'] == 'Pasta de dátil', 'pedigree'] = '(2,3,1,1,4)'
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, factores)
+    _, gsd_f = gsd_modelo(modelo, factores_df=factores)
+    gsd = dict(zip(modelo['etiquetas_factor'], gsd_f))
+
+    assert gsd['material_empaque/PP'] == 2.0
+    assert gsd['materia_prima/Pasta de dátil'] == pytest.approx(gsd_pedigri([2, 3, 1, 1, 4], 1.3))
+    assert gsd['transporte/VAN'] == 1.2
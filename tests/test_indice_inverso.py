@@ -0,0 +1,76 @@
+"""
+Tests para el índice inverso de factores y el recálculo dirigido
+"""
+
+import copy
+import pandas as pd
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.indice_inverso import (
+    abrir_indice,
+    actualizar_por_diferencia,
+    obtener_resultado_producto,
+    registrar_producto,
+    usos_fila
+)
+from utils.motor import diferencia_factores, version_factores
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def _cartera():
+    gas = copy.deepcopy(PRODUCTO_PRUEBA)
+    gas['produccion']['tipo_energia'] = 'Gas natural'
+    leche = copy.deepcopy(gas)
+    leche['materias_primas'][0]['producto'] = 'Leche'
+    return {'solar': PRODUCTO_PRUEBA, 'gas': gas, 'leche': leche}
+
+def _indice_con_cartera(tmp_path):
+    indice = abrir_indice(str(tmp_path / 'indice.sqlite'))
+    for nombre, datos in _cartera().items():
+        registrar_producto(indice, nombre, datos, FACTORES)
+    return indice
+
+def test_diferencia_factores():
+    nuevos = FACTORES.drop(index=5).copy()
+    nuevos.loc[73, 'factor_kgCO2e_per_unit'] = 0.04
+    nuevos = pd.concat([nuevos, FACTORES.iloc[[0]].assign(item='Espelta')], ignore_index=True)
+    diferencia = diferencia_factores(FACTORES, nuevos)
+    assert sorted(diferencia['cambio']) == ['eliminada', 'modificada', 'nueva']
+    assert diferencia_factores(FACTORES, FACTORES.iloc[::-1]).empty
+
+def test_usos_de_una_fila(tmp_path):
+    indice = _indice_con_cartera(tmp_path)
+    fila_solar = 'energia|electricidad|Energía solar|' + '|'.join(
+        FACTORES.loc[73, ['region', 'year']].astype(str))
+    assert set(usos_fila(indice, fila_solar)['producto']) == {'solar'}
+
+def test_solo_se_recalculan_los_afectados(tmp_path):
+    indice = _indice_con_cartera(tmp_path)
+    nuevos = FACTORES.copy()
+    nuevos.loc[nuevos['item'] == 'Energía solar', 'factor_kgCO2e_per_unit'] = 0.03
+
+    informe = actualizar_por_diferencia(indice, FACTORES, nuevos)
+    assert informe['filas_modificadas'] == 1
+    assert informe['productos'] == ['solar']
+    assert (informe['productos_afectados'], informe['productos_totales']) == (1, 3)
+
+    for nombre, datos in _cartera().items():
+        total, _, version = obtener_resultado_producto(indice, nombre)
+        assert total == pytest.approx(calcular_emisiones_detalladas_completas(datos, nuevos)[0])
+        assert version == version_factores(nuevos)
+
+def test_fila_nueva_que_cambia_la_resolucion(tmp_path):
+    indice = _indice_con_cartera(tmp_path)
+    # 'Leche' se resolvía a 'Leche entera'; una fila anterior que también la contiene pasa a ser la elegida
+    nueva = FACTORES.iloc[[5]].assign(item='Leche descremada', factor_kgCO2e_per_unit=1.0)
+    nuevos = pd.concat([nueva, FACTORES], ignore_index=True)
+
+    informe = actualizar_por_diferencia(indice, FACTORES, nuevos)
+    assert informe['filas_nuevas'] == 1
+    assert informe['productos'] == ['leche']
+    total, _, _ = obtener_resultado_producto(indice, 'leche')
+    assert total == pytest.approx(calcular_emisiones_detalladas_completas(_cartera()['leche'], nuevos)[0])
@@ -0,0 +1,60 @@
+"""
+Tests para los registros compactos de materias primas, empaques y rutas
+"""
+
+import copy
+import tracemalloc
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.cache_resultados import hash_producto
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.lineas import EmpaqueMateria, MateriaPrima, Ruta, compactar_lineas
+from utils.motor import construir_partidas
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_se_comporta_como_diccionario():
+    materia = MateriaPrima({'producto': 'Avena', 'transportes': [{'distancia_km': 10}], 'lote': 'A1'})
+    assert not hasattr(materia, '__dict__')
+    assert isinstance(materia['transportes'][0], Ruta)
+    assert 'empaque' not in materia and materia.get('empaque', {}) == {}
+    assert materia['lote'] == 'A1'
+    materia['empaque'] = {'material': 'Cartón', 'peso_kg': 0.1}
+    assert isinstance(materia['empaque'], EmpaqueMateria)
+    assert materia.a_dict() == {'producto': 'Avena', 'empaque': {'material': 'Cartón', 'peso_kg': 0.1},
+                                'transportes': [{'distancia_km': 10}], 'lote': 'A1'}
+    assert not MateriaPrima()
+    with pytest.raises(KeyError):
+        materia['region']
+
+def test_mismo_resultado_y_misma_clave_de_cache():
+    compacto = compactar_lineas(copy.deepcopy(PRODUCTO_PRUEBA))
+    assert all(isinstance(mp, MateriaPrima) for mp in compacto['materias_primas'])
+    assert hash_producto(compacto) == hash_producto(PRODUCTO_PRUEBA)
+    assert calcular_emisiones_detalladas_completas(compacto, FACTORES)[0] == \
+        pytest.approx(calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)[0])
+    assert construir_partidas(compacto, FACTORES).equals(construir_partidas(PRODUCTO_PRUEBA, FACTORES))
+
+def test_compacta_lo_editado_despues():
+    datos = compactar_lineas(copy.deepcopy(PRODUCTO_PRUEBA))
+    datos['materias_primas'][0]['transportes'][0] = {'tipo_transporte': 'VAN', 'distancia_km': 5}
+    datos['empaques'].append({'nombre': 'Etiqueta'})
+    compactar_lineas(datos)
+    assert isinstance(datos['materias_primas'][0]['transportes'][0], Ruta)
+    assert datos['empaques'][-1]['nombre'] == 'Etiqueta'
+
+def _memoria(construir):
+    tracemalloc.start()
+    datos = construir()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memoria, datos
+
+def test_ocupa_menos_memoria():
+    lista = [copy.deepcopy(PRODUCTO_PRUEBA['materias_primas'][0]) for _ in range(2000)]
+    en_dicts, _ = _memoria(lambda: copy.deepcopy(lista))
+    compacto, _ = _memoria(lambda: compactar_lineas({'materias_primas': copy.deepcopy(lista)}))
+    assert compacto < 0.75 * en_dicts
@@ -0,0 +1,80 @@
+"""
+Tests para el modelo lineal compilado
+"""
+
+import pytest
+import copy
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.motor import (
+    ETAPAS,
+    calcular_impactos,
+    calcular_impactos_producto,
+    construir_partidas,
+    preparar_matriz_factores,
+    totales_por_etapa
+)
+from utils.modelo_lineal import (
+    actualizar_cantidad,
+    actualizar_factor,
+    compilar_modelo,
+    contribuciones,
+    evaluar_modelo,
+    gradientes,
+    total_modelo,
+    totales_modelo
+)
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_modelo_compilado_coincide_con_motor():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    esperado = totales_por_etapa(calcular_impactos_producto(PRODUCTO_PRUEBA, FACTORES))
+    obtenido = totales_modelo(modelo)
+    for etapa in ETAPAS:
+        assert obtenido.loc[etapa, 'gwp'] == pytest.approx(esperado.loc[etapa, 'gwp'])
+
+def test_actualizar_cantidad_es_igual_a_recompilar():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    partida = modelo['partidas'].index[modelo['partidas']['fuente'] == 'Pasta de dátil'][0]
+    actualizar_cantidad(modelo, partida, 0.06)
+
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['materias_primas'][0]['cantidad_real_kg'] = 0.06
+    assert total_modelo(modelo) == pytest.approx(total_modelo(compilar_modelo(datos, FACTORES)))
+
+def test_actualizar_cantidad_conserva_la_asignacion_entre_coproductos():
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['coproductos'] = {'metodo': 'masa', 'lista': [{'nombre': 'Suero', 'masa_kg': 0.1, 'precio_kg': 0.5}]}
+    modelo = compilar_modelo(datos, FACTORES)
+    partida = modelo['partidas'].index[(modelo['partidas']['fuente'] == 'Pasta de dátil')
+                                       & (modelo['partidas']['subfuente'] == 'material')][0]
+    assert modelo['ajustes'][partida] < 1.0
+    actualizar_cantidad(modelo, partida, 0.06)
+
+    datos['materias_primas'][0]['cantidad_real_kg'] = 0.06
+    esperado = calcular_impactos(construir_partidas(datos, FACTORES), FACTORES)
+    assert total_modelo(modelo) == pytest.approx(esperado['gwp'].sum())
+
+def test_actualizar_factor_es_igual_a_reevaluar():
+    matriz = preparar_matriz_factores(FACTORES)
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES, matriz)
+    id_hgv = FACTORES.index[FACTORES['item'] == 'Camión diesel HGV'][0]
+    actualizar_factor(modelo, id_hgv, 0.1)
+    incremental = total_modelo(modelo)
+    assert evaluar_modelo(modelo)['gwp'].sum() == pytest.approx(incremental)
+
+    # La tabla de factores compartida no se modifica
+    assert matriz['matriz'][id_hgv, 0] == pytest.approx(0.33626)
+
+def test_contribuciones_y_gradientes():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    tabla = contribuciones(modelo)
+    assert tabla['contribucion'].sum() == pytest.approx(total_modelo(modelo))
+    assert tabla['porcentaje'].sum() == pytest.approx(100)
+
+    por_cantidad, por_factor = gradientes(modelo)
+    assert (por_cantidad.to_numpy() * modelo['cantidades']).sum() == pytest.approx(total_modelo(modelo))
+    assert por_factor['material_empaque/Cartón'] == pytest.approx(0.002 + 0.02)
@@ -0,0 +1,56 @@
+"""
+Tests para la simulación Monte Carlo por bloques
+"""
+
+import pytest
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.modelo_lineal import combinar_modelos, compilar_modelo, total_modelo
+from utils.montecarlo import combinar_estadisticas, cuantil_sketch, estadisticas_bloque, simular_montecarlo
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_combinar_bloques_equivale_a_un_solo_bloque():
+    rng = np.random.default_rng(0)
+    valores = np.concatenate([rng.lognormal(0, 0.5, 1000), -rng.lognormal(0, 0.5, 200)])
+    bordes = np.linspace(-5, 5, 21)
+    combinadas = estadisticas_bloque(valores[:700], bordes)
+    combinadas = combinar_estadisticas(combinadas, estadisticas_bloque(valores[700:], bordes))
+
+    assert combinadas['n'] == len(valores)
+    assert combinadas['media'] == pytest.approx(valores.mean())
+    assert combinadas['m2'] / (len(valores) - 1) == pytest.approx(valores.var(ddof=1))
+    assert combinadas['conteos'].sum() + combinadas['por_debajo'] + combinadas['por_encima'] == len(valores)
+    for q in (0.05, 0.5, 0.95):
+        assert cuantil_sketch(combinadas, q) == pytest.approx(np.quantile(valores, q), rel=0.02)
+
+def test_reproducible_con_cualquier_numero_de_procesos():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    serie = simular_montecarlo(modelo, 5000, semilla=7, tamano_bloque=1000, n_procesos=1)
+    paralelo = simular_montecarlo(modelo, 5000, semilla=7, tamano_bloque=1000, n_procesos=2)
+    assert serie['bloques'] == 5
+    assert serie['media'] == paralelo['media']
+    assert serie['desviacion'] == paralelo['desviacion']
+    assert serie['percentiles'] == paralelo['percentiles']
+    assert np.array_equal(serie['histograma']['conteos'], paralelo['histograma']['conteos'])
+    # Un pool compartido (el de la app) da el mismo resultado
+    with ProcessPoolExecutor(max_workers=2) as ejecutor:
+        compartido = simular_montecarlo(modelo, 5000, semilla=7, tamano_bloque=1000, ejecutor=ejecutor)
+    assert compartido['media'] == serie['media'] and compartido['percentiles'] == serie['percentiles']
+
+def test_cartera_y_mediana():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    cartera = combinar_modelos([modelo, modelo], unidades=[1, 3])
+    assert total_modelo(cartera) == pytest.approx(4 * total_modelo(modelo))
+    # Los factores compartidos no se duplican
+    assert len(cartera['ids_factor']) == len(modelo['ids_factor'])
+
+    # Sin incertidumbre todas las iteraciones valen el total
+    sin_incertidumbre = simular_montecarlo(cartera, 2000, gsd_cantidades=np.ones(len(cartera['cantidades'])),
+                                           gsd_factores=np.ones(len(cartera['ids_factor'])), n_procesos=1)
+    assert sin_incertidumbre['media'] == pytest.approx(total_modelo(cartera))
+    assert sin_incertidumbre['desviacion'] == pytest.approx(0.0, abs=1e-9)
@@ -0,0 +1,108 @@
+"""
+Tests para el motor vectorizado de impactos
+"""
+
+import pytest
+import pandas as pd
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import (
+    ETAPAS,
+    calcular_impactos_producto,
+    construir_partidas,
+    detectar_categorias_impacto,
+    totales_por_etapa
+)
+
+FACTORES = pd.read_csv(os.path.join(os.path.dirname(__file__), '..', 'data', 'factors.csv'))
+
+PRODUCTO_PRUEBA = {
+    'producto': {'nombre': 'Barra', 'peso_neto_kg': 0.05},
+    'materias_primas': [
+        {'producto': 'Pasta de dátil', 'cantidad_real_kg': 0.03, 'cantidad_teorica_kg': 0.028,
+         'empaque': {'material': 'Cartón', 'peso_kg': 0.002},
+         'transportes': [{'tipo_transporte': 'Camión diesel HGV', 'distancia_km': 500, 'carga_kg': 0.03}]},
+        {'producto': 'Avena en escama', 'cantidad_real_kg': 0.02, 'cantidad_teorica_kg': 0.02,
+         'empaque': None,
+         'transportes': [{'tipo_transporte': 'Barco carga', 'distancia_km': 9000, 'carga_kg': 0.02},
+                         {'tipo_transporte': 'Tren eléctrico', 'distancia_km': 300, 'carga_kg': 0.02}]}
+    ],
+    'empaques': [
+        {'nombre': 'Envoltorio', 'material': 'PP', 'peso_kg': 0.003, 'cantidad': 1,
+         'transportes': [{'tipo_transporte': 'VAN', 'distancia_km': 50, 'carga_kg': 0.003}]},
+        {'nombre': 'Caja', 'material': 'Cartón', 'peso_kg': 0.01, 'cantidad': 2, 'transportes': []}
+    ],
+    'produccion': {'energia_kwh': 0.05, 'tipo_energia': 'Energía solar', 'agua_m3': 0.001},
+    'distribucion': {'canales': [{'nombre': 'Supermercados', 'rutas': [
+        {'tipo_transporte': 'Camión diesel HGV', 'distancia_km': 200, 'carga_kg': 0.075}]}]},
+    'retail': {'consumo_energia_kwh': 0.01},
+    'uso_fin_vida': {
+        'energia_uso_kwh': 0.0,
+        'agua_uso_m3': 0.0005,
+        'gestion_empaques': [
+            {'nombre_empaque': 'Envoltorio', 'material': 'PP', 'peso_kg': 0.003,
+             'porcentajes': {'porcentaje_vertedero': 60, 'porcentaje_reciclaje': 40}},
+            {'nombre_empaque': 'Caja', 'material': 'Cartón', 'peso_kg': 0.02,
+             'porcentajes': {'porcentaje_vertedero': 100}}
+        ]
+    }
+}
+
+def test_gwp_coincide_con_calculo_detallado():
+    total, desglose = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    tabla = calcular_impactos_producto(PRODUCTO_PRUEBA, FACTORES)
+    por_etapa = totales_por_etapa(tabla)
+
+    assert tabla['gwp'].sum() == pytest.approx(total)
+    for etapa in ETAPAS:
+        assert por_etapa.loc[etapa, 'gwp'] == pytest.approx(desglose[etapa]['total'])
+
+def test_k_categorias_en_una_pasada():
+    factores = FACTORES.copy()
+    factores['factor_agua_m3_per_unit'] = 0.01
+    factores['factor_eutrofizacion_kgPO4e_per_unit'] = 0.002
+    categorias = detectar_categorias_impacto(factores)
+    assert list(categorias)[:2] == ['gwp', 'agua']
+    assert 'eutrofizacion_kgPO4e' in categorias
+
+    partidas = construir_partidas(PRODUCTO_PRUEBA, factores)
+    tabla = calcular_impactos_producto(PRODUCTO_PRUEBA, factores)
+    assert tabla['agua'].sum() == pytest.approx(partidas['cantidad'].sum() * 0.01)
+    assert tabla['eutrofizacion_kgPO4e'].sum() == pytest.approx(partidas['cantidad'].sum() * 0.002)
+
+def test_categoria_sin_datos_no_aporta():
+    factores = FACTORES.copy()
+    factores['factor_suelo_m2a_per_unit'] = float('nan')
+    tabla = calcular_impactos_producto(PRODUCTO_PRUEBA, factores)
+    assert tabla['suelo'].sum() == 0.0
+
+def test_producto_vacio():
+    tabla = calcular_impactos_producto({}, FACTORES)
+    assert len(tabla) == 0
+    assert totales_por_etapa(tabla)['gwp'].sum() == 0.0
+
+def test_desglose_gwp_en_una_evaluacion():
+    from utils.motor import desglose_gwp_por_etapa, matriz_gwp, tiene_desglose_gwp
+
+    factores = FACTORES.copy()
+    es_materia_prima = factores['category'] == 'materia_prima'
+    factores['factor_gwp100_fosil_kgCO2e_per_unit'] = factores['factor_kgCO2e_per_unit'].where(~es_materia_prima)
+    factores['factor_gwp100_luc_kgCO2e_per_unit'] = factores['factor_kgCO2e_per_unit'].where(es_materia_prima)
+    factores['factor_gwp20_fosil_kgCO2e_per_unit'] = 2 * factores['factor_kgCO2e_per_unit']
+
+    tabla = calcular_impactos_producto(PRODUCTO_PRUEBA, factores)
+    assert tiene_desglose_gwp(tabla)
+    assert matriz_gwp(tabla).shape == (len(tabla), 2, 3)
+
+    desglose = desglose_gwp_por_etapa(tabla)
+    assert desglose.loc['materias_primas', ('gwp100', 'luc')] == pytest.approx(
+        tabla.loc[(tabla['etapa'] == 'materias_primas') & (tabla['categoria'] == 'materia_prima'), 'gwp'].sum())
+    assert desglose[('gwp20', 'fosil')].sum() == pytest.approx(2 * tabla['gwp'].sum())
+    # Solo quedan sin desglose las filas resueltas a factores por defecto
+    sin_desglose = desglose[('gwp100', 'sin_desglose')].sum()
+    assert sin_desglose == pytest.approx(
+        tabla.loc[tabla['indice_factor'] >= len(factores), 'gwp'].sum())
@@ -0,0 +1,41 @@
+"""
+Tests para el muestreo LHS / cuasi-Monte Carlo con parada adaptativa
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.incertidumbre import propagar_incertidumbre
+from utils.modelo_lineal import compilar_modelo
+from utils.muestreo import simular_adaptativo
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_converge_a_la_media_analitica():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    analitico = propagar_incertidumbre(modelo)
+    for metodo in ('sobol', 'lhs'):
+        resultado = simular_adaptativo(modelo, metodo, tolerancia=0.003, semilla=1)
+        assert resultado['convergido']
+        assert resultado['media'] == pytest.approx(analitico.loc['total', 'media'], rel=0.01)
+        assert (resultado['etapas']['error_estandar']
+                <= 0.003 * resultado['etapas']['media'].abs() + 1e-15).all()
+
+def test_qmc_necesita_menos_iteraciones():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    # Solo medias del total y de las etapas: la ganancia de QMC es mayor que en percentiles
+    aleatorio = simular_adaptativo(modelo, 'aleatorio', tolerancia=0.002, semilla=2, percentil_control=None)
+    sobol = simular_adaptativo(modelo, 'sobol', tolerancia=0.002, semilla=2, percentil_control=None)
+    assert sobol['n_iteraciones'] * 8 <= aleatorio['n_iteraciones']
+
+def test_tope_de_iteraciones_y_metodo_desconocido():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    resultado = simular_adaptativo(modelo, 'aleatorio', tolerancia=1e-6, max_iteraciones=4096)
+    assert not resultado['convergido']
+    assert resultado['n_iteraciones'] <= 4096
+    assert len(resultado['historial']) >= 2
+
+    with pytest.raises(ValueError):
+        simular_adaptativo(modelo, 'halton')
@@ -0,0 +1,66 @@
+"""
+Tests para los núcleos numéricos (versiones NumPy y compiladas con Numba)
+"""
+
+import numpy as np
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils import nucleos
+from utils.motor import totales_lote, totales_por_anio, construir_partidas, preparar_matriz_factores
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+MODOS = [False] + ([True] if nucleos.NUMBA_DISPONIBLE else [])
+
+@pytest.fixture(params=MODOS, ids=lambda activo: 'numba' if activo else 'numpy')
+def modo(request):
+    anterior = nucleos.usar_numba(request.param)
+    yield request.param
+    nucleos.usar_numba(anterior)
+
+def _datos(n=2000, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return rng, rng.integers(0, 50, n), rng.random((n, 3))
+
+def test_sumar_por_grupo(modo):
+    _, grupos, valores = _datos()
+    esperado = np.array([valores[grupos == g].sum(axis=0) for g in range(60)])
+    np.testing.assert_allclose(nucleos.sumar_por_grupo(grupos, valores, 60), esperado)
+
+def test_fin_vida_con_porcentajes_dispersos(modo):
+    rng, materiales, _ = _datos()
+    porcentajes = np.where(rng.random((len(materiales), 4)) < 0.3, rng.random((len(materiales), 4)), 0.0)
+    factores = rng.random((50, 4)) - 0.5
+    masas = rng.random(len(materiales))
+    esperado = masas * (porcentajes * factores[materiales]).sum(axis=1)
+    np.testing.assert_allclose(nucleos.emisiones_fin_vida(masas, porcentajes, factores, materiales), esperado)
+
+def test_totales_montecarlo(modo):
+    rng, posiciones, _ = _datos(40)
+    cantidades, factores = rng.random(40), rng.random(50)
+    zq, zf = rng.standard_normal((100, 40)), rng.standard_normal((100, 50))
+    esperado = (cantidades * np.exp(0.2 * zq) * (factores * np.exp(0.3 * zf))[:, posiciones]).sum(axis=1)
+    np.testing.assert_allclose(nucleos.totales_montecarlo(cantidades, factores, posiciones, 0.2, 0.3, zq, zf),
+                               esperado)
+
+@pytest.mark.skipif(not nucleos.NUMBA_DISPONIBLE, reason='numba no instalado')
+def test_mismos_totales_con_y_sin_numba():
+    matriz = preparar_matriz_factores(FACTORES)
+    partidas = [construir_partidas(PRODUCTO_PRUEBA, FACTORES)] * 3
+    resultados = []
+    for activo in (False, True):
+        anterior = nucleos.usar_numba(activo)
+        resultados.append((totales_lote(partidas, FACTORES, matriz),
+                           totales_por_anio(partidas, FACTORES, [2020, 2024], matriz)))
+        nucleos.usar_numba(anterior)
+    # Misma suma en el mismo orden: resultados idénticos
+    for numpy_, numba_ in zip(*resultados):
+        np.testing.assert_array_equal(numpy_, numba_)
+
+def test_activar_sin_numba(monkeypatch):
+    monkeypatch.setattr(nucleos, 'NUMBA_DISPONIBLE', False)
+    with pytest.raises(ImportError, match='numba'):
+        nucleos.usar_numba(True)
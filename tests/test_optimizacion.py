@@ -0,0 +1,105 @@
+"""
+Tests para el optimizador de sustituciones
+"""
+
+import pandas as pd
+import pytest
+import copy
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.modelo_lineal import compilar_modelo, total_modelo
+from utils.motor import preparar_matriz_factores
+from utils.optimizacion import construir_decisiones, frontera_pareto, optimizar_sustituciones
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def _modelo():
+    matriz = preparar_matriz_factores(FACTORES)
+    return compilar_modelo(PRODUCTO_PRUEBA, FACTORES, matriz), matriz
+
+def test_decisiones_opcion_actual_primero():
+    modelo, matriz = _modelo()
+    decisiones = construir_decisiones(modelo, matriz, FACTORES)
+    energia = next(d for d in decisiones if d['etapa'] == 'procesamiento')
+    assert energia['opciones'][0] == 'Energía solar'
+    assert 'Gas natural' not in energia['opciones']  # misma subcategoría (electricidad)
+    assert all(d['categoria'] != 'materia_prima' for d in decisiones)
+
+def test_plan_optimo_coincide_con_producto_modificado():
+    modelo, matriz = _modelo()
+    plan = optimizar_sustituciones(modelo, matriz, FACTORES, max_cambios=2, bloqueadas=['Caja'],
+                                   tipos=[('empaques', 'material_empaque'), ('distribucion', 'transporte')])
+    assert plan['cambios'] == 2
+
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    nuevo = dict(zip(plan['detalle']['fuente'], plan['detalle']['nuevo']))
+    datos['empaques'][0]['material'] = nuevo['Envoltorio']
+    datos['uso_fin_vida']['gestion_empaques'][0]['material'] = nuevo['Envoltorio']
+    datos['distribucion']['canales'][0]['rutas'][0]['tipo_transporte'] = nuevo['Distribución Supermercados']
+    assert plan['huella'] == pytest.approx(total_modelo(compilar_modelo(datos, FACTORES)))
+
+def test_frontera_de_pareto_monotona():
+    modelo, matriz = _modelo()
+    frontera = frontera_pareto(modelo, matriz, FACTORES)
+    assert frontera['cambios'].iloc[0] == 0
+    assert frontera['huella'].iloc[0] == pytest.approx(total_modelo(modelo))
+    assert frontera['cambios'].is_monotonic_increasing
+    assert frontera['huella'].is_monotonic_decreasing
+
+def test_reduccion_al_menor_costo_y_restricciones():
+    modelo, matriz = _modelo()
+    costos = {'Camión eléctrico': 0.5}
+    plan = optimizar_sustituciones(modelo, matriz, FACTORES, reduccion_objetivo_pct=15,
+                                   objetivo='costo', costos=costos)
+    assert plan['reduccion_pct'] >= 15
+    assert plan['costo_adicional'] == 0.0  # hay reducciones suficientes sin coste
+
+    # Sin margen de masa, un material más pesado no entra en la solución
+    plan = optimizar_sustituciones(modelo, matriz, FACTORES, incremento_masa_kg=0.0,
+                                   masa_relativa={'Vidrio': 5.0, 'Vidrio reciclado': 5.0})
+    assert plan['incremento_masa_kg'] <= 1e-12
+    assert not plan['detalle']['nuevo'].str.startswith('Vidrio').any()
+
+    assert optimizar_sustituciones(modelo, matriz, FACTORES, reduccion_objetivo_pct=90) is None
+
+def test_alternativas_en_la_region_de_la_partida():
+    avena = FACTORES[FACTORES['item'] == 'Avena en escama'].iloc[0]
+    trigo = FACTORES[FACTORES['item'] == 'Trigo'].iloc[0]
+    factores = pd.concat([FACTORES, pd.DataFrame([
+        avena.to_dict() | {'region': 'UE', 'factor_kgCO2e_per_unit': 0.7},
+        trigo.to_dict() | {'region': 'UE', 'factor_kgCO2e_per_unit': 0.3}
+    ])], ignore_index=True)
+    datos = copy.deepcopy(PRODUCTO_PRUEBA)
+    datos['materias_primas'][1]['region'] = 'UE'
+    matriz = preparar_matriz_factores(factores)
+    modelo = compilar_modelo(datos, factores, matriz)
+    decisiones = construir_decisiones(modelo, matriz, factores, tipos=[], bloqueadas=['Pasta de dátil'],
+                                      permitidas={'materia_prima': ['Avena en escama', 'Trigo']})
+    avena = next(d for d in decisiones if d['fuente'] == 'Avena en escama')
+    assert avena['opciones'] == ['Avena en escama', 'Trigo']
+    assert avena['huella'][1] / avena['huella'][0] == pytest.approx(0.3 / 0.7)
+
+    plan = optimizar_sustituciones(modelo, matriz, factores, decisiones=decisiones)
+    datos['materias_primas'][1]['producto'] = 'Trigo'
+    assert plan['huella'] == pytest.approx(total_modelo(compilar_modelo(datos, factores)))
+
+def _frontera_por_barrido(modelo, matriz, **argumentos):
+    """Frontera de referencia: un programa entero por cada k"""
+    optimo = optimizar_sustituciones(modelo, matriz, FACTORES, **argumentos)
+    puntos = []
+    for k in range(optimo['cambios'] + 1):
+        plan = optimizar_sustituciones(modelo, matriz, FACTORES, max_cambios=k, **argumentos)
+        if plan is not None and (not puntos or plan['huella'] < puntos[-1]['huella'] - 1e-12):
+            puntos.append(plan)
+    return pd.DataFrame(puntos)
+
+@pytest.mark.parametrize('restricciones', [{}, {'presupuesto': 0.001, 'costos': {'Camión eléctrico': 0.5, 'Vidrio': 0.1}},
+                                           {'incremento_masa_kg': 0.0, 'masa_relativa': {'Vidrio': 5.0}}])
+def test_frontera_coincide_con_el_barrido_de_k(restricciones):
+    modelo, matriz = _modelo()
+    frontera = frontera_pareto(modelo, matriz, FACTORES, **restricciones)
+    referencia = _frontera_por_barrido(modelo, matriz, **restricciones)
+    assert frontera['cambios'].tolist() == referencia['cambios'].tolist()
+    assert frontera['huella'].to_numpy() == pytest.approx(referencia['huella'].to_numpy())
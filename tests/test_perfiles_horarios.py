@@ -0,0 +1,73 @@
+"""
+Tests para los perfiles horarios de intensidad de la red y de carga
+"""
+
+import copy
+import numpy as np
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import calcular_impactos_producto, construir_partidas
+from utils.perfiles_horarios import (
+    HORAS_ANIO,
+    PERFILES_CARGA,
+    ajustes_horarios,
+    cargar_perfiles,
+    emisiones_horarias,
+    guardar_perfiles
+)
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+HORA = np.arange(HORAS_ANIO) % 24
+
+def _perfiles(tmp_path):
+    """Red con mucha solar (0.1 de día, 0.5 de noche) y red plana"""
+    ruta = str(tmp_path / 'perfiles')
+    guardar_perfiles({'Red solar': np.where((HORA >= 8) & (HORA < 18), 0.1, 0.5),
+                      'Red plana': np.full(HORAS_ANIO, 0.3)}, ruta)
+    return cargar_perfiles(ruta)
+
+def test_perfiles_float32_mapeados(tmp_path):
+    perfiles = _perfiles(tmp_path)
+    assert perfiles['nombres'] == ['Red solar', 'Red plana']
+    assert isinstance(perfiles['matriz'], np.memmap)
+    assert perfiles['matriz'].dtype == np.float32
+    assert cargar_perfiles(str(tmp_path / 'no_existe'))['nombres'] == []
+    with pytest.raises(ValueError):
+        guardar_perfiles({'corto': np.ones(24)}, str(tmp_path / 'corto'))
+
+def test_emisiones_por_instalacion_producto_punto():
+    intensidades = np.vstack([np.full(HORAS_ANIO, 0.3), np.where(HORA < 12, 0.2, 0.4)]).astype(np.float32)
+    cargas = np.vstack([PERFILES_CARGA['Continuo 24/7'], (HORA < 12).astype(np.float32)])
+    emisiones = emisiones_horarias(np.array([100.0, 100.0]), intensidades, cargas)
+    np.testing.assert_allclose(emisiones, [30.0, 20.0], rtol=1e-6)
+
+def test_ajuste_segun_turno(tmp_path):
+    perfiles = _perfiles(tmp_path)
+    media = (10 * 0.1 + 14 * 0.5) / 24
+    ajustes = ajustes_horarios(['Red solar', 'Red solar', 'Red plana', 'Red solar', None],
+                               ['Continuo 24/7', 'Turno nocturno (22-6 h)', 'Turno nocturno (22-6 h)',
+                                'Perfil inexistente', 'Continuo 24/7'], perfiles)
+    np.testing.assert_allclose(ajustes, [1.0, 0.5 / media, 1.0, 1.0, 1.0], rtol=1e-6)
+
+def test_mismo_resultado_que_calculo_detallado(tmp_path, monkeypatch):
+    perfiles = _perfiles(tmp_path)
+    monkeypatch.setattr('utils.perfiles_horarios.RUTA_PERFILES_DEFECTO', str(tmp_path / 'perfiles'))
+    producto = copy.deepcopy(PRODUCTO_PRUEBA)
+    producto['produccion'].update({'perfil_red': 'Red solar', 'perfil_carga': 'Turno nocturno (22-6 h)'})
+    producto['retail'].update({'perfil_red': 'Red solar', 'perfil_carga': 'Horario comercial (9-21 h, lun-sáb)'})
+
+    partidas = construir_partidas(producto, FACTORES, perfiles)
+    ajustes = partidas.set_index('fuente')['ajuste']
+    assert ajustes['Energía Producción'] > 1.0
+    assert ajustes['Energía Retail'] < 1.0
+    assert ajustes.drop(['Energía Producción', 'Energía Retail']).eq(1.0).all()
+
+    total, desglose = calcular_emisiones_detalladas_completas(producto, FACTORES)
+    assert calcular_impactos_producto(producto, FACTORES)['gwp'].sum() == pytest.approx(total)
+    base = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)[1]
+    assert desglose['procesamiento']['total'] > base['procesamiento']['total']
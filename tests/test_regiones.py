@@ -0,0 +1,86 @@
+"""
+Tests para la resolución regional de factores (país → región → Global)
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas, obtener_factor
+from utils.motor import (
+    calcular_impactos_producto,
+    construir_partidas,
+    preparar_matriz_factores,
+    resolver_indice,
+    resolver_indices
+)
+from utils.regiones import cadena_regiones
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def _factores_regionales():
+    """Avena: Global, UE y España; Cartón: Global y Chile; PP de Francia sin factor válido"""
+    avena = FACTORES[FACTORES['item'] == 'Avena en escama'].iloc[0]
+    carton = FACTORES[FACTORES['item'] == 'Cartón'].iloc[0]
+    pp = FACTORES[FACTORES['item'] == 'PP'].iloc[0]
+    extra = pd.DataFrame([
+        avena.to_dict() | {'region': 'UE', 'factor_kgCO2e_per_unit': 0.7},
+        avena.to_dict() | {'region': 'España', 'factor_kgCO2e_per_unit': 0.9},
+        carton.to_dict() | {'region': 'Chile', 'factor_kgCO2e_per_unit': 1.5},
+        pp.to_dict() | {'region': 'Francia', 'factor_kgCO2e_per_unit': np.nan}
+    ])
+    return pd.concat([FACTORES, extra], ignore_index=True)
+
+def test_cadena_regiones():
+    assert cadena_regiones('España') == ['España', 'UE', 'Global']
+    assert cadena_regiones('UE') == ['UE', 'Global']
+    assert cadena_regiones('Atlántida') == ['Atlántida', 'Global']
+    assert cadena_regiones('Global') == ['Global']
+
+def test_respaldo_pais_region_global():
+    factores = _factores_regionales()
+    matriz = preparar_matriz_factores(factores)
+    valor = lambda fila: matriz['matriz'][fila, 0]
+
+    assert valor(resolver_indice(matriz, 'materia_prima', 'Avena en escama', region='España')) == 0.9
+    assert valor(resolver_indice(matriz, 'materia_prima', 'Avena en escama', region='Francia')) == 0.7
+    assert valor(resolver_indice(matriz, 'materia_prima', 'Avena en escama', region='Chile')) == pytest.approx(
+        obtener_factor(FACTORES, 'materia_prima', 'Avena en escama')[0])
+    assert valor(resolver_indice(matriz, 'material_empaque', 'Cartón', region='Chile')) == 1.5
+    # Sin región se mantiene la primera coincidencia, como obtener_factor
+    assert resolver_indice(matriz, 'materia_prima', 'Avena en escama') == \
+        resolver_indice(preparar_matriz_factores(FACTORES), 'materia_prima', 'Avena en escama')
+    # Una fila regional sin factor válido usa el factor por defecto de la categoría
+    fila_pp = resolver_indice(matriz, 'material_empaque', 'PP', region='Francia')
+    assert fila_pp == matriz['filas_defecto']['material_empaque']
+
+def test_mismo_resultado_que_obtener_factor():
+    factores = _factores_regionales()
+    producto = copy.deepcopy(PRODUCTO_PRUEBA)
+    producto['materias_primas'][0]['region'] = 'Chile'
+    producto['materias_primas'][1]['region'] = 'España'
+    producto['empaques'][1]['region'] = 'Chile'
+    producto['produccion']['region'] = 'Alemania'
+
+    total, _ = calcular_emisiones_detalladas_completas(producto, factores)
+    tabla = calcular_impactos_producto(producto, factores)
+    assert tabla['gwp'].sum() == pytest.approx(total)
+    assert total != pytest.approx(calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, factores)[0])
+
+def test_resolucion_vectorizada_de_regiones_mezcladas():
+    factores = _factores_regionales()
+    matriz = preparar_matriz_factores(factores)
+    base = construir_partidas(PRODUCTO_PRUEBA, factores)
+    regiones = np.array(['', 'España', 'Francia', 'Chile', 'UE', 'Global', 'Atlántida'])
+    partidas = base.iloc[np.arange(100_000) % len(base)].reset_index(drop=True)
+    partidas['region'] = regiones[np.arange(100_000) % len(regiones)]
+
+    indices = resolver_indices(matriz, partidas)
+    esperados = {clave: resolver_indice(matriz, *clave)
+                 for clave in set(zip(partidas['categoria'], partidas['item'], partidas['exacto'], partidas['region']))}
+    assert (indices == [esperados[clave] for clave in zip(partidas['categoria'], partidas['item'],
+                                                          partidas['exacto'], partidas['region'])]).all()
@@ -0,0 +1,73 @@
+"""
+Tests para el resultado en tabla y su compatibilidad con el desglose anidado
+"""
+
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import ETAPAS
+from utils.modelo_lineal import compilar_modelo, compilar_partidas, total_modelo
+from utils.motor import preparar_matriz_factores
+from utils.resultados import calcular_resultado
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+@pytest.fixture(scope='module')
+def resultado():
+    return calcular_resultado(PRODUCTO_PRUEBA, FACTORES)
+
+def test_vistas_agrupadas(resultado):
+    total, desglose = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    assert resultado.total() == pytest.approx(total)
+    por_etapa = resultado.por_etapa()
+    assert list(por_etapa.index) == ETAPAS
+    for etapa in ETAPAS:
+        assert por_etapa[etapa] == pytest.approx(desglose[etapa]['total'])
+    por_fuente = resultado.agrupar('etapa', 'fuente', categoria='gwp')
+    assert por_fuente.sum() == pytest.approx(total)
+    assert resultado.a_tabla() is resultado.tabla
+
+def test_principales(resultado):
+    principales = resultado.principales(3)
+    assert len(principales) == 3
+    assert principales['gwp'].is_monotonic_decreasing
+    assert principales['gwp'].iloc[0] == resultado.agrupar('etapa', 'fuente', categoria='gwp').max()
+    assert principales['porcentaje'].iloc[0] == pytest.approx(principales['gwp'].iloc[0] / resultado.total() * 100)
+
+def test_desglose_compatible(resultado):
+    total, desglose = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    total_tabla, compatible = resultado.a_desglose()
+    assert total_tabla == pytest.approx(total)
+    for etapa in ETAPAS:
+        assert compatible[etapa]['total'] == pytest.approx(desglose[etapa]['total'])
+
+    for producto, fuente in desglose['materias_primas']['fuentes'].items():
+        assert compatible['materias_primas']['fuentes'][producto] == pytest.approx(fuente)
+    for nombre, fuente in desglose['empaques']['fuentes'].items():
+        assert compatible['empaques']['fuentes'][nombre] == pytest.approx(fuente)
+    for origen in ('materias_primas', 'empaques'):
+        antiguo = desglose['transporte']['fuentes'][origen]
+        nuevo = compatible['transporte']['fuentes'][origen]
+        assert nuevo['emisiones'] == pytest.approx(antiguo['emisiones'])
+        rutas = [r for d in antiguo['detalle'] for r in d['rutas']]
+        rutas_nuevas = [r for d in nuevo['detalle'] for r in d['rutas']]
+        assert [r['emisiones'] for r in rutas_nuevas] == pytest.approx([r['emisiones'] for r in rutas])
+        assert [r['distancia_km'] for r in rutas_nuevas] == pytest.approx([r['distancia_km'] for r in rutas])
+        assert [(r['origen'], r['destino']) for r in rutas_nuevas] == [(r['origen'], r['destino']) for r in rutas]
+    for etapa in ('procesamiento', 'distribucion'):
+        assert compatible[etapa]['fuentes'] == pytest.approx(desglose[etapa]['fuentes'])
+    assert compatible['retail']['fuentes']['Energía Retail'] == \
+        pytest.approx(desglose['retail']['fuentes']['Energía Retail'])
+    fin_vida = desglose['fin_vida']['fuentes']
+    assert compatible['fin_vida']['fuentes']['uso'] == pytest.approx(fin_vida['uso'])
+    for nombre, empaque in fin_vida['fin_vida'].items():
+        assert compatible['fin_vida']['fuentes']['fin_vida'][nombre]['emisiones'] == pytest.approx(empaque['emisiones'])
+
+def test_modelo_lineal_desde_el_resultado(resultado):
+    # El modelo de los análisis se compila desde la tabla del resultado, sin guardar otra copia
+    modelo = compilar_partidas(resultado.partidas(), preparar_matriz_factores(FACTORES))
+    assert total_modelo(modelo) == pytest.approx(resultado.total())
+    assert total_modelo(modelo) == pytest.approx(total_modelo(compilar_modelo(PRODUCTO_PRUEBA, FACTORES)))
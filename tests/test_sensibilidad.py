@@ -0,0 +1,47 @@
+"""
+Tests para el análisis de sensibilidad global
+"""
+
+import pytest
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.modelo_lineal import compilar_modelo, contribuciones, evaluar_lote, total_modelo
+from utils.sensibilidad import efectos_morris, entradas_modelo, indices_sobol
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_evaluar_lote_sin_variacion_es_el_total():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    unos = np.ones((3, len(modelo['cantidades'])))
+    assert evaluar_lote(modelo, unos) == pytest.approx([total_modelo(modelo)] * 3)
+
+def test_entradas_con_nombres_unicos():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    entradas = entradas_modelo(modelo)
+    assert entradas['entrada'].is_unique
+    assert len(entradas) == len(modelo['cantidades']) + len(modelo['ids_factor'])
+
+def test_sobol_modelo_aditivo():
+    # Solo varían las cantidades: modelo aditivo, S1 = ST = c_i² / Σ c²
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    resultado = indices_sobol(modelo, n_muestras=16384, rango_factores=0.0, semilla=1)
+    c = contribuciones(modelo)['contribucion'].to_numpy()
+    esperado = c ** 2 / (c ** 2).sum()
+
+    cantidades = resultado[resultado['tipo'] == 'cantidad'].loc[entradas_modelo(modelo)['entrada'][:len(c)]]
+    assert cantidades['S1'].to_numpy() == pytest.approx(esperado, abs=0.05)
+    assert cantidades['ST'].to_numpy() == pytest.approx(esperado, abs=0.05)
+    assert resultado.loc[resultado['tipo'] == 'factor', 'ST'].sum() == 0.0
+    assert resultado.attrs['evaluaciones'] == 16384 * (len(resultado) + 2)
+
+def test_morris_modelo_aditivo():
+    modelo = compilar_modelo(PRODUCTO_PRUEBA, FACTORES)
+    resultado = efectos_morris(modelo, n_trayectorias=10, rango_factores=0.0, semilla=1)
+    c = contribuciones(modelo)['contribucion'].to_numpy()
+    cantidades = resultado.loc[entradas_modelo(modelo)['entrada'][:len(c)]]
+    # Efecto elemental exacto: contribución × ancho del rango (2 × 10 %)
+    assert cantidades['mu_star'].to_numpy() == pytest.approx(np.abs(c) * 0.2)
+    assert cantidades['sigma'].to_numpy() == pytest.approx(0.0, abs=1e-12)
@@ -0,0 +1,66 @@
+"""
+Tests para el servicio HTTP con agrupación de peticiones en lotes
+"""
+
+import asyncio
+import copy
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import preparar_matriz_factores
+from utils.servicio import calcular_lote
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def test_lote_coincide_con_calculo_individual():
+    otro = copy.deepcopy(PRODUCTO_PRUEBA)
+    # El peso distribuido es la carga de cada ruta de distribución
+    for canal in otro['distribucion']['canales']:
+        for ruta in canal['rutas']:
+            ruta['carga_kg'] *= 2
+    otro['materias_primas'] = otro['materias_primas'][:1]
+    resultados = calcular_lote([PRODUCTO_PRUEBA, otro, PRODUCTO_PRUEBA], FACTORES, preparar_matriz_factores(FACTORES))
+
+    for datos, resultado in zip([PRODUCTO_PRUEBA, otro, PRODUCTO_PRUEBA], resultados):
+        total, desglose = calcular_emisiones_detalladas_completas(datos, FACTORES)
+        assert resultado['total_kgCO2e'] == pytest.approx(total)
+        for etapa, valores in resultado['etapas'].items():
+            assert valores['total'] == pytest.approx(desglose[etapa]['total'])
+    # El lote mezcla pesos de distribución distintos
+    assert resultados[1]['etapas']['distribucion']['total'] != pytest.approx(resultados[0]['etapas']['distribucion']['total'])
+
+def test_producto_no_valido_no_afecta_al_lote():
+    resultados = calcular_lote([None, PRODUCTO_PRUEBA], FACTORES, preparar_matriz_factores(FACTORES))
+    assert 'error' in resultados[0]
+    total, _ = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    assert resultados[1]['total_kgCO2e'] == pytest.approx(total)
+
+def test_peticiones_concurrentes_se_agrupan():
+    pytest.importorskip('aiohttp')
+    from aiohttp.test_utils import TestClient, TestServer
+    from utils.servicio import crear_aplicacion
+
+    async def escenario():
+        cliente = TestClient(TestServer(crear_aplicacion(FACTORES, ventana_ms=50)))
+        await cliente.start_server()
+        try:
+            respuestas = await asyncio.gather(*[cliente.post('/footprint', json=PRODUCTO_PRUEBA) for _ in range(20)])
+            cuerpos = [await r.json() for r in respuestas]
+            erronea = await cliente.post('/footprint', data='no es json')
+            metricas = await (await cliente.get('/metrics')).json()
+        finally:
+            await cliente.close()
+        return [r.status for r in respuestas], cuerpos, erronea.status, metricas
+
+    estados, cuerpos, estado_erroneo, metricas = asyncio.run(escenario())
+    total, _ = calcular_emisiones_detalladas_completas(PRODUCTO_PRUEBA, FACTORES)
+    assert estados == [200] * 20
+    assert all(c['total_kgCO2e'] == pytest.approx(total) for c in cuerpos)
+    assert estado_erroneo == 400
+    assert metricas['peticiones'] == 21
+    assert metricas['errores'] == 1
+    assert metricas['lotes'] < 20
+    assert sum(metricas['histograma_latencia_ms'].values()) == 21
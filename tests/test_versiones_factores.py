@@ -0,0 +1,55 @@
+"""
+Tests para el historial versionado de factores
+"""
+
+import pandas as pd
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.motor import diferencia_factores, leer_factores, version_factores
+from utils.versiones_factores import (
+    abrir_historial,
+    cargar_version,
+    diferencia_versiones,
+    listar_versiones,
+    registrar_version
+)
+
+RUTA_FACTORES = os.path.join(os.path.dirname(__file__), '..', 'data', 'factors.csv')
+
+def _factores_modificados(factores):
+    nuevos = factores.drop(index=5).copy()
+    nuevos.loc[nuevos['item'] == 'Energía solar', 'factor_kgCO2e_per_unit'] = 0.04
+    nuevos['factor_agua_m3_per_unit'] = float('nan')  # categoría nueva sin datos: no es un cambio
+    return pd.concat([nuevos, factores.iloc[[0]].assign(item='Espelta')], ignore_index=True)
+
+def test_versiones_por_contenido(tmp_path):
+    historial = abrir_historial(str(tmp_path / 'historial.sqlite'))
+    factores = leer_factores(RUTA_FACTORES)
+    version = registrar_version(historial, factores, 'factors.csv')
+    assert registrar_version(historial, factores.copy()) == version
+    assert len(listar_versiones(historial)) == 1
+
+    recuperados = cargar_version(historial, version)
+    assert version_factores(recuperados) == version
+    pd.testing.assert_frame_equal(recuperados, factores)
+
+    with pytest.raises(KeyError):
+        cargar_version(historial, 'no-existe')
+
+def test_diferencia_entre_versiones_coincide_con_la_de_tablas(tmp_path):
+    historial = abrir_historial(str(tmp_path / 'historial.sqlite'))
+    factores = leer_factores(RUTA_FACTORES)
+    nuevos = _factores_modificados(factores)
+    anterior = registrar_version(historial, factores)
+    nueva = registrar_version(historial, nuevos)
+    assert listar_versiones(historial)['version'].tolist() == [nueva, anterior]
+
+    por_hash = diferencia_versiones(historial, anterior, nueva).sort_index()
+    por_tabla = diferencia_factores(factores, nuevos).sort_index()
+    assert sorted(por_hash['cambio']) == ['eliminada', 'modificada', 'nueva']
+    pd.testing.assert_frame_equal(por_hash, por_tabla, check_dtype=False)
+    assert diferencia_versiones(historial, anterior, anterior).empty
@@ -0,0 +1,84 @@
+"""
+Tests para los factores vigentes por año de producción
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import (
+    calcular_impactos_producto,
+    construir_partidas,
+    preparar_matriz_factores,
+    resolver_indice,
+    totales_lote,
+    totales_por_anio
+)
+from utils.vigencias import factores_del_anio
+from test_motor import FACTORES, PRODUCTO_PRUEBA
+
+def _factores_anuales():
+    """Energía solar 2021 (original), 2023 y 2025; Cartón de Chile 2020 y 2024"""
+    solar = FACTORES[FACTORES['item'] == 'Energía solar'].iloc[0]
+    carton = FACTORES[FACTORES['item'] == 'Cartón'].iloc[0]
+    extra = pd.DataFrame([
+        solar.to_dict() | {'year': 2025, 'factor_kgCO2e_per_unit': 0.02},
+        solar.to_dict() | {'year': 2023, 'factor_kgCO2e_per_unit': 0.03},
+        carton.to_dict() | {'region': 'Chile', 'year': 2024, 'factor_kgCO2e_per_unit': 1.2},
+        carton.to_dict() | {'region': 'Chile', 'year': 2020, 'factor_kgCO2e_per_unit': 1.5}
+    ])
+    return pd.concat([FACTORES, extra], ignore_index=True)
+
+def test_factor_vigente_por_anio():
+    matriz = preparar_matriz_factores(_factores_anuales())
+    valor = lambda **kw: matriz['matriz'][resolver_indice(matriz, 'energia', 'Energía solar', **kw), 0]
+
+    assert valor() == 0.05
+    assert valor(anio=2019) == 0.05  # antes de la primera versión: la más antigua
+    assert valor(anio=2022) == 0.05
+    assert valor(anio=2023) == 0.03
+    assert valor(anio=2024) == 0.03
+    assert valor(anio=2030) == 0.02
+
+    carton = lambda anio: matriz['matriz'][resolver_indice(matriz, 'material_empaque', 'Cartón', region='Chile',
+                                                           anio=anio), 0]
+    assert [carton(a) for a in (2019, 2023, 2024)] == [1.5, 1.5, 1.2]
+
+def test_mismo_resultado_que_calculo_detallado():
+    factores = _factores_anuales()
+    producto = copy.deepcopy(PRODUCTO_PRUEBA)
+    producto['empaques'][1]['region'] = 'Chile'
+    for anio in (2019, 2023, 2026):
+        producto['producto']['anio'] = anio
+        total, _ = calcular_emisiones_detalladas_completas(producto, factores)
+        assert calcular_impactos_producto(producto, factores)['gwp'].sum() == pytest.approx(total)
+
+def test_factores_del_anio():
+    factores = _factores_anuales()
+    del_anio = factores_del_anio(factores, 2024)
+    solar = del_anio[del_anio['item'] == 'Energía solar']
+    assert solar['factor_kgCO2e_per_unit'].tolist() == [0.03]
+    assert len(del_anio) == len(FACTORES) + 1  # Cartón de Chile es otro grupo
+    assert factores_del_anio(factores, None) is factores
+
+def test_cartera_multianio_en_una_pasada():
+    factores = _factores_anuales()
+    matriz = preparar_matriz_factores(factores)
+    cartera = [copy.deepcopy(PRODUCTO_PRUEBA) for _ in range(3)]
+    cartera[1]['empaques'][1]['region'] = 'Chile'
+    cartera[2]['produccion']['energia_kwh'] = 1.0
+    partidas = [construir_partidas(datos, factores) for datos in cartera]
+    anios = range(2019, 2027)
+
+    totales = totales_por_anio(partidas, factores, anios, matriz)
+    assert totales.shape[:2] == (len(anios), len(cartera))
+    for a, anio in enumerate(anios):
+        por_anio = [p.assign(anio=anio) for p in partidas]
+        np.testing.assert_allclose(totales[a], totales_lote(por_anio, factores, matriz))
+    assert totales[-1, 2].sum() < totales[0, 2].sum()
@@ -0,0 +1,171 @@
+"""
+Asignación de la energía y el agua medidas por planta a cada SKU
+Los totales de cada planta se reparten según un inductor por SKU (masa producida,
+horas máquina o unidades) en una sola pasada vectorizada; el resultado alimenta
+directamente la etapa de procesamiento del cálculo por lotes
+ASIGNACIÓN PLANTA → SKU
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+from utils.motor import COLUMNAS_PARTIDAS, totales_partidas
+from utils.perfiles_horarios import ajustes_horarios
+
+# Inductores de reparto y su columna en la tabla de SKUs
+INDUCTORES_ASIGNACION = {
+    'masa': 'masa_kg',
+    'horas_maquina': 'horas_maquina',
+    'volumen': 'unidades'
+}
+
+# Consumo medido por planta -> columna de la planta con su inductor
+RECURSOS_PLANTA = {'energia_kwh': 'inductor_energia', 'agua_m3': 'inductor_agua'}
+
+INDUCTOR_DEFECTO = 'masa'
+TIPO_ENERGIA_DEFECTO = 'Red eléctrica promedio'
+
+def _columna_planta(plantas, columna, defecto):
+    """Columna opcional de la tabla de plantas (valor por defecto si falta o está vacía)"""
+    if columna not in plantas.columns:
+        return pd.Series(defecto, index=plantas.index, dtype=object)
+    return plantas[columna].where(plantas[columna].notna() & (plantas[columna] != ''), defecto)
+
+def asignar_consumos(plantas, skus):
+    """
+    Reparte energia_kwh y agua_m3 de cada planta entre sus SKUs en proporción a
+    su inductor. El inductor de cada recurso se elige por planta (columnas
+    inductor_energia / inductor_agua, por defecto 'masa').
+
+    Args:
+        plantas: DataFrame con 'planta', 'energia_kwh', 'agua_m3' y opcionalmente
+            los inductores, 'tipo_energia', 'region', 'perfil_red' y 'perfil_carga'
+        skus: DataFrame con 'sku', 'planta', 'unidades' y las columnas de los
+            inductores usados (masa_kg, horas_maquina)
+
+    Returns:
+        Copia de skus con lo asignado a toda su producción ('energia_kwh',
+        'agua_m3') y por unidad ('energia_kwh_unidad', 'agua_m3_unidad')
+    """
+    plantas = plantas.set_index('planta')
+    planta_sku = plantas.index.get_indexer(skus['planta'])
+    if (planta_sku < 0).any():
+        faltantes = sorted(set(skus['planta'][planta_sku < 0].astype(str)))
+        raise ValueError(f"SKUs de plantas sin consumos medidos: {', '.join(faltantes)}")
+
+    # Matriz SKU × inductor; un inductor sin columna queda en NaN y solo falla si se usa
+    valores = np.column_stack([
+        pd.to_numeric(skus[columna], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+        if columna in skus.columns else np.full(len(skus), np.nan)
+        for columna in INDUCTORES_ASIGNACION.values()])
+    unidades = pd.to_numeric(skus['unidades'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+
+    resultado = skus.copy()
+    for recurso, columna_inductor in RECURSOS_PLANTA.items():
+        inductores = _columna_planta(plantas, columna_inductor, INDUCTOR_DEFECTO)
+        codigos = pd.Index(list(INDUCTORES_ASIGNACION)).get_indexer(inductores)
+        if (codigos < 0).any():
+            raise ValueError(f"Inductor de asignación desconocido: {', '.join(sorted(set(inductores[codigos < 0])))}")
+        inductor_sku = valores[np.arange(len(skus)), codigos[planta_sku]]
+        if np.isnan(inductor_sku).any():
+            raise ValueError(f"Faltan columnas de inductor en los SKUs para repartir {recurso}")
+
+        suma_planta = np.bincount(planta_sku, weights=inductor_sku, minlength=len(plantas))[planta_sku]
+        total_planta = pd.to_numeric(plantas[recurso], errors='coerce').fillna(0.0).to_numpy(dtype=float)[planta_sku]
+        asignado = np.divide(inductor_sku * total_planta, suma_planta,
+                             out=np.zeros(len(skus)), where=suma_planta > 0)
+        resultado[recurso] = asignado
+        resultado[f'{recurso}_unidad'] = np.divide(asignado, unidades, out=np.zeros(len(skus)), where=unidades > 0)
+    return resultado
+
+def partidas_produccion(asignacion, plantas, anios=0, perfiles=None):
+    """
+    Partidas de la etapa de procesamiento de cada SKU con sus consumos asignados
+    por unidad (mismas filas que construir_partidas para 'produccion').
+
+    Returns:
+        (partidas, índice en asignacion del SKU de cada partida)
+    """
+    plantas = plantas.set_index('planta')
+    planta_sku = plantas.index.get_indexer(asignacion['planta'])
+    tipo_energia = _columna_planta(plantas, 'tipo_energia', TIPO_ENERGIA_DEFECTO).to_numpy()[planta_sku]
+    region = _columna_planta(plantas, 'region', '').to_numpy()[planta_sku]
+    ajuste_planta = ajustes_horarios(_columna_planta(plantas, 'perfil_red', None).tolist(),
+                                     _columna_planta(plantas, 'perfil_carga', None).tolist(), perfiles)
+    anios = np.broadcast_to(np.asarray(anios, dtype=np.int64), (len(asignacion),))
+
+    bloques = []
+    for recurso, fuente in (('energia_kwh', 'Energía Producción'), ('agua_m3', 'Agua Producción')):
+        cantidades = asignacion[f'{recurso}_unidad'].to_numpy(dtype=float)
+        filas = np.flatnonzero(cantidades > 0)
+        energia = recurso == 'energia_kwh'
+        bloques.append((filas, pd.DataFrame({
+            'etapa': 'procesamiento',
+            'fuente': fuente,
+            'subfuente': tipo_energia[filas] if energia else 'agua',
+            'categoria': 'energia' if energia else 'agua',
+            'item': tipo_energia[filas] if energia else '',
+            'exacto': False,
+            'cantidad': cantidades[filas],
+            'masa_kg': 0.0,
+            'region': region[filas],
+            'anio': anios[filas],
+            'ajuste': ajuste_planta[planta_sku[filas]] if energia else 1.0,
+            'ruta': ''
+        }, columns=COLUMNAS_PARTIDAS)))
+
+    skus = np.concatenate([filas for filas, _ in bloques])
+    partidas = pd.concat([tabla for _, tabla in bloques], ignore_index=True)
+    return partidas, skus
+
+def totales_asignados(partidas_por_sku, asignacion, plantas, factores_df, matriz_factores=None, perfiles=None):
+    """
+    Cálculo por lotes de una cartera con la etapa de procesamiento tomada de la
+    asignación por planta: se descartan las partidas de procesamiento de cada SKU
+    y se añaden las de sus consumos asignados.
+
+    Args:
+        partidas_por_sku: lista de tablas de partidas, en el orden de las filas de asignacion
+
+    Returns:
+        Array (SKUs × ETAPAS × categorías) con los totales por etapa
+    """
+    tamanos = np.array([len(p) for p in partidas_por_sku], dtype=np.int64)
+    productos = np.repeat(np.arange(len(partidas_por_sku)), tamanos)
+    partidas = pd.concat(partidas_por_sku, ignore_index=True) if tamanos.sum() else \
+        pd.DataFrame(columns=COLUMNAS_PARTIDAS)
+
+    # Año de producción de cada SKU: el de su primera partida
+    anios = np.zeros(len(partidas_por_sku), dtype=np.int64)
+    con_partidas = tamanos > 0
+    if 'anio' in partidas.columns and con_partidas.any():
+        inicios = np.concatenate([[0], np.cumsum(tamanos)[:-1]])
+        anios[con_partidas] = partidas['anio'].to_numpy(dtype=np.int64)[inicios[con_partidas]]
+
+    conservar = (partidas['etapa'] != 'procesamiento').to_numpy()
+    produccion, skus_produccion = partidas_produccion(asignacion, plantas, anios, perfiles)
+    return totales_partidas(pd.concat([partidas[conservar], produccion], ignore_index=True),
+                            np.concatenate([productos[conservar], skus_produccion]),
+                            len(partidas_por_sku), factores_df, matriz_factores)
+
+def datos_asignados(datos, sku_asignado, planta):
+    """
+    Copia de los datos de un producto con la producción de la asignación por
+    planta (para el cálculo detallado de un solo SKU).
+
+    Args:
+        sku_asignado: fila de asignar_consumos para el SKU
+        planta: fila de la tabla de plantas
+    """
+    datos = copy.deepcopy(datos)
+    produccion = dict(datos.get('produccion') or {})
+    produccion['energia_kwh'] = float(sku_asignado['energia_kwh_unidad'])
+    produccion['agua_m3'] = float(sku_asignado['agua_m3_unidad'])
+    # La energía medida en planta es la de la planta: su tipo, región y perfiles sustituyen a los del producto
+    for clave in ('tipo_energia', 'region', 'perfil_red', 'perfil_carga'):
+        produccion.pop(clave, None)
+        if clave in planta and pd.notna(planta[clave]) and planta[clave] != '':
+            produccion[clave] = planta[clave]
+    produccion.setdefault('tipo_energia', TIPO_ENERGIA_DEFECTO)
+    datos['produccion'] = produccion
+    return datos
@@ -0,0 +1,132 @@
+"""
+Motor de balance de masa para la calculadora de huella de carbono
+Entradas (materias primas compradas, empaques) vs salidas (producto, mermas por
+tratamiento, pérdidas sin emisiones) y error de cierre por producto.
+CÁLCULO VECTORIZADO PARA PORTAFOLIOS COMPLETOS
+"""
+
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Tratamientos de mermas (mismas opciones que la pestaña de producción)
+TRATAMIENTOS_MERMA = ['Vertedero', 'Incineración', 'Compostaje', 'Reciclaje']
+
+def clave_tratamiento(tratamiento):
+    """Nombre de tratamiento sin tildes ni mayúsculas ('Incineración' -> 'incineracion')"""
+    sin_tildes = unicodedata.normalize('NFKD', str(tratamiento or '')).encode('ascii', 'ignore').decode()
+    return sin_tildes.strip().lower()
+
+_TRATAMIENTOS_POR_CLAVE = {clave_tratamiento(t): t for t in TRATAMIENTOS_MERMA}
+
+FLUJOS_ENTRADA = [
+    'materias_primas_kg',
+    'empaques_materias_primas_kg',
+    'empaques_producto_kg'
+]
+
+FLUJOS_SALIDA = [
+    'producto_kg',
+    'empaques_producto_kg',
+    'residuos_empaques_mp_kg',
+    # Mermas por tratamiento; 'otros' recoge los tratamientos no reconocidos
+    *[f"mermas_{clave_tratamiento(t)}_kg" for t in TRATAMIENTOS_MERMA],
+    'mermas_otros_kg',
+    'mermas_sin_gestion_kg',
+    'perdidas_sin_emisiones_kg'
+]
+
+# Error de cierre admitido (% sobre las entradas totales)
+TOLERANCIA_CIERRE_PCT = 1.0
+
+def extraer_flujos_masa(datos_producto):
+    """
+    Extrae los flujos de masa de un producto con la estructura de session_state
+    ('producto', 'materias_primas', 'empaques', 'produccion').
+
+    Returns:
+        Tupla (vector de entradas, vector de salidas) en kg, en el orden de
+        FLUJOS_ENTRADA y FLUJOS_SALIDA.
+    """
+    producto = datos_producto.get('producto') or {}
+    materias_primas = [mp for mp in (datos_producto.get('materias_primas') or []) if mp and mp.get('producto')]
+    empaques = [emp for emp in (datos_producto.get('empaques') or []) if emp]
+    produccion = datos_producto.get('produccion') or {}
+
+    comprado_kg = sum(mp.get('cantidad_real_kg', 0) or 0 for mp in materias_primas)
+    usado_kg = sum(mp.get('cantidad_teorica_kg', mp.get('cantidad_real_kg', 0)) or 0 for mp in materias_primas)
+    empaques_mp_kg = sum((mp.get('empaque') or {}).get('peso_kg', 0) or 0 for mp in materias_primas)
+    empaques_producto_kg = sum((emp.get('peso_kg', 0) or 0) * emp.get('cantidad', 1) for emp in empaques)
+
+    # Mermas gestionadas por tratamiento (sin distinguir tildes ni mayúsculas);
+    # los tratamientos desconocidos van a 'otros' y el resto de la merma queda sin gestión
+    mermas_tratamiento = dict.fromkeys(TRATAMIENTOS_MERMA, 0.0)
+    mermas_otros_kg = 0.0
+    for merma in produccion.get('mermas_gestionadas') or []:
+        if merma and merma.get('cantidad_kg', 0) > 0:
+            tratamiento = _TRATAMIENTOS_POR_CLAVE.get(clave_tratamiento(merma.get('tipo_gestion', 'Vertedero')))
+            if tratamiento is None:
+                mermas_otros_kg += merma['cantidad_kg']
+            else:
+                mermas_tratamiento[tratamiento] += merma['cantidad_kg']
+    merma_total_kg = max(comprado_kg - usado_kg, 0.0)
+    mermas_sin_gestion_kg = max(merma_total_kg - sum(mermas_tratamiento.values()) - mermas_otros_kg, 0.0)
+
+    entradas = [comprado_kg, empaques_mp_kg, empaques_producto_kg]
+    salidas = [
+        producto.get('peso_neto_kg', 0) or 0,
+        empaques_producto_kg,
+        empaques_mp_kg,
+        *[mermas_tratamiento[t] for t in TRATAMIENTOS_MERMA],
+        mermas_otros_kg,
+        mermas_sin_gestion_kg,
+        produccion.get('perdidas_sin_emisiones_kg', 0) or 0
+    ]
+    return entradas, salidas
+
+def calcular_balance_masa_lote(productos, nombres=None, tolerancia_pct=TOLERANCIA_CIERRE_PCT):
+    """
+    Calcula el balance de masa de un portafolio de productos como operaciones
+    sobre matrices (productos × flujos).
+
+    Args:
+        productos: lista de diccionarios con la estructura de session_state
+        nombres: nombres opcionales de los productos (índice del resultado)
+        tolerancia_pct: error de cierre admitido en % de las entradas
+
+    Returns:
+        DataFrame con una fila por producto: flujos de entrada ('entrada_*'),
+        de salida ('salida_*'), totales, error de cierre y la bandera 'cierra'
+    """
+    flujos = [extraer_flujos_masa(p) for p in productos]
+    entradas = np.array([f[0] for f in flujos], dtype=float).reshape(len(flujos), len(FLUJOS_ENTRADA))
+    salidas = np.array([f[1] for f in flujos], dtype=float).reshape(len(flujos), len(FLUJOS_SALIDA))
+
+    return balance_masa_desde_matrices(entradas, salidas, nombres, tolerancia_pct)
+
+def balance_masa_desde_matrices(entradas, salidas, nombres=None, tolerancia_pct=TOLERANCIA_CIERRE_PCT):
+    """
+    Calcula totales y error de cierre a partir de matrices de flujos ya ensambladas
+    (productos × FLUJOS_ENTRADA, productos × FLUJOS_SALIDA).
+    """
+    entradas = np.asarray(entradas, dtype=float)
+    salidas = np.asarray(salidas, dtype=float)
+
+    total_entradas = entradas.sum(axis=1)
+    total_salidas = salidas.sum(axis=1)
+    error_cierre = total_entradas - total_salidas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error_pct = np.where(total_entradas > 0, error_cierre / total_entradas * 100, 0.0)
+
+    balance = pd.DataFrame(
+        np.hstack([entradas, salidas]),
+        columns=[f"entrada_{f}" for f in FLUJOS_ENTRADA] + [f"salida_{f}" for f in FLUJOS_SALIDA],
+        index=nombres
+    )
+    balance['total_entradas_kg'] = total_entradas
+    balance['total_salidas_kg'] = total_salidas
+    balance['error_cierre_kg'] = error_cierre
+    balance['error_cierre_pct'] = error_pct
+    balance['cierra'] = np.abs(error_pct) <= tolerancia_pct
+    return balance
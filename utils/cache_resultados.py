@@ -0,0 +1,204 @@
+"""
+Caché en disco de resultados por contenido (SQLite)
+La clave es el hash canónico de los datos del producto más la versión de la tabla
+de factores; un acierto devuelve el desglose completo (o la tabla del resultado)
+sin ejecutar ninguna etapa
+MISMO PRODUCTO, MISMOS FACTORES: NO SE RECALCULA
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import zlib
+from collections.abc import Mapping
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import version_factores
+from utils.perfiles_horarios import usa_perfiles, version_perfiles
+from utils.resultados import calcular_resultado
+
+RUTA_CACHE_DEFECTO = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache_resultados.sqlite')
+TAMANO_MAXIMO_DEFECTO = 256 * 1024 * 1024
+
+# Claves de los datos del producto que intervienen en el cálculo
+CLAVES_PRODUCTO = ['producto', 'materias_primas', 'empaques', 'produccion', 'distribucion', 'retail', 'uso_fin_vida',
+                   'coproductos']
+
+def _canonico(valor):
+    """Representación JSON estable: claves ordenadas y números como float"""
+    if isinstance(valor, Mapping):
+        return {str(k): _canonico(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_canonico(v) for v in valor]
+    if isinstance(valor, bool) or valor is None or isinstance(valor, str):
+        return valor
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return str(valor)
+
+def datos_canonicos(datos):
+    """Datos del producto que intervienen en el cálculo, como JSON canónico"""
+    contenido = {clave: _canonico(datos.get(clave)) for clave in CLAVES_PRODUCTO}
+    return json.dumps(contenido, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+def hash_producto(datos):
+    """Hash canónico de los datos de un producto (estructura de session_state)"""
+    texto = datos_canonicos(datos)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+def clave_resultado(datos, factores_df=None, version=None, perfiles=None):
+    """
+    Clave de la caché: hash del producto + versión de los factores. Si el
+    producto usa perfiles horarios, el hash incluye también la versión de los
+    perfiles (por defecto, los del archivo de perfiles), porque cambian su huella.
+    """
+    if version is None:
+        version = version_factores(factores_df)
+    hash_datos = hash_producto(datos)
+    if usa_perfiles(datos):
+        hash_datos = hashlib.sha256(f"{hash_datos}:{version_perfiles(perfiles)}".encode('utf-8')).hexdigest()
+    return f"{hash_datos}:{version}"
+
+def abrir_cache(ruta=RUTA_CACHE_DEFECTO, tamano_maximo=TAMANO_MAXIMO_DEFECTO):
+    """
+    Abre (o crea) la caché. Se puede compartir entre hilos.
+
+    Returns:
+        Diccionario con la conexión, el tamaño máximo en bytes y los contadores de
+        aciertos y fallos de esta sesión
+    """
+    if ruta != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conexion = sqlite3.connect(ruta, check_same_thread=False)
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS resultados (
+            clave TEXT PRIMARY KEY,
+            version_factores TEXT NOT NULL,
+            valor BLOB NOT NULL,
+            tamano INTEGER NOT NULL,
+            ultimo_acceso INTEGER NOT NULL
+        )""")
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_resultados_acceso ON resultados (ultimo_acceso)")
+    conexion.execute("CREATE TABLE IF NOT EXISTS contadores (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+    conexion.commit()
+    return {
+        'conexion': conexion,
+        'bloqueo': threading.Lock(),
+        'tamano_maximo': tamano_maximo,
+        'aciertos': 0,
+        'fallos': 0
+    }
+
+def _siguiente_acceso(conexion):
+    return conexion.execute("SELECT COALESCE(MAX(ultimo_acceso), 0) + 1 FROM resultados").fetchone()[0]
+
+def _contar(conexion, nombre):
+    conexion.execute("INSERT INTO contadores VALUES (?, 1) ON CONFLICT(nombre) DO UPDATE SET valor = valor + 1",
+                     (nombre,))
+
+def obtener_resultado(cache, clave):
+    """Resultado guardado con esa clave (el valor tal como se guardó) o None si no está"""
+    with cache['bloqueo']:
+        conexion = cache['conexion']
+        fila = conexion.execute("SELECT valor FROM resultados WHERE clave = ?", (clave,)).fetchone()
+        if fila is None:
+            cache['fallos'] += 1
+            _contar(conexion, 'fallos')
+            conexion.commit()
+            return None
+        cache['aciertos'] += 1
+        _contar(conexion, 'aciertos')
+        conexion.execute("UPDATE resultados SET ultimo_acceso = ? WHERE clave = ?",
+                         (_siguiente_acceso(conexion), clave))
+        conexion.commit()
+    return pickle.loads(zlib.decompress(fila[0]))
+
+def guardar_resultado(cache, clave, emisiones_totales, desglose_detallado, version=None):
+    """Guarda un resultado y expulsa los menos usados recientemente si se supera el tamaño máximo"""
+    _guardar(cache, clave, (emisiones_totales, desglose_detallado), version)
+
+def _guardar(cache, clave, objeto, version=None):
+    valor = zlib.compress(pickle.dumps(objeto, protocol=pickle.HIGHEST_PROTOCOL))
+    if version is None:
+        version = clave.rsplit(':', 1)[-1]
+    with cache['bloqueo']:
+        conexion = cache['conexion']
+        conexion.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)",
+                         (clave, version, valor, len(valor), _siguiente_acceso(conexion)))
+        _expulsar(conexion, cache['tamano_maximo'])
+        conexion.commit()
+
+def _expulsar(conexion, tamano_maximo):
+    """Elimina las entradas menos usadas recientemente hasta caber en tamano_maximo"""
+    total = conexion.execute("SELECT COALESCE(SUM(tamano), 0) FROM resultados").fetchone()[0]
+    if total <= tamano_maximo:
+        return
+    eliminar = []
+    for clave, tamano in conexion.execute("SELECT clave, tamano FROM resultados ORDER BY ultimo_acceso"):
+        if total <= tamano_maximo:
+            break
+        eliminar.append((clave,))
+        total -= tamano
+    conexion.executemany("DELETE FROM resultados WHERE clave = ?", eliminar)
+
+def calcular_con_cache(cache, datos, factores_df, version=None):
+    """
+    Igual que calcular_emisiones_detalladas_completas, pero consultando antes la
+    caché. Un acierto no ejecuta ninguna función de etapa.
+
+    Returns:
+        (emisiones_totales, desglose_detallado)
+    """
+    clave = clave_resultado(datos, factores_df, version)
+    resultado = obtener_resultado(cache, clave)
+    if resultado is not None:
+        return resultado
+    emisiones_totales, desglose_detallado = calcular_emisiones_detalladas_completas(datos, factores_df)
+    guardar_resultado(cache, clave, emisiones_totales, desglose_detallado)
+    return emisiones_totales, desglose_detallado
+
+def calcular_resultado_con_cache(cache, datos, factores_df, version=None, matriz_factores=None):
+    """
+    Igual que resultados.calcular_resultado, pero consultando antes la caché. Se
+    guarda el ResultadoHuella con las vistas de detalle por etapa ya calculadas,
+    así que un acierto no construye partidas ni agrupa la tabla.
+
+    Returns:
+        (clave del resultado, ResultadoHuella)
+    """
+    clave = clave_resultado(datos, factores_df, version)
+    # Misma clave que el desglose, con prefijo: las dos formas del resultado conviven en la caché
+    clave_tabla = f"tabla:{clave}"
+    resultado = obtener_resultado(cache, clave_tabla)
+    if resultado is None:
+        resultado = calcular_resultado(datos, factores_df, matriz_factores)
+        resultado.detalle_etapas()
+        _guardar(cache, clave_tabla, resultado)
+    return clave, resultado
+
+def estadisticas_cache(cache):
+    """Aciertos, fallos y tasa de aciertos de la sesión y acumulados, entradas y tamaño ocupado"""
+    with cache['bloqueo']:
+        conexion = cache['conexion']
+        entradas, tamano = conexion.execute("SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM resultados").fetchone()
+        acumulados = dict(conexion.execute("SELECT nombre, valor FROM contadores").fetchall())
+    consultas = cache['aciertos'] + cache['fallos']
+    consultas_acumuladas = acumulados.get('aciertos', 0) + acumulados.get('fallos', 0)
+    return {
+        'aciertos': cache['aciertos'],
+        'fallos': cache['fallos'],
+        'tasa_aciertos': cache['aciertos'] / consultas if consultas else 0.0,
+        'aciertos_acumulados': acumulados.get('aciertos', 0),
+        'fallos_acumulados': acumulados.get('fallos', 0),
+        'tasa_aciertos_acumulada': acumulados.get('aciertos', 0) / consultas_acumuladas if consultas_acumuladas else 0.0,
+        'entradas': entradas,
+        'tamano_bytes': tamano,
+        'tamano_maximo_bytes': cache['tamano_maximo']
+    }
+
+def cerrar_cache(cache):
+    with cache['bloqueo']:
+        cache['conexion'].close()
@@ -7,10 +7,33 @@ COMPATIBLE CON NAVEGACIÓN POR PESTAÑAS
 import pandas as pd
 import numpy as np
 from utils.units import convertir_unidad, formatear_numero
+from utils.balance_masa import (
+    FLUJOS_ENTRADA,
+    FLUJOS_SALIDA,
+    TOLERANCIA_CIERRE_PCT,
+    calcular_balance_masa_lote
+)
+from utils.regiones import cadena_regiones
+from utils.vigencias import factores_del_anio
+from utils.perfiles_horarios import ajuste_horario
+from utils.coproductos import FUENTE_CREDITO, escalar_etapa, fracciones_asignacion, leer_coproductos
+from utils.nucleos import emisiones_fin_vida
 
-def obtener_factor(factores_df, categoria, item=None, subcategoria=None):
+# Valores por defecto con sus unidades estándar (cuando no se encuentra el factor)
+FACTORES_POR_DEFECTO = {
+    'materia_prima': (2.0, 'kg'),
+    'material_empaque': (3.0, 'kg'), 
+    'transporte': (0.1, 'ton-km'),
+    'energia': (0.45, 'kWh'),
+    'agua': (0.34, 'm3'),
+    'residuo': (0.5, 'kg')
+}
+
+def obtener_factor(factores_df, categoria, item=None, subcategoria=None, region=None):
     """
     Obtiene el factor de emisión para una categoría específica - VERSIÓN MEJORADA
+    Con region (país o región) se prefiere la fila del ítem de esa región,
+    luego la de su región padre y por último la Global
     """
     try:
         # Búsqueda case-insensitive y flexible
@@ -27,6 +50,13 @@ def obtener_factor(factores_df, categoria, item=None, subcategoria=None):
         if subcategoria:
             filtro &= factores_df['subcategory'] == subcategoria
         
+        if region and 'region' in factores_df.columns and filtro.any():
+            mismo_item = filtro & (factores_df['item'] == factores_df.loc[filtro, 'item'].iloc[0])
+            prioridad = {nombre: i for i, nombre in enumerate(cadena_regiones(region))}
+            rango = factores_df.loc[mismo_item, 'region'].map(prioridad)
+            if rango.notna().any():
+                filtro = mismo_item & (factores_df.index == rango.idxmin())
+        
         if not factores_df[filtro].empty:
             factor = float(factores_df.loc[filtro, 'factor_kgCO2e_per_unit'].iloc[0])
             unidad = factores_df.loc[filtro, 'unit'].iloc[0]
@@ -38,16 +68,7 @@ def obtener_factor(factores_df, categoria, item=None, subcategoria=None):
             
     except (IndexError, ValueError, Exception) as e:
         print(f"Error obteniendo factor para {categoria}/{item}: {str(e)}")
-        # Valores por defecto con sus unidades estándar
-        factores_por_defecto = {
-            'materia_prima': (2.0, 'kg'),
-            'material_empaque': (3.0, 'kg'), 
-            'transporte': (0.1, 'ton-km'),
-            'energia': (0.45, 'kWh'),
-            'agua': (0.34, 'm3'),
-            'residuo': (0.5, 'kg')
-        }
-        return factores_por_defecto.get(categoria.lower(), (1.0, 'kg'))
+        return FACTORES_POR_DEFECTO.get(categoria.lower(), (1.0, 'kg'))
 
 def calcular_emisiones_materias_primas(materias_primas, factores_df):
     """
@@ -62,7 +83,8 @@ def calcular_emisiones_materias_primas(materias_primas, factores_df):
             
         try:
             # Obtener factor y unidad esperada
-            factor, unidad_esperada = obtener_factor(factores_df, 'materia_prima', materia['producto'])
+            factor, unidad_esperada = obtener_factor(factores_df, 'materia_prima', materia['producto'],
+                                                     region=materia.get('region'))
             
             # Convertir cantidad a la unidad del factor (kg)
             cantidad_real_kg = materia.get('cantidad_real_kg', 0)
@@ -72,7 +94,8 @@ def calcular_emisiones_materias_primas(materias_primas, factores_df):
             # Empaque de la materia prima
             emisiones_empaque_mp = 0.0
             if materia.get('empaque') and materia['empaque'].get('material'):
-                factor_empaque, unidad_emp = obtener_factor(factores_df, 'material_empaque', materia['empaque']['material'])
+                factor_empaque, unidad_emp = obtener_factor(factores_df, 'material_empaque', materia['empaque']['material'],
+                                                            region=materia.get('region'))
                 peso_emp_kg = materia['empaque'].get('peso_kg', 0)
                 emisiones_empaque_mp = peso_emp_kg * factor_empaque
                 total_emisiones += emisiones_empaque_mp
@@ -106,7 +129,8 @@ def calcular_emisiones_empaques(empaques, factores_df):
             continue
             
         try:
-            factor, unidad_esperada = obtener_factor(factores_df, 'material_empaque', empaque['material'])
+            factor, unidad_esperada = obtener_factor(factores_df, 'material_empaque', empaque['material'],
+                                                     region=empaque.get('region'))
             peso_total_kg = empaque.get('peso_kg', 0) * empaque.get('cantidad', 1)
             
             emisiones = peso_total_kg * factor
@@ -155,6 +179,7 @@ def calcular_emisiones_transporte_materias_primas(materias_primas, factores_df):
                         'ruta': j+1,
                         'origen': transporte.get('origen', ''),
                         'destino': transporte.get('destino', ''),
+                        'tipo_transporte': transporte['tipo_transporte'],
                         'distancia_km': distancia_km,
                         'carga_kg': carga_kg,
                         'carga_ton': carga_ton,
@@ -205,6 +230,7 @@ def calcular_emisiones_transporte_empaques(empaques, factores_df):
                         'ruta': j+1,
                         'origen': transporte.get('origen', ''),
                         'destino': transporte.get('destino', ''),
+                        'tipo_transporte': transporte['tipo_transporte'],
                         'distancia_km': distancia_km,
                         'carga_kg': carga_kg,
                         'carga_ton': carga_ton,
@@ -248,35 +274,140 @@ def calcular_emisiones_agua(consumo_m3, factores_df):
         print(f"Error cálculo agua: {str(e)}")
         return 0.0
 
-def calcular_emisiones_residuos(masa_kg, factores_df, distribucion_fin_vida=None):
+# Tratamientos de fin de vida, en el orden de las columnas de la matriz de porcentajes.
+# Cada tratamiento corresponde a la clave 'porcentaje_<tratamiento>' de las distribuciones.
+TRATAMIENTOS_FIN_VIDA = ['vertedero', 'incineracion', 'compostaje', 'reciclaje']
+
+# Ítem de factors.csv (categoría 'residuo') usado para cada tratamiento
+FACTORES_TRATAMIENTO_POR_DEFECTO = {
+    'vertedero': 'Vertedero general',
+    'incineracion': 'Incineración',
+    'compostaje': 'Compostaje',
+    'reciclaje': 'Reciclaje general'
+}
+
+# Excepciones por subcategoría de material de empaque (coincidencia exacta de ítem)
+MAPEO_TRATAMIENTOS_MATERIAL = {
+    'papel': {'vertedero': 'Vertedero cartón'},
+    'bioplasticos': {'vertedero': 'Vertedero organico'}
+}
+
+def _buscar_factor_exacto(factores_df, categoria, item):
+    """
+    Busca un factor por coincidencia exacta de ítem (sin distinguir mayúsculas).
+    Devuelve (factor, fila) o None si no existe.
+    """
+    filtro = ((factores_df['category'].str.lower() == categoria.lower()) &
+              (factores_df['item'].str.lower() == str(item).strip().lower()))
+    if not filtro.any():
+        return None
+    fila = factores_df[filtro].iloc[0]
+    factor = pd.to_numeric(fila['factor_kgCO2e_per_unit'], errors='coerce')
+    if pd.isna(factor):
+        return None
+    return float(factor), fila
+
+def items_tratamiento_material(factores_df, material):
+    """
+    Ítems de factors.csv (categoría 'residuo') que corresponden a cada tratamiento
+    de fin de vida para un material de empaque, según MAPEO_TRATAMIENTOS_MATERIAL.
+    Si el ítem específico no existe en la tabla se usa el genérico del tratamiento.
+    """
+    subcategoria = ''
+    if material:
+        encontrado = _buscar_factor_exacto(factores_df, 'material_empaque', material)
+        if encontrado is not None:
+            subcategoria = str(encontrado[1].get('subcategory', '')).lower()
+    excepciones = MAPEO_TRATAMIENTOS_MATERIAL.get(subcategoria, {})
+    
+    items = {}
+    for tratamiento in TRATAMIENTOS_FIN_VIDA:
+        item = excepciones.get(tratamiento, FACTORES_TRATAMIENTO_POR_DEFECTO[tratamiento])
+        if item != FACTORES_TRATAMIENTO_POR_DEFECTO[tratamiento] and _buscar_factor_exacto(factores_df, 'residuo', item) is None:
+            print(f"Factor de tratamiento '{item}' no encontrado, usando el genérico")
+            item = FACTORES_TRATAMIENTO_POR_DEFECTO[tratamiento]
+        items[tratamiento] = item
+    return items
+
+def construir_matriz_fin_vida(factores_df, materiales):
+    """
+    Resuelve UNA sola vez los factores de tratamiento para cada material distinto.
+    
+    Returns:
+        (materiales_unicos, matriz_factores, indices) donde matriz_factores es
+        (materiales × tratamientos) en kg CO₂e/kg e indices asigna cada elemento
+        de `materiales` a su fila de la matriz.
+    """
+    claves = [str(m).strip().lower() if m else '' for m in materiales]
+    materiales_unicos, indices = np.unique(np.asarray(claves, dtype=object), return_inverse=True)
+    
+    # Factores por ítem de tratamiento, resueltos una vez por ejecución
+    cache_factores = {}
+    def factor_item(item):
+        if item not in cache_factores:
+            encontrado = _buscar_factor_exacto(factores_df, 'residuo', item)
+            if encontrado is None:
+                print(f"Factor de tratamiento '{item}' no encontrado, usando valor por defecto")
+                cache_factores[item] = FACTORES_POR_DEFECTO['residuo'][0]
+            else:
+                cache_factores[item] = encontrado[0]
+        return cache_factores[item]
+    
+    matriz_factores = np.zeros((len(materiales_unicos), len(TRATAMIENTOS_FIN_VIDA)))
+    for fila, material in enumerate(materiales_unicos):
+        items = items_tratamiento_material(factores_df, material)
+        for columna, tratamiento in enumerate(TRATAMIENTOS_FIN_VIDA):
+            matriz_factores[fila, columna] = factor_item(items[tratamiento])
+    
+    return list(materiales_unicos), matriz_factores, indices
+
+def construir_matriz_porcentajes(distribuciones):
+    """
+    Convierte una lista de distribuciones {'porcentaje_<tratamiento>': %} en una
+    matriz (empaques × tratamientos) de fracciones.
+    """
+    matriz = np.zeros((len(distribuciones), len(TRATAMIENTOS_FIN_VIDA)))
+    for fila, distribucion in enumerate(distribuciones):
+        if not distribucion:
+            continue
+        for columna, tratamiento in enumerate(TRATAMIENTOS_FIN_VIDA):
+            matriz[fila, columna] = float(distribucion.get(f'porcentaje_{tratamiento}', 0) or 0)
+    return matriz / 100.0
+
+def calcular_emisiones_fin_vida_matricial(masas_kg, matriz_porcentajes, materiales, factores_df):
+    """
+    Calcula las emisiones de fin de vida de N empaques en una sola operación:
+    masa × (porcentajes ⊙ factores del material), sumado por tratamiento.
+    
+    Args:
+        masas_kg: vector (N,) de masas
+        matriz_porcentajes: matriz (N × tratamientos) de fracciones (0-1)
+        materiales: lista (N,) de materiales de empaque
+    
+    Returns:
+        Vector (N,) de emisiones en kg CO₂e
+    """
+    masas_kg = np.asarray(masas_kg, dtype=float)
+    matriz_porcentajes = np.asarray(matriz_porcentajes, dtype=float)
+    if masas_kg.size == 0:
+        return np.zeros(0)
+    _, matriz_factores, indices = construir_matriz_fin_vida(factores_df, materiales)
+    return emisiones_fin_vida(masas_kg, matriz_porcentajes, matriz_factores, indices)
+
+def calcular_emisiones_residuos(masa_kg, factores_df, distribucion_fin_vida=None, material=None):
     """
     Calcula emisiones por gestión de residuos - CORREGIDA
     """
     try:
         if distribucion_fin_vida:
-            # Cálculo para fin de vida con distribución porcentual
-            total_emisiones = 0.0
-            
-            # Vertedero
-            factor_vertedero, unidad_vertedero = obtener_factor(factores_df, 'residuo', 'Vertedero')
-            emisiones_vertedero = (masa_kg * distribucion_fin_vida.get('porcentaje_vertedero', 0) / 100 * factor_vertedero)
-            
-            # Incineración
-            factor_incineracion, unidad_incineracion = obtener_factor(factores_df, 'residuo', 'Incineración')
-            emisiones_incineracion = (masa_kg * distribucion_fin_vida.get('porcentaje_incineracion', 0) / 100 * factor_incineracion)
-            
-            # Compostaje
-            factor_compostaje, unidad_compostaje = obtener_factor(factores_df, 'residuo', 'Compostaje')
-            emisiones_compostaje = (masa_kg * distribucion_fin_vida.get('porcentaje_compostaje', 0) / 100 * factor_compostaje)
-            
-            # Reciclaje
-            factor_reciclaje, unidad_reciclaje = obtener_factor(factores_df, 'residuo', 'Reciclaje')
-            emisiones_reciclaje = (masa_kg * distribucion_fin_vida.get('porcentaje_reciclaje', 0) / 100 * factor_reciclaje)
-            
-            total_emisiones = (emisiones_vertedero + emisiones_incineracion + 
-                              emisiones_compostaje + emisiones_reciclaje)
-            
-            return total_emisiones
+            # Cálculo para fin de vida con distribución porcentual y factores del material
+            emisiones = calcular_emisiones_fin_vida_matricial(
+                [masa_kg],
+                construir_matriz_porcentajes([distribucion_fin_vida]),
+                [material],
+                factores_df
+            )
+            return float(emisiones[0])
         else:
             # Cálculo simple para residuos de producción
             factor, unidad = obtener_factor(factores_df, 'residuo')
@@ -296,14 +427,16 @@ def calcular_emisiones_produccion(produccion_data, factores_df):
     try:
         # 1. Emisiones por energía
         if produccion_data.get('energia_kwh', 0) > 0:
-            factor_energia, unidad_energia = obtener_factor(factores_df, 'energia', produccion_data.get('tipo_energia', 'Red eléctrica promedio'))
-            emisiones_energia = produccion_data['energia_kwh'] * factor_energia
+            factor_energia, unidad_energia = obtener_factor(factores_df, 'energia', produccion_data.get('tipo_energia', 'Red eléctrica promedio'),
+                                                            region=produccion_data.get('region'))
+            # Corrección por perfiles horarios de red y de carga (1.0 sin perfiles)
+            emisiones_energia = produccion_data['energia_kwh'] * factor_energia * ajuste_horario(produccion_data)
             total_emisiones += emisiones_energia
             desglose['Energía Producción'] = emisiones_energia
         
         # 2. Emisiones por agua
         if produccion_data.get('agua_m3', 0) > 0:
-            factor_agua, unidad_agua = obtener_factor(factores_df, 'agua')
+            factor_agua, unidad_agua = obtener_factor(factores_df, 'agua', region=produccion_data.get('region'))
             emisiones_agua = produccion_data['agua_m3'] * factor_agua
             total_emisiones += emisiones_agua
             desglose['Agua Producción'] = emisiones_agua
@@ -399,7 +532,8 @@ def calcular_emisiones_retail(retail_data, factores_df):
             except (ValueError, TypeError, IndexError):
                 factor_energia = 0.2021
                 
-            emisiones = consumo_kwh * factor_energia
+            ajuste = ajuste_horario(retail_data)
+            emisiones = consumo_kwh * factor_energia * ajuste
             emisiones_totales += emisiones
             desglose['Energía Retail'] = emisiones
             
@@ -407,7 +541,8 @@ def calcular_emisiones_retail(retail_data, factores_df):
                 'días_almacenamiento': retail_data.get('dias_almacenamiento', 0),
                 'tipo_almacenamiento': retail_data.get('tipo_almacenamiento', ''),
                 'consumo_kwh': consumo_kwh,
-                'factor_energia': factor_energia
+                'factor_energia': factor_energia,
+                'ajuste_horario': ajuste
             }
         
         return emisiones_totales, desglose
@@ -470,8 +605,10 @@ def calcular_emisiones_detalladas_completas(session_state, factores_df):
     """
     Calcula TODAS las emisiones del ciclo de vida con desglose detallado por fuente
     VERSIÓN MEJORADA PARA INCLUIR TODAS LAS ETAPAS
+    Con producto['anio'] se usan los factores vigentes en ese año de producción
     """
     try:
+        factores_df = factores_del_anio(factores_df, (session_state.get('producto') or {}).get('anio'))
         emisiones_totales = 0.0
         desglose_detallado = {
             'materias_primas': {'total': 0.0, 'fuentes': {}},
@@ -591,6 +728,21 @@ def calcular_emisiones_detalladas_completas(session_state, factores_df):
             desglose_detallado['fin_vida']['total'] = emisiones_fin_vida
             desglose_detallado['fin_vida']['fuentes'] = desglose_fin_vida
         
+        # 8. COPRODUCTOS - asignación de las etapas compartidas o crédito por sustitución
+        coproductos = leer_coproductos(session_state)
+        if coproductos is not None:
+            if coproductos['metodo'] == 'sustitucion':
+                credito = sum(masa * obtener_factor(factores_df, categoria, item)[0]
+                              for masa, (categoria, item) in zip(coproductos['masas'][1:], coproductos['sustituidos']))
+                desglose_detallado['procesamiento']['total'] -= credito
+                desglose_detallado['procesamiento']['fuentes'][FUENTE_CREDITO] = -credito
+            else:
+                fraccion = fracciones_asignacion(coproductos['masas'], coproductos['precios'], coproductos['metodo'])[0]
+                for etapa in coproductos['etapas']:
+                    if etapa in desglose_detallado:
+                        desglose_detallado[etapa] = escalar_etapa(desglose_detallado[etapa], fraccion)
+            emisiones_totales = sum(etapa['total'] for etapa in desglose_detallado.values())
+        
         # Validar que todas las etapas se calcularon
         etapas_calculando = [
             ('materias_primas', 'Materias Primas'),
@@ -616,12 +768,33 @@ def calcular_emisiones_totales_completas(session_state, factores_df):
     """Función de compatibilidad - alias para calcular_emisiones_detalladas_completas"""
     return calcular_emisiones_detalladas_completas(session_state, factores_df)
 
-def calcular_balance_masa(materias_primas, empaques):
-    """Función de compatibilidad"""
+def calcular_balance_masa(materias_primas, empaques, producto=None, produccion=None,
+                          tolerancia_pct=TOLERANCIA_CIERRE_PCT):
+    """
+    Balance de masa de un producto (entradas, salidas y error de cierre)
+    Para portafolios completos usar calcular_balance_masa_lote
+    """
+    balance = calcular_balance_masa_lote([{
+        'producto': producto or {},
+        'materias_primas': materias_primas or [],
+        'empaques': empaques or [],
+        'produccion': produccion or {}
+    }], tolerancia_pct=tolerancia_pct).iloc[0]
+    
+    entradas = {f: float(balance[f"entrada_{f}"]) for f in FLUJOS_ENTRADA}
+    entradas['total_entradas_kg'] = float(balance['total_entradas_kg'])
+    salidas = {f: float(balance[f"salida_{f}"]) for f in FLUJOS_SALIDA}
+    salidas['total_salidas_kg'] = float(balance['total_salidas_kg'])
+    
     return {
-        'entradas': {'total_entradas_kg': 0.0},
-        'salidas': {'total_salidas_kg': 0.0},
-        'coherencia': 0.0
+        'entradas': entradas,
+        'salidas': salidas,
+        'error_cierre_kg': float(balance['error_cierre_kg']),
+        'error_cierre_pct': float(balance['error_cierre_pct']),
+        'cierra': bool(balance['cierra']),
+        # Porcentaje de las entradas explicado por las salidas
+        'coherencia': (salidas['total_salidas_kg'] / entradas['total_entradas_kg'] * 100
+                       if entradas['total_entradas_kg'] > 0 else 0.0)
     }
 
 # AÑADIR ESTA FUNCIÓN FALTANTE al archivo calculos.py
@@ -653,22 +826,25 @@ def calcular_emisiones_uso_fin_vida(uso_fin_vida_data, factores_df):
             emisiones_totales += emisiones_agua
             desglose['uso']['agua'] = emisiones_agua
         
-        # 2. Emisiones por gestión de fin de vida
-        for gestion in uso_fin_vida_data.get('gestion_empaques', []):
-            if gestion and gestion.get('peso_kg', 0) > 0:
-                emisiones_empaque = calcular_emisiones_residuos(
-                    gestion['peso_kg'],
-                    factores_df,
-                    gestion.get('porcentajes', {})
-                )
-                
-                emisiones_totales += emisiones_empaque
-                nombre_empaque = gestion.get('nombre_empaque', f'Empaque_{len(desglose["fin_vida"])}')
-                desglose['fin_vida'][nombre_empaque] = {
-                    'peso_kg': gestion['peso_kg'],
-                    'emisiones': emisiones_empaque,
-                    'porcentajes': gestion.get('porcentajes', {})
-                }
+        # 2. Emisiones por gestión de fin de vida (todos los empaques en una sola operación matricial)
+        gestiones = [g for g in uso_fin_vida_data.get('gestion_empaques', [])
+                     if g and g.get('peso_kg', 0) > 0]
+        emisiones_gestiones = calcular_emisiones_fin_vida_matricial(
+            [g['peso_kg'] for g in gestiones],
+            construir_matriz_porcentajes([g.get('porcentajes', {}) for g in gestiones]),
+            [g.get('material', '') for g in gestiones],
+            factores_df
+        )
+        
+        for gestion, emisiones_empaque in zip(gestiones, emisiones_gestiones):
+            emisiones_empaque = float(emisiones_empaque)
+            emisiones_totales += emisiones_empaque
+            nombre_empaque = gestion.get('nombre_empaque', f'Empaque_{len(desglose["fin_vida"])}')
+            desglose['fin_vida'][nombre_empaque] = {
+                'peso_kg': gestion['peso_kg'],
+                'emisiones': emisiones_empaque,
+                'porcentajes': gestion.get('porcentajes', {})
+            }
         
         return emisiones_totales, desglose
         
@@ -0,0 +1,99 @@
+"""
+Asignación de cargas entre coproductos (p. ej. suero de la elaboración de queso)
+Las etapas compartidas del proceso se reparten por masa o por valor económico, o
+bien el producto principal carga con todo y recibe un crédito por los productos
+que sus coproductos sustituyen (expansión del sistema)
+MATRIZ DE ASIGNACIÓN COPRODUCTOS × ETAPAS
+"""
+
+import numpy as np
+
+METODOS_ASIGNACION = {
+    'masa': 'Asignación por masa',
+    'economica': 'Asignación económica',
+    'sustitucion': 'Expansión del sistema (sustitución)'
+}
+
+# Etapas del proceso común a todos los coproductos (el empaque, la distribución,
+# el retail y el fin de vida son solo del producto principal)
+ETAPAS_COMPARTIDAS = ['materias_primas', 'transporte', 'procesamiento']
+
+FUENTE_CREDITO = 'Crédito coproductos'
+
+def leer_coproductos(datos):
+    """
+    Configuración de coproductos de un producto (datos['coproductos']) o None.
+    El producto principal es la fila 0, con su peso neto y su 'precio_kg'.
+
+    Returns:
+        {'metodo', 'etapas', 'nombres', 'masas', 'precios', 'sustituidos'}
+    """
+    configuracion = datos.get('coproductos') or {}
+    lista = [c for c in configuracion.get('lista') or [] if c and float(c.get('masa_kg', 0) or 0) > 0]
+    if not lista:
+        return None
+    metodo = configuracion.get('metodo', 'masa')
+    if metodo not in METODOS_ASIGNACION:
+        raise ValueError(f"Método de asignación desconocido: {metodo}")
+
+    producto = datos.get('producto') or {}
+    return {
+        'metodo': metodo,
+        'etapas': list(configuracion.get('etapas') or ETAPAS_COMPARTIDAS),
+        'nombres': [producto.get('nombre') or 'Producto principal'] + [c.get('nombre', f'Coproducto {i+1}')
+                                                                       for i, c in enumerate(lista)],
+        'masas': np.array([float(producto.get('peso_neto_kg', 0) or 0)]
+                          + [float(c['masa_kg']) for c in lista]),
+        'precios': np.array([float(producto.get('precio_kg', 0) or 0)]
+                            + [float(c.get('precio_kg', 0) or 0) for c in lista]),
+        'sustituidos': [(c.get('categoria_sustituida') or 'materia_prima', c.get('item_sustituido') or c.get('nombre', ''))
+                        for c in lista]
+    }
+
+def fracciones_asignacion(masas, precios, metodo):
+    """Fracción de las etapas compartidas de cada coproducto (suma 1; sustitución: todo al principal)"""
+    masas = np.asarray(masas, dtype=float)
+    if metodo == 'sustitucion':
+        pesos = np.zeros_like(masas)
+        pesos[0] = 1.0
+    else:
+        pesos = masas * np.asarray(precios, dtype=float) if metodo == 'economica' else masas.copy()
+    total = pesos.sum()
+    if total <= 0:
+        pesos = np.zeros_like(masas)
+        pesos[0], total = 1.0, 1.0
+    return pesos / total
+
+def matriz_asignacion(configuracion, etapas):
+    """
+    Matriz (coproductos × etapas): fracción de cada etapa que carga cada
+    coproducto. Las etapas no compartidas son solo del producto principal.
+    """
+    fracciones = fracciones_asignacion(configuracion['masas'], configuracion['precios'], configuracion['metodo'])
+    matriz = np.zeros((len(fracciones), len(etapas)))
+    matriz[0, :] = 1.0
+    compartidas = [j for j, etapa in enumerate(etapas) if etapa in configuracion['etapas']]
+    matriz[:, compartidas] = fracciones[:, None]
+    return matriz
+
+def repartir_totales(totales, matriz):
+    """Totales (etapas × categorías) repartidos en (coproductos × etapas × categorías) en una operación"""
+    return np.einsum('pe,ek->pek', matriz, totales)
+
+def _escalar_emisiones(valor, fraccion):
+    """Escala las emisiones ('total', 'emisiones*', 'total_emisiones') de un desglose anidado"""
+    if isinstance(valor, dict):
+        return {clave: (v * fraccion if isinstance(v, (int, float)) and not isinstance(v, bool)
+                        and (clave == 'total' or str(clave).startswith(('emisiones', 'total_emisiones')))
+                        else _escalar_emisiones(v, fraccion))
+                for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [_escalar_emisiones(v, fraccion) for v in valor]
+    return valor
+
+def escalar_etapa(etapa, fraccion):
+    """Etapa de desglose_detallado con su total y sus fuentes escalados por la fracción asignada"""
+    fuentes = {clave: v * fraccion if isinstance(v, (int, float)) and not isinstance(v, bool)
+               else _escalar_emisiones(v, fraccion)
+               for clave, v in (etapa.get('fuentes') or {}).items()}
+    return {**etapa, 'total': etapa.get('total', 0.0) * fraccion, 'fuentes': fuentes}
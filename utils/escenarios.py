@@ -0,0 +1,149 @@
+"""
+Barrido de escenarios "¿qué pasaría si?" sobre el modelo lineal compilado
+Rejilla de parámetros (sustitución de factores, multiplicadores de cantidad,
+valores de factor) evaluada por bloques como operaciones sobre arrays
+MILES DE COMBINACIONES EN UNA SOLA LLAMADA
+"""
+
+import numpy as np
+import pandas as pd
+from utils.motor import ETAPAS, resolver_indice
+
+# Límite de combinaciones de una rejilla (producto del número de opciones)
+MAX_ESCENARIOS = 200_000
+
+def _mascara_partidas(partidas, filtro):
+    """Partidas que cumplen todas las condiciones {columna: valor o lista de valores}"""
+    mascara = np.ones(len(partidas), dtype=bool)
+    for columna, valor in (filtro or {}).items():
+        valores = list(valor) if isinstance(valor, (list, tuple, set)) else [valor]
+        mascara &= partidas[columna].isin(valores).to_numpy()
+    return mascara
+
+def _claves_factor(partidas):
+    """(categoría, región, año) de cada partida; sin columna de región o año se usa Global o sin año"""
+    n = len(partidas)
+    regiones = partidas['region'].fillna('').tolist() if 'region' in partidas.columns else [''] * n
+    anios = partidas['anio'].fillna(0).astype(int).tolist() if 'anio' in partidas.columns else [0] * n
+    return list(zip(partidas['categoria'].tolist(), regiones, anios))
+
+def preparar_parametro(modelo, matriz_factores, definicion):
+    """
+    Convierte la definición de un parámetro en arrays por opción.
+
+    Tipos de parámetro:
+        - 'sustitucion': {'filtro', 'opciones': [ítems]} reemplaza el factor de las
+          partidas filtradas por el del ítem (misma categoría de factor)
+        - 'multiplicador': {'filtro', 'valores': [float]} escala sus cantidades
+        - 'factor': {'filtro', 'valores': [float], 'categoria'} fija el valor del
+          factor de las partidas filtradas para una categoría de impacto
+
+    Returns:
+        Diccionario con 'etiquetas', 'mascara' y 'multiplicadores' (opciones ×
+        partidas) o 'factores' (opciones × partidas × categorías)
+    """
+    partidas = modelo['partidas']
+    mascara = _mascara_partidas(partidas, definicion.get('filtro'))
+    tipo = definicion['tipo']
+    factores_base = modelo['factores'][modelo['posiciones']]
+    parametro = {'mascara': mascara, 'multiplicadores': None, 'factores': None}
+
+    if tipo == 'multiplicador':
+        valores = np.asarray(definicion['valores'], dtype=float)
+        multiplicadores = np.ones((len(valores), len(partidas)))
+        multiplicadores[:, mascara] = valores[:, None]
+        parametro['multiplicadores'] = multiplicadores
+        parametro['etiquetas'] = [f"×{v:g}" for v in valores]
+
+    elif tipo == 'sustitucion':
+        opciones = list(definicion['opciones'])
+        factores = np.repeat(factores_base[None, :, :], len(opciones), axis=0)
+        # Cada partida toma el factor del ítem en su región y año, como en el cálculo base
+        claves = {}
+        grupos = np.array([claves.setdefault(c, len(claves)) for c in _claves_factor(partidas)], dtype=np.int64)
+        claves = list(claves)
+        for o, item in enumerate(opciones):
+            for g in np.unique(grupos[mascara]):
+                filas = mascara & (grupos == g)
+                categoria, region, anio = claves[g]
+                factores[o, filas, :] = matriz_factores['matriz'][
+                    resolver_indice(matriz_factores, categoria, item, region=region, anio=anio)]
+        parametro['factores'] = factores
+        parametro['etiquetas'] = opciones
+
+    elif tipo == 'factor':
+        valores = np.asarray(definicion['valores'], dtype=float)
+        j = modelo['categorias'].index(definicion.get('categoria', 'gwp'))
+        factores = np.repeat(factores_base[None, :, :], len(valores), axis=0)
+        factores[:, mascara, j] = valores[:, None]
+        parametro['factores'] = factores
+        parametro['etiquetas'] = [f"{v:g}" for v in valores]
+
+    else:
+        raise ValueError(f"Tipo de parámetro no soportado: {tipo}")
+
+    return parametro
+
+def evaluar_escenarios(modelo, matriz_factores, parametros, categoria='gwp',
+                       tamano_bloque=4096, max_escenarios=MAX_ESCENARIOS):
+    """
+    Evalúa todas las combinaciones de la rejilla de parámetros.
+
+    Args:
+        modelo: modelo compilado (ver modelo_lineal.compilar_modelo)
+        matriz_factores: matriz completa de factores (para resolver sustituciones)
+        parametros: {nombre: definición} (ver preparar_parametro)
+        categoria: categoría de impacto usada para etapas, diferencia y ranking
+
+    Returns:
+        DataFrame con un escenario por fila: opción de cada parámetro, total por
+        categoría ('total_<categoria>'), total por etapa de `categoria` ('etapa_<etapa>'),
+        'diferencia_pct' respecto al producto actual y 'ranking'
+    """
+    preparados = {nombre: preparar_parametro(modelo, matriz_factores, definicion)
+                  for nombre, definicion in parametros.items()}
+    forma = [len(p['etiquetas']) for p in preparados.values()]
+    n_escenarios = int(np.prod(forma)) if forma else 1
+    if n_escenarios > max_escenarios:
+        raise ValueError(f"La rejilla genera {n_escenarios} escenarios (máximo {max_escenarios})")
+
+    cantidades = modelo['cantidades']
+    factores_base = modelo['factores'][modelo['posiciones']]
+    por_etapa = np.zeros((len(cantidades), len(ETAPAS)))
+    por_etapa[np.arange(len(cantidades)), modelo['etapas']] = 1.0
+    j = modelo['categorias'].index(categoria)
+
+    totales = np.zeros((n_escenarios, len(modelo['categorias'])))
+    etapas = np.zeros((n_escenarios, len(ETAPAS)))
+    for inicio in range(0, n_escenarios, tamano_bloque):
+        ids = np.arange(inicio, min(inicio + tamano_bloque, n_escenarios))
+        opciones = np.unravel_index(ids, forma) if forma else ()
+
+        q = np.repeat(cantidades[None, :], len(ids), axis=0)
+        f = np.repeat(factores_base[None, :, :], len(ids), axis=0)
+        for parametro, opcion in zip(preparados.values(), opciones):
+            if parametro['multiplicadores'] is not None:
+                q *= parametro['multiplicadores'][opcion]
+            if parametro['factores'] is not None:
+                mascara = parametro['mascara']
+                f[:, mascara, :] = parametro['factores'][opcion][:, mascara, :]
+
+        contribucion = q[:, :, None] * f
+        totales[ids] = contribucion.sum(axis=1)
+        etapas[ids] = contribucion[:, :, j] @ por_etapa
+
+    resultado = pd.DataFrame({
+        nombre: np.asarray(p['etiquetas'], dtype=object)[opcion]
+        for (nombre, p), opcion in zip(preparados.items(),
+                                       np.unravel_index(np.arange(n_escenarios), forma) if forma else ())
+    }, index=pd.RangeIndex(n_escenarios, name='escenario'))
+    for k, clave in enumerate(modelo['categorias']):
+        resultado[f'total_{clave}'] = totales[:, k]
+    for e, etapa in enumerate(ETAPAS):
+        resultado[f'etapa_{etapa}'] = etapas[:, e]
+
+    total_actual = float((cantidades * factores_base[:, j]).sum())
+    resultado['diferencia_pct'] = ((totales[:, j] - total_actual) / total_actual * 100
+                                   if total_actual != 0 else 0.0)
+    resultado['ranking'] = resultado[f'total_{categoria}'].rank(method='first').astype(int)
+    return resultado.sort_values('ranking')
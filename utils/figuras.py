@@ -0,0 +1,77 @@
+"""
+Caché en memoria de figuras Plotly por resultado
+La clave es (clave del resultado, tipo de gráfico, opciones); la app la comparte
+entre sesiones, así que varias personas viendo el mismo producto reutilizan las
+mismas figuras. Se expulsan las menos usadas recientemente al superar el máximo
+MISMO RESULTADO, MISMAS OPCIONES: LA FIGURA NO SE VUELVE A CONSTRUIR
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+MAXIMO_FIGURAS_DEFECTO = 256
+
+def crear_cache_figuras(maximo_figuras=MAXIMO_FIGURAS_DEFECTO):
+    """
+    Caché vacía. Se puede compartir entre hilos.
+
+    Returns:
+        Diccionario con las figuras (de la menos a la más usada recientemente),
+        el máximo de figuras y los contadores de aciertos y fallos
+    """
+    return {
+        'figuras': OrderedDict(),
+        'bloqueo': threading.Lock(),
+        'maximo_figuras': maximo_figuras,
+        'aciertos': 0,
+        'fallos': 0
+    }
+
+def clave_figura(clave_resultado, tipo, opciones):
+    """Clave de una figura: resultado, tipo de gráfico y opciones como JSON canónico"""
+    return clave_resultado, tipo, json.dumps(opciones, sort_keys=True, ensure_ascii=False, default=str)
+
+def obtener_figura(cache, clave_resultado, tipo, construir, **opciones):
+    """
+    Figura guardada para (clave_resultado, tipo, opciones) o, si no está, la que
+    devuelve construir() (que se guarda). Sin clave_resultado (resultados sin
+    clave) se construye sin guardarla.
+
+    Las opciones deben recoger todo lo que cambia la figura además del
+    resultado (categoría, unidad funcional, etapa...). Las figuras guardadas se
+    comparten: no se deben modificar después de obtenerlas.
+    """
+    if clave_resultado is None:
+        return construir()
+    clave = clave_figura(clave_resultado, tipo, opciones)
+    with cache['bloqueo']:
+        figura = cache['figuras'].get(clave)
+        if figura is not None:
+            cache['figuras'].move_to_end(clave)
+            cache['aciertos'] += 1
+            return figura
+        cache['fallos'] += 1
+    figura = construir()
+    with cache['bloqueo']:
+        cache['figuras'][clave] = figura
+        cache['figuras'].move_to_end(clave)
+        while len(cache['figuras']) > cache['maximo_figuras']:
+            cache['figuras'].popitem(last=False)
+    return figura
+
+def estadisticas_figuras(cache):
+    """Aciertos, fallos, tasa de aciertos y figuras guardadas"""
+    with cache['bloqueo']:
+        consultas = cache['aciertos'] + cache['fallos']
+        return {
+            'aciertos': cache['aciertos'],
+            'fallos': cache['fallos'],
+            'tasa_aciertos': cache['aciertos'] / consultas if consultas else 0.0,
+            'figuras': len(cache['figuras']),
+            'maximo_figuras': cache['maximo_figuras']
+        }
+
+def vaciar_cache_figuras(cache):
+    with cache['bloqueo']:
+        cache['figuras'].clear()
@@ -0,0 +1,171 @@
+"""
+Incertidumbre de las entradas del modelo lineal
+Cada cantidad y cada factor se describe con una distribución lognormal centrada
+en su valor actual (mediana) y caracterizada por su desviación estándar geométrica.
+Propagación analítica de la varianza como alternativa instantánea al muestreo
+GSD POR CATEGORÍA, POR FACTOR O POR MATRIZ PEDIGRÍ
+"""
+
+import re
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from utils.motor import ETAPAS
+
+# Desviación estándar geométrica (GSD, σg) por categoría de factor.
+# Valores de incertidumbre básica del orden de los usados en bases de datos ACV.
+GSD_FACTORES_POR_CATEGORIA = {
+    'materia_prima': 1.3,
+    'material_empaque': 1.2,
+    'transporte': 1.2,
+    'energia': 1.1,
+    'agua': 1.1,
+    'residuo': 1.5
+}
+GSD_FACTOR_DEFECTO = 1.5
+
+# Cantidades de inventario medidas o declaradas por el usuario
+GSD_CANTIDADES_DEFECTO = 1.05
+
+# Matriz pedigrí (ecoinvent v3): varianza adicional del logaritmo por puntuación 1-5 en
+# fiabilidad, completitud, correlación temporal, geográfica y tecnológica
+VARIANZAS_PEDIGRI = np.array([
+    [0.0, 0.0006, 0.002, 0.008, 0.04],
+    [0.0, 0.0001, 0.0006, 0.002, 0.008],
+    [0.0, 0.0002, 0.002, 0.008, 0.04],
+    [0.0, 0.000025, 0.0001, 0.0006, 0.002],
+    [0.0, 0.0006, 0.008, 0.04, 0.12]
+])
+
+# Columnas opcionales de factors.csv
+COLUMNA_GSD = 'gsd'
+COLUMNA_PEDIGRI = 'pedigree'
+
+def gsd_pedigri(puntuaciones, gsd_basica=1.0):
+    """
+    GSD a partir de las cinco puntuaciones pedigrí (1 = mejor, 5 = peor) y de la
+    incertidumbre básica: ln²(GSD) = ln²(GSD básica) + Σ varianzas pedigrí.
+    """
+    puntuaciones = np.clip(np.asarray(puntuaciones, dtype=int), 1, 5)
+    varianza = np.log(gsd_basica) ** 2 + VARIANZAS_PEDIGRI[np.arange(5), puntuaciones - 1].sum()
+    return float(np.exp(np.sqrt(varianza)))
+
+def _leer_pedigri(valor):
+    """Puntuaciones de un texto tipo '(1,2,1,3,2)'; None si no son cinco"""
+    digitos = re.findall(r'[1-5]', str(valor)) if pd.notna(valor) else []
+    return [int(d) for d in digitos] if len(digitos) == 5 else None
+
+def gsd_modelo(modelo, gsd_cantidades=GSD_CANTIDADES_DEFECTO, gsd_factores=None, factores_df=None):
+    """
+    GSD de cada partida y de cada factor usado por el modelo.
+
+    Por factor se usa, en este orden: la columna 'gsd' de la tabla de factores,
+    la incertidumbre básica de su categoría ajustada por la columna 'pedigree', o
+    la GSD por defecto de su categoría.
+
+    Args:
+        gsd_cantidades: escalar o array por partida
+        gsd_factores: {categoria de factor: GSD} que reemplaza a los valores por defecto
+        factores_df: tabla de factores con las columnas opcionales 'gsd' / 'pedigree'
+
+    Returns:
+        (array de GSD por partida, array de GSD por factor usado)
+    """
+    por_categoria = {**GSD_FACTORES_POR_CATEGORIA, **(gsd_factores or {})}
+    categorias_factor = [etiqueta.split('/', 1)[0] for etiqueta in modelo['etiquetas_factor']]
+    gsd_f = np.array([por_categoria.get(c, GSD_FACTOR_DEFECTO) for c in categorias_factor], dtype=float)
+
+    if factores_df is not None:
+        # Solo las filas reales de la tabla; las filas por defecto quedan con la GSD de su categoría
+        for posicion, fila in enumerate(modelo['ids_factor']):
+            if fila >= len(factores_df):
+                continue
+            if COLUMNA_PEDIGRI in factores_df.columns:
+                puntuaciones = _leer_pedigri(factores_df[COLUMNA_PEDIGRI].iloc[fila])
+                if puntuaciones is not None:
+                    gsd_f[posicion] = gsd_pedigri(puntuaciones, gsd_f[posicion])
+            if COLUMNA_GSD in factores_df.columns:
+                gsd = pd.to_numeric(factores_df[COLUMNA_GSD].iloc[fila], errors='coerce')
+                if pd.notna(gsd) and gsd >= 1:
+                    gsd_f[posicion] = float(gsd)
+
+    gsd_q = np.broadcast_to(np.asarray(gsd_cantidades, dtype=float), (len(modelo['cantidades']),)).copy()
+    return gsd_q, gsd_f
+
+def _momentos_lognormal(gsd):
+    """E[m] y E[m²] de un multiplicador lognormal de mediana 1"""
+    varianza_log = np.log(gsd) ** 2
+    return np.exp(varianza_log / 2), np.exp(2 * varianza_log)
+
+def _intervalo(media, desviacion, nivel):
+    """
+    Intervalo aproximado: lognormal ajustada por momentos si la media es positiva,
+    normal en otro caso (etapas con créditos netos).
+    """
+    z = NormalDist().inv_cdf(0.5 + nivel / 2)
+    media = np.asarray(media, dtype=float)
+    desviacion = np.asarray(desviacion, dtype=float)
+    positiva = media > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma_log = np.sqrt(np.log1p((desviacion / np.where(positiva, media, 1.0)) ** 2))
+        mu_log = np.log(np.where(positiva, media, 1.0)) - sigma_log ** 2 / 2
+    inferior = np.where(positiva, np.exp(mu_log - z * sigma_log), media - z * desviacion)
+    superior = np.where(positiva, np.exp(mu_log + z * sigma_log), media + z * desviacion)
+    return inferior, superior
+
+def propagar_incertidumbre(modelo, gsd_cantidades=None, gsd_factores=None, categoria='gwp', nivel=0.95,
+                           factores_df=None):
+    """
+    Media, desviación estándar e intervalo por etapa sin muestrear.
+
+    La huella es Σ_p F_p · S_p, con F_p el factor p y S_p la suma de las cantidades
+    que lo usan; con multiplicadores lognormales independientes los momentos son
+    exactos: Var(F·S) = E[F²]·E[S²] − E[F]²·E[S]². Las partidas que comparten
+    factor quedan correlacionadas, igual que en el Monte Carlo.
+
+    Args:
+        gsd_cantidades, gsd_factores: arrays de GSD por partida y por factor usado
+            (por defecto, gsd_modelo)
+        nivel: probabilidad cubierta por el intervalo
+        factores_df: tabla de factores con GSD / pedigrí por fila (opcional)
+
+    Returns:
+        DataFrame indexado por ETAPAS + ['total'] con 'valor' (determinista),
+        'media', 'desviacion', 'inferior' y 'superior'
+    """
+    gsd_q_defecto, gsd_f_defecto = gsd_modelo(modelo, factores_df=factores_df)
+    gsd_q = gsd_q_defecto if gsd_cantidades is None else np.asarray(gsd_cantidades, dtype=float)
+    gsd_f = gsd_f_defecto if gsd_factores is None else np.asarray(gsd_factores, dtype=float)
+    j = modelo['categorias'].index(categoria)
+    f = modelo['factores'][:, j]
+    cantidades = modelo['cantidades']
+
+    # Momentos de las sumas de cantidades por (etapa, factor)
+    e_mq, e_mq2 = _momentos_lognormal(gsd_q)
+    e_mf, e_mf2 = _momentos_lognormal(gsd_f)
+    n_factores = len(f)
+    indice = (modelo['etapas'], modelo['posiciones'])
+    suma = np.zeros((len(ETAPAS), n_factores))
+    varianza_suma = np.zeros((len(ETAPAS), n_factores))
+    np.add.at(suma, indice, cantidades * e_mq)
+    np.add.at(varianza_suma, indice, cantidades ** 2 * (e_mq2 - e_mq ** 2))
+
+    def _momentos(suma, varianza_suma):
+        media = (f * e_mf * suma).sum(axis=-1)
+        varianza = (f ** 2 * (e_mf2 * (varianza_suma + suma ** 2) - e_mf ** 2 * suma ** 2)).sum(axis=-1)
+        return media, np.sqrt(np.maximum(varianza, 0.0))
+
+    media_etapa, desviacion_etapa = _momentos(suma, varianza_suma)
+    media_total, desviacion_total = _momentos(suma.sum(axis=0), varianza_suma.sum(axis=0))
+
+    media = np.append(media_etapa, media_total)
+    desviacion = np.append(desviacion_etapa, desviacion_total)
+    inferior, superior = _intervalo(media, desviacion, nivel)
+    deterministico = modelo['coeficientes_etapa'] @ f
+    return pd.DataFrame({
+        'valor': np.append(deterministico, deterministico.sum()),
+        'media': media,
+        'desviacion': desviacion,
+        'inferior': inferior,
+        'superior': superior
+    }, index=pd.Index(ETAPAS + ['total'], name='etapa'))
@@ -0,0 +1,249 @@
+"""
+Índice inverso persistente: fila de factores -> productos y partidas que la usan
+Ante un cambio en factors.csv solo se recalculan los productos afectados y sus
+resultados guardados se actualizan en el mismo índice (SQLite)
+RECÁLCULO DIRIGIDO TRAS ACTUALIZAR FACTORES
+USO: python -m utils.indice_inverso registrar producto.json ...
+     python -m utils.indice_inverso actualizar factores_anteriores.csv data/factors.csv
+     (en lugar de un archivo se puede indicar una versión del historial de factores)
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+import pandas as pd
+from utils.cache_resultados import calcular_con_cache, datos_canonicos
+from utils.calculos import calcular_emisiones_detalladas_completas
+from utils.motor import (
+    claves_filas_factores,
+    construir_partidas,
+    diferencia_factores,
+    preparar_matriz_factores,
+    resolver_indice,
+    resolver_indices,
+    version_factores
+)
+from utils.versiones_factores import abrir_historial, cargar_factores_versionados, cargar_version
+
+RUTA_INDICE_DEFECTO = os.path.join(os.path.dirname(__file__), '..', 'data', 'indice_factores.sqlite')
+RUTA_FACTORES_DEFECTO = os.path.join(os.path.dirname(__file__), '..', 'data', 'factors.csv')
+
+def abrir_indice(ruta=RUTA_INDICE_DEFECTO):
+    """Abre (o crea) el índice inverso con los productos registrados y sus resultados"""
+    if ruta != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conexion = sqlite3.connect(ruta, check_same_thread=False)
+    conexion.executescript("""
+        CREATE TABLE IF NOT EXISTS productos (
+            producto TEXT PRIMARY KEY,
+            datos TEXT NOT NULL,
+            version_factores TEXT NOT NULL,
+            emisiones_totales REAL NOT NULL,
+            resultado BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS usos (
+            fila TEXT NOT NULL,
+            producto TEXT NOT NULL,
+            partida INTEGER NOT NULL,
+            etapa TEXT NOT NULL,
+            fuente TEXT NOT NULL,
+            subfuente TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            item TEXT NOT NULL,
+            exacto INTEGER NOT NULL,
+            region TEXT NOT NULL DEFAULT '',
+            anio INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_usos_fila ON usos (fila);
+        CREATE INDEX IF NOT EXISTS idx_usos_producto ON usos (producto);
+    """)
+    # Índices creados antes de la resolución por región y año: las partidas existentes quedan sin ellos
+    columnas_usos = {c[1] for c in conexion.execute("PRAGMA table_info(usos)")}
+    for columna, definicion in (('region', "TEXT NOT NULL DEFAULT ''"), ('anio', "INTEGER NOT NULL DEFAULT 0")):
+        if columna not in columnas_usos:
+            conexion.execute(f"ALTER TABLE usos ADD COLUMN {columna} {definicion}")
+    conexion.commit()
+    return {'conexion': conexion, 'bloqueo': threading.Lock()}
+
+def _guardar_producto(conexion, producto, datos, factores_df, matriz_factores, claves_filas, version, cache=None):
+    """Calcula un producto y reescribe sus usos y su resultado (sin commit)"""
+    if cache is not None:
+        emisiones_totales, desglose = calcular_con_cache(cache, datos, factores_df, version)
+    else:
+        emisiones_totales, desglose = calcular_emisiones_detalladas_completas(datos, factores_df)
+    partidas = construir_partidas(datos, factores_df)
+    filas = resolver_indices(matriz_factores, partidas)
+
+    conexion.execute("DELETE FROM usos WHERE producto = ?", (producto,))
+    conexion.executemany("INSERT INTO usos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (claves_filas[fila], producto, i, p.etapa, str(p.fuente), str(p.subfuente), p.categoria, str(p.item),
+         int(p.exacto), p.region, int(p.anio))
+        for i, (fila, p) in enumerate(zip(filas, partidas.itertuples(index=False)))
+    ])
+    conexion.execute("INSERT OR REPLACE INTO productos VALUES (?, ?, ?, ?, ?)", (
+        producto, datos_canonicos(datos), version, float(emisiones_totales),
+        zlib.compress(pickle.dumps((emisiones_totales, desglose), protocol=pickle.HIGHEST_PROTOCOL))))
+    return emisiones_totales, desglose
+
+def registrar_producto(indice, producto, datos, factores_df, matriz_factores=None, cache=None):
+    """
+    Calcula un producto, guarda su resultado y registra qué filas de factores usa
+    cada una de sus partidas.
+
+    Returns:
+        (emisiones_totales, desglose_detallado)
+    """
+    if matriz_factores is None:
+        matriz_factores = preparar_matriz_factores(factores_df)
+    with indice['bloqueo']:
+        conexion = indice['conexion']
+        resultado = _guardar_producto(conexion, producto, datos, factores_df, matriz_factores,
+                                      claves_filas_factores(factores_df), version_factores(factores_df), cache)
+        conexion.commit()
+    return resultado
+
+def obtener_resultado_producto(indice, producto):
+    """Resultado guardado de un producto: (emisiones_totales, desglose_detallado, version_factores) o None"""
+    with indice['bloqueo']:
+        fila = indice['conexion'].execute(
+            "SELECT resultado, version_factores FROM productos WHERE producto = ?", (producto,)).fetchone()
+    if fila is None:
+        return None
+    return (*pickle.loads(zlib.decompress(fila[0])), fila[1])
+
+def usos_fila(indice, fila):
+    """Productos y partidas que usan una fila de factores (ver claves_filas_factores)"""
+    with indice['bloqueo']:
+        return pd.read_sql_query(
+            "SELECT producto, partida, etapa, fuente, subfuente, item FROM usos WHERE fila = ? ORDER BY producto, partida",
+            indice['conexion'], params=(fila,))
+
+def productos_afectados(indice, factores_anteriores, factores_nuevos, diferencia=None):
+    """
+    Productos cuyo resultado cambia al pasar de factores_anteriores a factores_nuevos:
+    los que usan una fila modificada o eliminada y aquellos en los que una fila
+    nueva (o una que pasa a ser válida) cambia la fila a la que se resuelve una
+    partida. Los productos registrados con otra versión de factores también se
+    consideran afectados.
+
+    Returns:
+        (lista de productos afectados, número de partidas afectadas)
+    """
+    if diferencia is None:
+        diferencia = diferencia_factores(factores_anteriores, factores_nuevos)
+    conexion = indice['conexion']
+    desactualizados = {p for p, in conexion.execute(
+        "SELECT producto FROM productos WHERE version_factores != ?", (version_factores(factores_anteriores),))}
+    if diferencia.empty:
+        return sorted(desactualizados), 0
+
+    # Cada búsqueda distinta (categoría, ítem, exacto, región, año) se vuelve a resolver con los factores nuevos
+    busquedas = pd.read_sql_query("SELECT DISTINCT categoria, item, exacto, region, anio, fila FROM usos", conexion)
+    matriz_nueva = preparar_matriz_factores(factores_nuevos)
+    claves_nuevas = claves_filas_factores(factores_nuevos)
+    filas_nuevas = [claves_nuevas[resolver_indice(matriz_nueva, c, i, bool(e), r, a)]
+                    for c, i, e, r, a in zip(busquedas['categoria'], busquedas['item'], busquedas['exacto'],
+                                             busquedas['region'], busquedas['anio'])]
+    cambiadas = set(diferencia.index[diferencia['cambio'] != 'nueva'])
+    afectadas = busquedas[(busquedas['fila'] != filas_nuevas) | busquedas['fila'].isin(cambiadas)]
+    if afectadas.empty:
+        return sorted(desactualizados), 0
+
+    conexion.execute("DROP TABLE IF EXISTS temp.busquedas_afectadas")
+    conexion.execute("CREATE TEMP TABLE busquedas_afectadas "
+                     "(categoria TEXT, item TEXT, exacto INTEGER, region TEXT, anio INTEGER)")
+    conexion.executemany("INSERT INTO busquedas_afectadas VALUES (?, ?, ?, ?, ?)",
+                         afectadas[['categoria', 'item', 'exacto', 'region', 'anio']].astype(object)
+                         .itertuples(index=False, name=None))
+    usos_afectados = pd.read_sql_query("""
+        SELECT u.producto FROM usos u
+        JOIN busquedas_afectadas b ON u.categoria = b.categoria AND u.item = b.item AND u.exacto = b.exacto
+                                  AND u.region = b.region AND u.anio = b.anio
+    """, conexion)
+    return sorted(desactualizados | set(usos_afectados['producto'])), len(usos_afectados)
+
+def actualizar_por_diferencia(indice, factores_anteriores, factores_nuevos, cache=None):
+    """
+    Recalcula solo los productos afectados por el cambio de factores y actualiza
+    sus resultados y usos; el resto solo cambia de versión de factores.
+
+    Returns:
+        Informe con el número de filas modificadas, nuevas y eliminadas, productos
+        afectados sobre el total, partidas afectadas y tiempo empleado
+    """
+    inicio = time.perf_counter()
+    diferencia = diferencia_factores(factores_anteriores, factores_nuevos)
+    version = version_factores(factores_nuevos)
+    with indice['bloqueo']:
+        conexion = indice['conexion']
+        afectados, partidas_afectadas = productos_afectados(indice, factores_anteriores, factores_nuevos, diferencia)
+        matriz_nueva = preparar_matriz_factores(factores_nuevos)
+        claves_nuevas = claves_filas_factores(factores_nuevos)
+        for producto in afectados:
+            datos = json.loads(conexion.execute(
+                "SELECT datos FROM productos WHERE producto = ?", (producto,)).fetchone()[0])
+            _guardar_producto(conexion, producto, datos, factores_nuevos, matriz_nueva, claves_nuevas, version, cache)
+
+        # Los productos no afectados conservan resultado y usos: solo cambia la versión
+        conexion.execute("UPDATE productos SET version_factores = ?", (version,))
+        total_productos = conexion.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+        conexion.commit()
+
+    conteo = diferencia['cambio'].value_counts()
+    return {
+        'version_anterior': version_factores(factores_anteriores),
+        'version_nueva': version,
+        'filas_modificadas': int(conteo.get('modificada', 0)),
+        'filas_nuevas': int(conteo.get('nueva', 0)),
+        'filas_eliminadas': int(conteo.get('eliminada', 0)),
+        'productos_afectados': len(afectados),
+        'productos_totales': total_productos,
+        'partidas_afectadas': partidas_afectadas,
+        'productos': afectados,
+        'segundos': time.perf_counter() - inicio
+    }
+
+def _leer_factores_o_version(argumento, historial):
+    """Archivo de factores (se registra en el historial) o versión ya registrada"""
+    if os.path.exists(argumento):
+        return cargar_factores_versionados(argumento, historial)[0]
+    return cargar_version(historial, argumento)
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice inverso de factores y recálculo dirigido")
+    parser.add_argument('--indice', default=RUTA_INDICE_DEFECTO)
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    registrar = subcomandos.add_parser('registrar', help="Registra productos (archivos JSON con sus datos)")
+    registrar.add_argument('productos', nargs='+')
+    registrar.add_argument('--factores', default=RUTA_FACTORES_DEFECTO)
+    actualizar = subcomandos.add_parser('actualizar', help="Recalcula los productos afectados por un cambio de factores")
+    actualizar.add_argument('anteriores', help="Archivo de factores o versión del historial")
+    actualizar.add_argument('nuevos', help="Archivo de factores o versión del historial")
+    argumentos = parser.parse_args()
+
+    indice = abrir_indice(argumentos.indice)
+    historial = abrir_historial()
+    if argumentos.comando == 'registrar':
+        factores = cargar_factores_versionados(argumentos.factores, historial)[0]
+        matriz_factores = preparar_matriz_factores(factores)
+        for ruta in argumentos.productos:
+            with open(ruta, encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+            total, _ = registrar_producto(indice, os.path.splitext(os.path.basename(ruta))[0], datos,
+                                          factores, matriz_factores)
+            print(f"{ruta}: {total:.4f} kg CO2e")
+    else:
+        informe = actualizar_por_diferencia(indice, _leer_factores_o_version(argumentos.anteriores, historial),
+                                            _leer_factores_o_version(argumentos.nuevos, historial))
+        print(f"Filas de factores: {informe['filas_modificadas']} modificadas, {informe['filas_nuevas']} nuevas, "
+              f"{informe['filas_eliminadas']} eliminadas")
+        print(f"Productos recalculados: {informe['productos_afectados']} de {informe['productos_totales']} "
+              f"({informe['partidas_afectadas']} partidas) en {informe['segundos']:.2f} s")
+
+if __name__ == '__main__':
+    main()
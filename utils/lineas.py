@@ -0,0 +1,134 @@
+"""
+Registros compactos de las líneas del producto (materias primas, empaques y rutas)
+Cada línea se guarda en un objeto con __slots__ en lugar de un diccionario; se
+leen y escriben igual que un diccionario, así que el cálculo, el motor y la app
+los usan sin cambios
+MENOS MEMORIA POR SESIÓN CON LISTAS DE MATERIALES GRANDES
+"""
+
+from collections.abc import MutableMapping
+
+class Registro(MutableMapping):
+    """
+    Línea con campos fijos en __slots__. Un campo sin asignar se comporta como
+    una clave ausente de un diccionario; las claves que no son campos se guardan
+    en 'extra', que solo se crea si hace falta.
+    """
+    __slots__ = ('extra',)
+    CAMPOS = ()
+
+    def __init__(self, datos=None, **claves):
+        for clave, valor in {**(datos or {}), **claves}.items():
+            self[clave] = valor
+
+    def _convertir(self, clave, valor):
+        return valor
+
+    def __getitem__(self, clave):
+        try:
+            if clave in self.CAMPOS:
+                return getattr(self, clave)
+            return self.extra[clave]
+        except (AttributeError, KeyError):
+            raise KeyError(clave) from None
+
+    def __setitem__(self, clave, valor):
+        valor = self._convertir(clave, valor)
+        if clave in self.CAMPOS:
+            setattr(self, clave, valor)
+        else:
+            if not hasattr(self, 'extra'):
+                self.extra = {}
+            self.extra[clave] = valor
+
+    def __delitem__(self, clave):
+        try:
+            if clave in self.CAMPOS:
+                delattr(self, clave)
+            else:
+                del self.extra[clave]
+        except (AttributeError, KeyError):
+            raise KeyError(clave) from None
+
+    def __iter__(self):
+        for campo in self.CAMPOS:
+            if hasattr(self, campo):
+                yield campo
+        yield from getattr(self, 'extra', {})
+
+    def __len__(self):
+        return sum(hasattr(self, campo) for campo in self.CAMPOS) + len(getattr(self, 'extra', {}))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def a_dict(self):
+        """Diccionario anidado equivalente (para exportar o serializar)"""
+        return {clave: _a_dict(valor) for clave, valor in self.items()}
+
+class EmpaqueMateria(Registro):
+    """Empaque en el que llega una materia prima"""
+    CAMPOS = ('material', 'peso', 'unidad', 'peso_kg')
+    __slots__ = CAMPOS
+
+class Ruta(Registro):
+    """Tramo de transporte de una materia prima o un empaque"""
+    CAMPOS = ('origen', 'destino', 'distancia_km', 'tipo_transporte', 'carga', 'unidad_carga', 'carga_kg')
+    __slots__ = CAMPOS
+
+class _ConRutas(Registro):
+    __slots__ = ()
+
+    def _convertir(self, clave, valor):
+        if clave == 'transportes' and valor is not None:
+            return [compactar(ruta, Ruta) for ruta in valor]
+        return valor
+
+class MateriaPrima(_ConRutas):
+    CAMPOS = ('producto', 'region', 'cantidad_teorica', 'unidad_teorica', 'cantidad_teorica_kg',
+              'cantidad_real', 'unidad_real', 'cantidad_real_kg', 'empaque', 'transportes')
+    __slots__ = CAMPOS
+
+    def _convertir(self, clave, valor):
+        if clave == 'empaque':
+            return compactar(valor, EmpaqueMateria) if valor else valor
+        return super()._convertir(clave, valor)
+
+class Empaque(_ConRutas):
+    CAMPOS = ('nombre', 'material', 'peso', 'unidad', 'cantidad', 'peso_kg', 'region', 'transportes')
+    __slots__ = CAMPOS
+
+def compactar(valor, clase):
+    """Registro de la clase a partir de un diccionario (los registros y None se devuelven tal cual)"""
+    if valor is None or isinstance(valor, Registro):
+        return valor
+    return clase(valor)
+
+def compactar_lineas(datos):
+    """
+    Sustituye en su sitio los diccionarios de materias primas, empaques y sus
+    rutas por registros compactos (la app lo llama en cada ejecución; las
+    líneas ya compactas se recorren sin copiarlas).
+    """
+    for clave, clase in (('materias_primas', MateriaPrima), ('empaques', Empaque)):
+        lineas = datos.get(clave)
+        if not lineas:
+            continue
+        for i, linea in enumerate(lineas):
+            if isinstance(linea, Registro):
+                rutas = linea.get('transportes')
+                if rutas and not all(isinstance(r, Registro) for r in rutas):
+                    linea['transportes'] = rutas
+                empaque = linea.get('empaque') if clase is MateriaPrima else None
+                if empaque and not isinstance(empaque, Registro):
+                    linea['empaque'] = empaque
+            else:
+                lineas[i] = compactar(linea, clase)
+    return datos
+
+def _a_dict(valor):
+    if isinstance(valor, Registro):
+        return valor.a_dict()
+    if isinstance(valor, list):
+        return [_a_dict(v) for v in valor]
+    return valor
@@ -0,0 +1,214 @@
+"""
+Modelo lineal compilado de la huella de un producto
+Cada etapa es lineal (cantidad × factor): el producto se compila en un vector de
+cantidades, un índice de factor por partida y coeficientes dispersos por factor.
+RECÁLCULO INCREMENTAL AL CAMBIAR UNA CANTIDAD O UN FACTOR
+"""
+
+import numpy as np
+import pandas as pd
+from utils.motor import ETAPAS, cantidades_efectivas, construir_partidas, preparar_matriz_factores, resolver_indices
+
+def compilar_modelo(datos, factores_df, matriz_factores=None):
+    """
+    Compila un producto (estructura de session_state) en su modelo lineal.
+
+    El total de cada etapa es C_etapa · F, donde C_etapa es el vector de
+    coeficientes (suma de cantidades) sobre los factores usados y F la matriz
+    (factores usados × categorías de impacto).
+
+    Returns:
+        Diccionario con el modelo compilado; usar las funciones de este módulo
+        para evaluarlo y modificarlo
+    """
+    if matriz_factores is None:
+        matriz_factores = preparar_matriz_factores(factores_df)
+    partidas = construir_partidas(datos, factores_df)
+    return compilar_partidas(partidas, matriz_factores)
+
+def compilar_partidas(partidas, matriz_factores):
+    """
+    Compila una tabla de partidas ya construida (ver motor.construir_partidas).
+    Las cantidades del modelo incluyen el ajuste de cada partida (horario de la
+    energía o fracción asignada entre coproductos); el ajuste se guarda en
+    'ajustes' para aplicarlo también a las cantidades que se cambien después.
+    """
+    indices = resolver_indices(matriz_factores, partidas)
+    cantidades = cantidades_efectivas(partidas).copy()
+    ajustes = partidas['ajuste'].to_numpy(dtype=float).copy() if 'ajuste' in partidas.columns \
+        else np.ones(len(partidas))
+    etapas = pd.Categorical(partidas['etapa'], categories=ETAPAS).codes.astype(np.int64)
+
+    # Factores usados por el producto: posición de cada partida dentro de ellos
+    ids_factor, posiciones = np.unique(indices, return_inverse=True)
+    posiciones = posiciones.astype(np.int64)
+
+    # Copia de los factores usados: los escenarios no modifican la tabla compartida
+    factores = matriz_factores['matriz'][ids_factor].copy()
+
+    return _ensamblar_modelo(partidas.reset_index(drop=True), list(matriz_factores['categorias']),
+                             cantidades, ajustes, etapas, posiciones, ids_factor,
+                             [matriz_factores['etiquetas'][i] for i in ids_factor], factores)
+
+def _ensamblar_modelo(partidas, categorias, cantidades, ajustes, etapas, posiciones, ids_factor, etiquetas_factor,
+                      factores):
+    """Construye el diccionario del modelo y sus coeficientes por etapa"""
+    coeficientes_etapa = np.zeros((len(ETAPAS), len(ids_factor)))
+    np.add.at(coeficientes_etapa, (etapas, posiciones), cantidades)
+
+    modelo = {
+        'partidas': partidas,
+        'categorias': categorias,
+        'cantidades': cantidades,
+        'ajustes': ajustes,
+        'etapas': etapas,
+        'posiciones': posiciones,
+        'ids_factor': ids_factor,
+        'etiquetas_factor': etiquetas_factor,
+        'factores': factores,
+        'coeficientes_etapa': coeficientes_etapa,
+        'totales_etapa': coeficientes_etapa @ factores
+    }
+    return modelo
+
+def combinar_modelos(modelos, unidades=None, nombres=None):
+    """
+    Combina los modelos de varios productos en el modelo de una cartera.
+
+    Los factores compartidos quedan en una sola posición, de modo que al muestrear
+    un factor todos los productos que lo usan ven el mismo valor.
+
+    Args:
+        modelos: lista de modelos compilados con la misma tabla de factores
+        unidades: unidades de cada producto en la cartera (1 por defecto)
+        nombres: nombre de cada producto (columna 'producto' de las partidas)
+
+    Returns:
+        Modelo compilado de la cartera
+    """
+    unidades = np.ones(len(modelos)) if unidades is None else np.asarray(unidades, dtype=float)
+    nombres = list(range(len(modelos))) if nombres is None else list(nombres)
+    ids_factor = np.unique(np.concatenate([m['ids_factor'] for m in modelos])) if modelos \
+        else np.zeros(0, dtype=np.int64)
+
+    categorias = list(modelos[0]['categorias']) if modelos else ['gwp']
+    factores = np.zeros((len(ids_factor), len(categorias)))
+    etiquetas_factor = [''] * len(ids_factor)
+    partidas, cantidades, ajustes, etapas, posiciones = [], [], [], [], []
+    for modelo, n_unidades, nombre in zip(modelos, unidades, nombres):
+        destino = np.searchsorted(ids_factor, modelo['ids_factor'])
+        factores[destino] = modelo['factores']
+        for d, etiqueta in zip(destino, modelo['etiquetas_factor']):
+            etiquetas_factor[d] = etiqueta
+        partidas.append(modelo['partidas'].assign(producto=nombre))
+        cantidades.append(modelo['cantidades'] * n_unidades)
+        # Una cantidad cambiada después es por unidad de producto: el ajuste lleva las unidades
+        ajustes.append(modelo['ajustes'] * n_unidades)
+        etapas.append(modelo['etapas'])
+        posiciones.append(destino[modelo['posiciones']])
+
+    if not modelos:
+        return _ensamblar_modelo(pd.DataFrame(), categorias, np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64),
+                                 np.zeros(0, dtype=np.int64), ids_factor, etiquetas_factor, factores)
+    return _ensamblar_modelo(pd.concat(partidas, ignore_index=True), categorias, np.concatenate(cantidades),
+                             np.concatenate(ajustes), np.concatenate(etapas), np.concatenate(posiciones).astype(np.int64),
+                             ids_factor, etiquetas_factor, factores)
+
+def evaluar_modelo(modelo):
+    """
+    Recalcula desde cero los totales por etapa con un producto matricial.
+
+    Returns:
+        DataFrame (ETAPAS × categorías)
+    """
+    modelo['totales_etapa'] = modelo['coeficientes_etapa'] @ modelo['factores']
+    return totales_modelo(modelo)
+
+def totales_modelo(modelo):
+    """Totales por etapa vigentes (ETAPAS × categorías), sin recalcular"""
+    return pd.DataFrame(modelo['totales_etapa'], index=ETAPAS, columns=modelo['categorias'])
+
+def total_modelo(modelo, categoria='gwp'):
+    """Total del producto para una categoría de impacto"""
+    return float(modelo['totales_etapa'][:, modelo['categorias'].index(categoria)].sum())
+
+def actualizar_cantidad(modelo, partida, nueva_cantidad):
+    """
+    Cambia la cantidad de una partida (la de construir_partidas, sin ajuste) y
+    actualiza los totales en O(K). Se le aplica el ajuste de la partida, así que
+    la corrección horaria o la asignación entre coproductos se conservan.
+    """
+    cantidad = float(nueva_cantidad) * modelo['ajustes'][partida]
+    delta = cantidad - modelo['cantidades'][partida]
+    etapa = modelo['etapas'][partida]
+    posicion = modelo['posiciones'][partida]
+    modelo['cantidades'][partida] = cantidad
+    modelo['coeficientes_etapa'][etapa, posicion] += delta
+    modelo['totales_etapa'][etapa] += delta * modelo['factores'][posicion]
+
+def actualizar_factor(modelo, id_factor, nuevo_valor, categoria='gwp'):
+    """
+    Cambia el valor de un factor (fila de la matriz de factores) para una
+    categoría y actualiza los totales de todas las etapas en O(etapas).
+    Si el producto no usa ese factor no hay nada que actualizar.
+    """
+    posicion = np.searchsorted(modelo['ids_factor'], id_factor)
+    if posicion >= len(modelo['ids_factor']) or modelo['ids_factor'][posicion] != id_factor:
+        return
+    j = modelo['categorias'].index(categoria)
+    delta = float(nuevo_valor) - modelo['factores'][posicion, j]
+    modelo['factores'][posicion, j] = float(nuevo_valor)
+    modelo['totales_etapa'][:, j] += delta * modelo['coeficientes_etapa'][:, posicion]
+
+def contribuciones(modelo, categoria='gwp'):
+    """
+    Contribución exacta de cada partida (cantidad × factor) y su participación.
+
+    Returns:
+        Copia de las partidas con 'factor', 'contribucion' y 'porcentaje'
+    """
+    j = modelo['categorias'].index(categoria)
+    factor_partida = modelo['factores'][modelo['posiciones'], j]
+    contribucion = modelo['cantidades'] * factor_partida
+    total = contribucion.sum()
+
+    tabla = modelo['partidas'].copy()
+    tabla['cantidad'] = modelo['cantidades']
+    tabla['factor'] = factor_partida
+    tabla['contribucion'] = contribucion
+    tabla['porcentaje'] = contribucion / total * 100 if total != 0 else 0.0
+    return tabla
+
+def gradientes(modelo, categoria='gwp'):
+    """
+    Derivadas del total respecto a cada cantidad y a cada factor. Al ser el
+    modelo lineal, d total / d cantidad_i = factor_i y d total / d factor_j =
+    suma de las cantidades que usan el factor j.
+
+    Returns:
+        (Serie por partida, Serie por factor usado indexada por etiqueta)
+    """
+    j = modelo['categorias'].index(categoria)
+    por_cantidad = pd.Series(modelo['factores'][modelo['posiciones'], j], name='d_total_d_cantidad')
+    por_factor = pd.Series(modelo['coeficientes_etapa'].sum(axis=0),
+                           index=modelo['etiquetas_factor'], name='d_total_d_factor')
+    return por_cantidad, por_factor
+
+def evaluar_lote(modelo, multiplicadores_cantidad=None, multiplicadores_factor=None, categoria='gwp'):
+    """
+    Evalúa S variantes del producto en una sola operación.
+
+    Args:
+        multiplicadores_cantidad: array (S × partidas) que escala cada cantidad
+        multiplicadores_factor: array (S × factores usados) que escala cada factor
+        categoria: categoría de impacto evaluada
+
+    Returns:
+        Array (S,) con el total de cada variante
+    """
+    j = modelo['categorias'].index(categoria)
+    cantidades = modelo['cantidades'] if multiplicadores_cantidad is None \
+        else multiplicadores_cantidad * modelo['cantidades']
+    factores = modelo['factores'][:, j] if multiplicadores_factor is None \
+        else multiplicadores_factor * modelo['factores'][:, j]
+    return (np.atleast_2d(cantidades) * np.atleast_2d(factores)[:, modelo['posiciones']]).sum(axis=1)
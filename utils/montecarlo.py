@@ -0,0 +1,190 @@
+"""
+Simulación Monte Carlo de la huella por bloques en paralelo
+Cada bloque tiene su semilla (SeedSequence.spawn) y devuelve estadísticas
+acumulables (media, varianza, histograma y sketch de cuantiles) que se combinan
+en orden: RESULTADOS IDÉNTICOS CON CUALQUIER NÚMERO DE PROCESOS
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from utils.incertidumbre import gsd_modelo
+from utils.nucleos import totales_montecarlo
+
+TAMANO_BLOQUE_DEFECTO = 20_000
+BINS_HISTOGRAMA = 50
+
+# Precisión relativa del sketch de cuantiles (cubetas logarítmicas, tipo DDSketch)
+PRECISION_SKETCH = 0.005
+
+PERCENTILES_DEFECTO = (2.5, 5, 50, 95, 97.5)
+
+def _indices_sketch(valores, precision):
+    """Cubeta logarítmica de cada valor absoluto"""
+    gamma = (1 + precision) / (1 - precision)
+    return np.ceil(np.log(np.abs(valores)) / np.log(gamma)).astype(np.int64)
+
+def estadisticas_bloque(valores, bordes, precision=PRECISION_SKETCH):
+    """
+    Estadísticas acumulables de un bloque de simulaciones.
+
+    Returns:
+        Diccionario con 'n', 'media', 'm2' (suma de cuadrados centrada), 'minimo',
+        'maximo', 'conteos' del histograma sobre `bordes`, 'por_debajo',
+        'por_encima' y el sketch ('positivos', 'negativos', 'ceros')
+    """
+    valores = np.asarray(valores, dtype=float)
+    media = float(valores.mean()) if len(valores) else 0.0
+    estadisticas = {
+        'n': len(valores),
+        'media': media,
+        'm2': float(((valores - media) ** 2).sum()),
+        'minimo': float(valores.min()) if len(valores) else np.inf,
+        'maximo': float(valores.max()) if len(valores) else -np.inf,
+        'conteos': np.histogram(valores, bins=bordes)[0],
+        'por_debajo': int((valores < bordes[0]).sum()),
+        'por_encima': int((valores > bordes[-1]).sum()),
+        'ceros': int((valores == 0).sum()),
+        'precision': precision
+    }
+    for clave, seleccion in (('positivos', valores > 0), ('negativos', valores < 0)):
+        indices, conteos = np.unique(_indices_sketch(valores[seleccion], precision), return_counts=True)
+        estadisticas[clave] = dict(zip(indices.tolist(), conteos.tolist()))
+    return estadisticas
+
+def combinar_estadisticas(a, b):
+    """Combina las estadísticas de dos bloques (media y varianza por el método de Chan)"""
+    n = a['n'] + b['n']
+    if n == 0:
+        return a
+    delta = b['media'] - a['media']
+    combinadas = {
+        'n': n,
+        'media': a['media'] + delta * b['n'] / n,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * b['n'] / n,
+        'minimo': min(a['minimo'], b['minimo']),
+        'maximo': max(a['maximo'], b['maximo']),
+        'conteos': a['conteos'] + b['conteos'],
+        'por_debajo': a['por_debajo'] + b['por_debajo'],
+        'por_encima': a['por_encima'] + b['por_encima'],
+        'ceros': a['ceros'] + b['ceros'],
+        'precision': a['precision']
+    }
+    for clave in ('positivos', 'negativos'):
+        sketch = dict(a[clave])
+        for indice, conteo in b[clave].items():
+            sketch[indice] = sketch.get(indice, 0) + conteo
+        combinadas[clave] = sketch
+    return combinadas
+
+def cuantil_sketch(estadisticas, q):
+    """
+    Cuantil q (0-1) estimado desde el sketch, con error relativo acotado por
+    la precisión del sketch.
+    """
+    gamma = (1 + estadisticas['precision']) / (1 - estadisticas['precision'])
+    negativos = sorted(estadisticas['negativos'].items(), reverse=True)
+    positivos = sorted(estadisticas['positivos'].items())
+    cubetas = ([(-2 * gamma ** i / (gamma + 1), c) for i, c in negativos]
+               + [(0.0, estadisticas['ceros'])]
+               + [(2 * gamma ** i / (gamma + 1), c) for i, c in positivos])
+
+    rango = q * (estadisticas['n'] - 1)
+    acumulado = 0
+    for valor, conteo in cubetas:
+        acumulado += conteo
+        if acumulado > rango:
+            return float(np.clip(valor, estadisticas['minimo'], estadisticas['maximo']))
+    return float(estadisticas['maximo'])
+
+def _muestrear_totales(semilla, n, cantidades, factores, posiciones, sigma_cantidades, sigma_factores):
+    """Totales de n iteraciones con cantidades y factores lognormales"""
+    rng = np.random.default_rng(semilla)
+    normales_cantidades = rng.standard_normal((n, len(cantidades)))
+    normales_factores = rng.standard_normal((n, len(factores)))
+    return totales_montecarlo(cantidades, factores, posiciones, sigma_cantidades, sigma_factores,
+                              normales_cantidades, normales_factores)
+
+def _simular_bloque(semilla, n, cantidades, factores, posiciones, sigma_cantidades, sigma_factores, bordes, precision):
+    """Simula un bloque de n iteraciones (se ejecuta en un proceso de trabajo)"""
+    totales = _muestrear_totales(semilla, n, cantidades, factores, posiciones, sigma_cantidades, sigma_factores)
+    return estadisticas_bloque(totales, bordes, precision)
+
+def resumir_estadisticas(estadisticas, bordes, percentiles=PERCENTILES_DEFECTO):
+    """Resumen legible de unas estadísticas combinadas"""
+    n = estadisticas['n']
+    return {
+        'n_iteraciones': n,
+        'media': estadisticas['media'],
+        'desviacion': float(np.sqrt(estadisticas['m2'] / (n - 1))) if n > 1 else 0.0,
+        'minimo': estadisticas['minimo'],
+        'maximo': estadisticas['maximo'],
+        'percentiles': {p: cuantil_sketch(estadisticas, p / 100) for p in percentiles},
+        'histograma': {
+            'bordes': bordes,
+            'conteos': estadisticas['conteos'],
+            'por_debajo': estadisticas['por_debajo'],
+            'por_encima': estadisticas['por_encima']
+        },
+        'estadisticas': estadisticas
+    }
+
+def simular_montecarlo(modelo, n_iteraciones=100_000, gsd_cantidades=None, gsd_factores=None,
+                       categoria='gwp', semilla=0, tamano_bloque=TAMANO_BLOQUE_DEFECTO,
+                       n_procesos=None, percentiles=PERCENTILES_DEFECTO, factores_df=None, ejecutor=None):
+    """
+    Monte Carlo de la huella total con cantidades y factores lognormales
+    (mediana = valor actual) repartido en bloques entre procesos.
+
+    La memoria depende del tamaño de bloque, no del número de iteraciones. El
+    bloque i usa siempre la semilla hija i y las estadísticas se combinan en el
+    orden de los bloques, así que el resultado no depende de n_procesos.
+
+    Args:
+        modelo: modelo compilado (un producto o una cartera, ver combinar_modelos)
+        gsd_cantidades, gsd_factores: arrays de GSD por partida y por factor usado
+            (por defecto, incertidumbre.gsd_modelo)
+        n_procesos: procesos de trabajo (None = núcleos disponibles, 1 = sin paralelismo)
+        ejecutor: pool de procesos ya creado y compartido (p. ej. por la app);
+            si se pasa, se usa en lugar de crear uno y n_procesos no se tiene en cuenta
+        factores_df: tabla de factores con GSD / pedigrí por fila (opcional)
+
+    Returns:
+        Diccionario con 'n_iteraciones', 'media', 'desviacion', 'minimo', 'maximo',
+        'percentiles', 'histograma' y las 'estadisticas' combinadas
+    """
+    gsd_q_defecto, gsd_f_defecto = gsd_modelo(modelo, factores_df=factores_df)
+    sigma_q = np.log(gsd_q_defecto if gsd_cantidades is None else np.asarray(gsd_cantidades, dtype=float))
+    sigma_f = np.log(gsd_f_defecto if gsd_factores is None else np.asarray(gsd_factores, dtype=float))
+    j = modelo['categorias'].index(categoria)
+    argumentos = (modelo['cantidades'], modelo['factores'][:, j], modelo['posiciones'], sigma_q, sigma_f)
+
+    tamanos = [tamano_bloque] * (n_iteraciones // tamano_bloque)
+    if n_iteraciones % tamano_bloque:
+        tamanos.append(n_iteraciones % tamano_bloque)
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+
+    # Bordes del histograma fijados por el primer bloque (determinista por su semilla)
+    piloto = _muestrear_totales(semillas[0], tamanos[0], *argumentos)
+    inferior, superior = np.percentile(piloto, [0.05, 99.95])
+    margen = 0.25 * (superior - inferior) or max(abs(inferior), 1.0) * 0.01
+    bordes = np.linspace(inferior - margen, superior + margen, BINS_HISTOGRAMA + 1)
+    estadisticas = estadisticas_bloque(piloto, bordes)
+
+    resto = (semillas[1:], tamanos[1:], *(repeat(a) for a in argumentos), repeat(bordes), repeat(PRECISION_SKETCH))
+    n_procesos = n_procesos or os.cpu_count() or 1
+    if ejecutor is not None and len(tamanos) > 1:
+        for bloque in ejecutor.map(_simular_bloque, *resto):
+            estadisticas = combinar_estadisticas(estadisticas, bloque)
+    elif n_procesos == 1 or len(tamanos) == 1:
+        for bloque in map(_simular_bloque, *resto):
+            estadisticas = combinar_estadisticas(estadisticas, bloque)
+    else:
+        with ProcessPoolExecutor(max_workers=n_procesos) as executor:
+            for bloque in executor.map(_simular_bloque, *resto):
+                estadisticas = combinar_estadisticas(estadisticas, bloque)
+
+    resultado = resumir_estadisticas(estadisticas, bordes, percentiles)
+    resultado['bloques'] = len(tamanos)
+    return resultado
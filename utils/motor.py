@@ -0,0 +1,615 @@
+"""
+Motor vectorizado de impactos para la calculadora de huella de carbono
+Partidas de inventario × matriz de factores con K categorías de impacto
+TODAS LAS CATEGORÍAS EN UNA SOLA PASADA
+"""
+
+import hashlib
+import re
+import numpy as np
+import pandas as pd
+from utils.calculos import (
+    FACTORES_POR_DEFECTO,
+    TRATAMIENTOS_FIN_VIDA,
+    items_tratamiento_material
+)
+from utils.regiones import codigos_region, regiones_conocidas, tabla_regional
+from utils.vigencias import resolver_anios, tabla_vigencias
+from utils.perfiles_horarios import ajuste_horario
+from utils.coproductos import (
+    FUENTE_CREDITO,
+    fracciones_asignacion,
+    leer_coproductos,
+    matriz_asignacion,
+    repartir_totales
+)
+from utils.nucleos import sumar_por_grupo
+
+# Categorías de impacto conocidas y su columna en factors.csv.
+# Cualquier otra columna 'factor_<nombre>_per_unit' se detecta como categoría adicional.
+CATEGORIAS_IMPACTO = {
+    'gwp': {'columna': 'factor_kgCO2e_per_unit', 'nombre': 'Cambio climático', 'unidad': 'kg CO₂e'},
+    'agua': {'columna': 'factor_agua_m3_per_unit', 'nombre': 'Uso de agua', 'unidad': 'm³'},
+    'suelo': {'columna': 'factor_suelo_m2a_per_unit', 'nombre': 'Uso de suelo', 'unidad': 'm²·año'},
+    'fosil': {'columna': 'factor_fosil_MJ_per_unit', 'nombre': 'Agotamiento de recursos fósiles', 'unidad': 'MJ'}
+}
+
+# Sub-columnas de GWP por horizonte temporal y origen del carbono (kg CO₂e por unidad).
+# Se evalúan en la misma pasada que el resto de categorías.
+HORIZONTES_GWP = {'gwp100': 'GWP100', 'gwp20': 'GWP20'}
+ORIGENES_CARBONO = {'fosil': 'fósil', 'biogenico': 'biogénico', 'luc': 'cambio de uso de suelo'}
+
+for _horizonte, _nombre_horizonte in HORIZONTES_GWP.items():
+    for _origen, _nombre_origen in ORIGENES_CARBONO.items():
+        CATEGORIAS_IMPACTO[f'{_horizonte}_{_origen}'] = {
+            'columna': f'factor_{_horizonte}_{_origen}_kgCO2e_per_unit',
+            'nombre': f'{_nombre_horizonte} {_nombre_origen}',
+            'unidad': 'kg CO₂e'
+        }
+
+PATRON_COLUMNA_IMPACTO = re.compile(r'^factor_(.+)_per_unit$')
+
+# Etapas del ciclo de vida en el orden de desglose_detallado
+ETAPAS = ['materias_primas', 'empaques', 'transporte', 'procesamiento', 'distribucion', 'retail', 'fin_vida']
+
+COLUMNAS_PARTIDAS = ['etapa', 'fuente', 'subfuente', 'categoria', 'item', 'exacto', 'cantidad', 'masa_kg', 'region',
+                     'anio', 'ajuste', 'ruta']
+
+def detectar_categorias_impacto(factores_df):
+    """
+    Detecta las columnas de impacto presentes en la tabla de factores.
+
+    Returns:
+        Diccionario ordenado {clave: {'columna', 'nombre', 'unidad'}} con 'gwp' primero
+    """
+    claves_conocidas = {meta['columna']: clave for clave, meta in CATEGORIAS_IMPACTO.items()}
+    categorias = {}
+    for columna in factores_df.columns:
+        coincidencia = PATRON_COLUMNA_IMPACTO.match(str(columna))
+        if not coincidencia:
+            continue
+        clave = claves_conocidas.get(columna, coincidencia.group(1))
+        categorias[clave] = CATEGORIAS_IMPACTO.get(clave, {
+            'columna': columna,
+            'nombre': coincidencia.group(1),
+            'unidad': ''
+        })
+    if 'gwp' in categorias:
+        categorias = {'gwp': categorias.pop('gwp'), **categorias}
+    return categorias
+
+# Columnas que identifican una fila de factores (las demás son valores)
+COLUMNAS_CLAVE_FACTOR = ['category', 'subcategory', 'item', 'region', 'year']
+
+def leer_factores(ruta):
+    """
+    Lee factors.csv con las columnas de impacto numéricas: un factor GWP no
+    numérico pasa a 1.0; en las demás categorías, sin dato = sin aporte.
+    """
+    factores = pd.read_csv(ruta)
+    factores['factor_kgCO2e_per_unit'] = pd.to_numeric(factores['factor_kgCO2e_per_unit'], errors='coerce').fillna(1.0)
+    for categoria in detectar_categorias_impacto(factores).values():
+        if categoria['columna'] != 'factor_kgCO2e_per_unit':
+            factores[categoria['columna']] = pd.to_numeric(factores[categoria['columna']], errors='coerce')
+    return factores
+
+def version_factores(factores_df):
+    """Versión de una tabla de factores: hash de su contenido (mismo contenido, misma versión)"""
+    contenido = factores_df.to_csv(index=False, lineterminator='\n').encode('utf-8')
+    return hashlib.sha256(contenido).hexdigest()[:16]
+
+def claves_filas_factores(factores_df):
+    """
+    Identificador estable de cada fila de la matriz de factores (filas de
+    factors.csv y filas por defecto, en el orden de preparar_matriz_factores).
+    No depende de la posición de la fila en el archivo.
+    """
+    columnas = [c for c in COLUMNAS_CLAVE_FACTOR if c in factores_df.columns]
+    claves = pd.Series('', index=factores_df.index)
+    for i, columna in enumerate(columnas):
+        claves = claves + ('|' if i else '') + factores_df[columna].astype(str)
+    # Filas repetidas: se numeran por orden de aparición
+    repeticion = claves.groupby(claves).cumcount()
+    claves = claves.where(repeticion == 0, claves + '#' + repeticion.astype(str))
+    return list(claves) + [f"(por defecto)|{c}" for c in list(FACTORES_POR_DEFECTO) + ['']]
+
+def diferencia_factores(anteriores, nuevos):
+    """
+    Diferencia fila a fila entre dos tablas de factores. Las filas se identifican
+    por claves_filas_factores; una fila se considera modificada si cambia alguna
+    columna de impacto.
+
+    Returns:
+        DataFrame indexado por clave de fila con 'cambio' ('modificada', 'nueva',
+        'eliminada') y el factor GWP anterior y nuevo
+    """
+    columnas = list(dict.fromkeys(
+        [m['columna'] for m in detectar_categorias_impacto(anteriores).values()]
+        + [m['columna'] for m in detectar_categorias_impacto(nuevos).values()]))
+
+    def valores(factores_df):
+        tabla = pd.DataFrame({c: pd.to_numeric(factores_df[c], errors='coerce') if c in factores_df.columns
+                              else np.nan for c in columnas}, index=factores_df.index)
+        tabla.index = claves_filas_factores(factores_df)[:len(factores_df)]
+        return tabla
+
+    antes, despues = valores(anteriores), valores(nuevos)
+    comunes = antes.index.intersection(despues.index)
+    a = antes.loc[comunes].to_numpy(dtype=float)
+    b = despues.loc[comunes].to_numpy(dtype=float)
+    distintas = ~((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=1)
+
+    cambios = pd.concat([
+        pd.Series('modificada', index=comunes[distintas]),
+        pd.Series('nueva', index=despues.index.difference(antes.index)),
+        pd.Series('eliminada', index=antes.index.difference(despues.index))
+    ])
+    return pd.DataFrame({
+        'cambio': cambios,
+        'gwp_anterior': antes['factor_kgCO2e_per_unit'].reindex(cambios.index),
+        'gwp_nuevo': despues['factor_kgCO2e_per_unit'].reindex(cambios.index)
+    }).rename_axis('fila')
+
+def preparar_matriz_factores(factores_df, categorias=None):
+    """
+    Prepara la matriz de factores (filas de factors.csv + filas por defecto) × K
+    categorías y los índices de búsqueda. Se construye una vez por tabla de factores.
+    """
+    if categorias is None:
+        categorias = detectar_categorias_impacto(factores_df)
+    columnas = [meta['columna'] for meta in categorias.values()]
+    n_filas = len(factores_df)
+
+    valores = np.zeros((n_filas, len(columnas)))
+    for j, columna in enumerate(columnas):
+        if columna in factores_df.columns:
+            valores[:, j] = pd.to_numeric(factores_df[columna], errors='coerce').to_numpy(dtype=float)
+        else:
+            valores[:, j] = np.nan
+
+    # Una fila por defecto por categoría de factor (mismos valores que obtener_factor)
+    categorias_defecto = list(FACTORES_POR_DEFECTO) + ['']
+    defecto = np.zeros((len(categorias_defecto), len(columnas)))
+    j_gwp = list(categorias).index('gwp') if 'gwp' in categorias else None
+    if j_gwp is not None:
+        defecto[:, j_gwp] = [FACTORES_POR_DEFECTO.get(c, (1.0, 'kg'))[0] for c in categorias_defecto]
+
+    # Filas sin factor GWP válido se resuelven al valor por defecto, como en obtener_factor
+    validas = ~np.isnan(valores[:, j_gwp]) if j_gwp is not None else np.ones(n_filas, dtype=bool)
+
+    items_por_categoria = {}
+    for fila, (categoria, item) in enumerate(zip(factores_df['category'].astype(str).str.lower(),
+                                                 factores_df['item'].astype(str).str.lower())):
+        items_por_categoria.setdefault(categoria, []).append((fila, item))
+
+    # Etiqueta legible de cada fila de la matriz (para informes de contribución)
+    etiquetas = [f"{c}/{i}" for c, i in zip(factores_df['category'].astype(str), factores_df['item'].astype(str))]
+    etiquetas += [f"{c or 'genérico'}/(por defecto)" for c in categorias_defecto]
+
+    # Cadenas de respaldo país → región → Global precalculadas: (filas × regiones) -> fila
+    filas_defecto = {c: n_filas + i for i, c in enumerate(categorias_defecto)}
+    regiones = regiones_conocidas(factores_df)
+    n_filas_matriz = n_filas + len(categorias_defecto)
+
+    # Fila que sustituye a cada fila de la matriz: ella misma o, sin factor válido, la de su categoría
+    sustitutas = np.arange(n_filas_matriz, dtype=np.int64)
+    defecto_fila = [filas_defecto.get(c, filas_defecto['']) for c in factores_df['category'].astype(str).str.lower()]
+    sustitutas[:n_filas] = np.where(validas, sustitutas[:n_filas], np.array(defecto_fila, dtype=np.int64))
+
+    return {
+        'categorias': categorias,
+        'matriz': np.nan_to_num(np.vstack([valores, defecto]), nan=0.0),
+        'validas': validas,
+        'n_filas': n_filas,
+        'filas_defecto': filas_defecto,
+        'items_por_categoria': items_por_categoria,
+        'etiquetas': etiquetas,
+        'sustitutas': sustitutas,
+        'regiones': regiones,
+        'tabla_regional': tabla_regional(factores_df, regiones, n_filas_matriz),
+        'vigencias': tabla_vigencias(factores_df),
+        'cache': {}
+    }
+
+def resolver_indice(matriz_factores, categoria, item=None, exacto=False, region=None, anio=None):
+    """
+    Índice de fila de la matriz de factores para (categoría, ítem).
+    Replica obtener_factor: primer ítem que contiene el texto buscado, o la primera
+    fila de la categoría si no hay coincidencia. Con exacto=True solo acepta el
+    ítem idéntico. Sin fila válida se usa la fila por defecto de la categoría.
+    Con region se sigue su cadena de respaldo (país → región → Global) y con
+    anio se usa la versión del factor vigente ese año.
+    """
+    clave = (categoria, item, exacto, region or '', int(anio or 0))
+    cache = matriz_factores['cache']
+    if clave not in cache:
+        fila = np.array([_resolver_indice_base(matriz_factores, categoria, item, exacto)], dtype=np.int64)
+        if region:
+            fila = matriz_factores['tabla_regional'][fila, codigos_region(matriz_factores, [region])]
+        cache[clave] = int(_filas_vigentes(matriz_factores, fila, clave[4])[0])
+    return cache[clave]
+
+def _resolver_indice_base(matriz_factores, categoria, item, exacto):
+    """Primera coincidencia de (categoría, ítem) sin región, año ni comprobación de validez"""
+    clave = (categoria, item, exacto)
+    cache = matriz_factores['cache']
+    if clave in cache:
+        return cache[clave]
+
+    categoria_lower = str(categoria).lower()
+    candidatos = matriz_factores['items_por_categoria'].get(categoria_lower, [])
+    fila = None
+    if candidatos:
+        if item:
+            item_lower = str(item).strip().lower()
+            if exacto:
+                fila = next((f for f, i in candidatos if i == item_lower), None)
+            else:
+                fila = next((f for f, i in candidatos if item_lower in i), candidatos[0][0])
+        elif not exacto:
+            fila = candidatos[0][0]
+
+    if fila is None:
+        filas_defecto = matriz_factores['filas_defecto']
+        fila = filas_defecto.get(categoria_lower, filas_defecto[''])
+
+    cache[clave] = fila
+    return fila
+
+def _filas_vigentes(matriz_factores, filas, anios):
+    """Versión del factor vigente en cada año y, si no es válida, la fila por defecto"""
+    return matriz_factores['sustitutas'][resolver_anios(matriz_factores['vigencias'], filas, anios)]
+
+def _filas_regionales(matriz_factores, partidas):
+    """
+    Fila de cada partida antes de elegir año: una búsqueda por clave única
+    (categoría, ítem, exacto) y, si las partidas tienen 'region', un único
+    acceso a la tabla regional precalculada para todas ellas.
+    """
+    claves = pd.Series(list(zip(partidas['categoria'], partidas['item'], partidas['exacto'])))
+    codigos, unicas = pd.factorize(claves)
+    indices_unicos = np.array([_resolver_indice_base(matriz_factores, *clave) for clave in unicas], dtype=np.int64)
+    indices = indices_unicos[codigos]
+    if 'region' in partidas.columns:
+        indices = matriz_factores['tabla_regional'][indices, codigos_region(matriz_factores, partidas['region'])]
+    return indices
+
+def resolver_indices(matriz_factores, partidas):
+    """
+    Resuelve el índice de factor de todas las partidas: región (tabla regional),
+    año (búsqueda binaria en las vigencias, columna 'anio') y validez, cada paso
+    vectorizado sobre todas las partidas.
+    """
+    if len(partidas) == 0:
+        return np.zeros(0, dtype=np.int64)
+    anios = partidas['anio'].to_numpy(dtype=np.int64) if 'anio' in partidas.columns else 0
+    return _filas_vigentes(matriz_factores, _filas_regionales(matriz_factores, partidas), anios)
+
+def construir_partidas(datos, factores_df, perfiles=None, asignar_coproductos=True):
+    """
+    Convierte los datos de un producto (estructura de session_state) en la tabla
+    de partidas: una fila por cantidad × factor, con la misma lógica de inclusión
+    que calcular_emisiones_detalladas_completas.
+
+    La 'region' de una partida es la de su materia prima, empaque o producción
+    (clave opcional 'region': país o región); vacía usa el factor sin respaldo regional.
+    El 'anio' es el año de producción del producto (producto['anio']; 0 = sin año).
+    El 'ajuste' corrige el factor anual de la energía de producción y retail según
+    sus perfiles horarios de red y de carga (ver perfiles_horarios); 1.0 sin perfiles.
+    La 'ruta' ("origen → destino") solo es descriptiva y solo la llevan los transportes.
+    Con coproductos, el 'ajuste' de las etapas compartidas lleva además la fracción
+    asignada al producto principal, o se añaden partidas de crédito por sustitución.
+
+    Returns:
+        DataFrame con las columnas COLUMNAS_PARTIDAS; 'cantidad' está en la
+        unidad del factor (kg, ton-km, kWh, m³)
+    """
+    filas = []
+    anio = int((datos.get('producto') or {}).get('anio') or 0)
+
+    def agregar(etapa, fuente, subfuente, categoria, item, cantidad, masa_kg=0.0, exacto=False, region=None,
+                ajuste=1.0, ruta=''):
+        filas.append((etapa, fuente, subfuente, categoria, item or '', exacto,
+                      float(cantidad or 0), float(masa_kg or 0), region or '', anio, ajuste, ruta))
+
+    materias_primas = datos.get('materias_primas') or []
+    empaques = datos.get('empaques') or []
+
+    # 1. Materias primas y sus empaques
+    for materia in materias_primas:
+        if not materia or 'producto' not in materia or not materia.get('producto'):
+            continue
+        cantidad_kg = materia.get('cantidad_real_kg', 0)
+        agregar('materias_primas', materia['producto'], 'material', 'materia_prima',
+                materia['producto'], cantidad_kg, cantidad_kg, region=materia.get('region'))
+        empaque_mp = materia.get('empaque')
+        if empaque_mp and empaque_mp.get('material'):
+            peso_kg = empaque_mp.get('peso_kg', 0)
+            agregar('materias_primas', materia['producto'], 'empaque', 'material_empaque',
+                    empaque_mp['material'], peso_kg, peso_kg, region=materia.get('region'))
+
+    # 2. Empaques del producto
+    for i, empaque in enumerate(empaques):
+        if not empaque or 'material' not in empaque:
+            continue
+        peso_total_kg = empaque.get('peso_kg', 0) * empaque.get('cantidad', 1)
+        agregar('empaques', empaque.get('nombre', f'Empaque {i+1}'), empaque['material'],
+                'material_empaque', empaque['material'], peso_total_kg, peso_total_kg,
+                region=empaque.get('region'))
+
+    # 3. Transporte de materias primas y empaques
+    for origen, elementos, clave_nombre in (('materias_primas', materias_primas, 'producto'),
+                                            ('empaques', empaques, 'nombre')):
+        for elemento in elementos:
+            if not elemento or 'transportes' not in elemento:
+                continue
+            for ruta in elemento.get('transportes', []):
+                if ruta and ruta.get('tipo_transporte') and ruta.get('distancia_km', 0) > 0:
+                    carga_kg = ruta.get('carga_kg', 0)
+                    agregar('transporte', origen, elemento.get(clave_nombre, ''), 'transporte',
+                            ruta['tipo_transporte'], ruta['distancia_km'] * carga_kg / 1000.0, carga_kg,
+                            ruta=f"{ruta.get('origen', '')} → {ruta.get('destino', '')}"
+                            if ruta.get('origen') or ruta.get('destino') else '')
+
+    # 4. Procesamiento
+    produccion = datos.get('produccion') or {}
+    if produccion.get('energia_kwh', 0) > 0:
+        tipo_energia = produccion.get('tipo_energia', 'Red eléctrica promedio')
+        agregar('procesamiento', 'Energía Producción', tipo_energia, 'energia', tipo_energia,
+                produccion['energia_kwh'], region=produccion.get('region'),
+                ajuste=ajuste_horario(produccion, perfiles))
+    if produccion.get('agua_m3', 0) > 0:
+        agregar('procesamiento', 'Agua Producción', 'agua', 'agua', None, produccion['agua_m3'],
+                region=produccion.get('region'))
+
+    # 5. Distribución
+    distribucion = datos.get('distribucion') or {}
+    for canal in distribucion.get('canales') or []:
+        if not (canal and canal.get('nombre') and canal.get('rutas')):
+            continue
+        for ruta in canal['rutas']:
+            if ruta and ruta.get('distancia_km', 0) > 0:
+                tipo = ruta.get('tipo_transporte', 'Camión diesel')
+                carga_kg = ruta.get('carga_kg', 0)
+                agregar('distribucion', f"Distribución {canal['nombre']}", tipo, 'transporte', tipo,
+                        ruta['distancia_km'] * carga_kg / 1000.0, carga_kg)
+
+    # 6. Retail
+    retail = datos.get('retail') or {}
+    try:
+        consumo_retail_kwh = float(retail.get('consumo_energia_kwh', 0))
+    except (ValueError, TypeError):
+        consumo_retail_kwh = 0.0
+    if consumo_retail_kwh > 0:
+        agregar('retail', 'Energía Retail', 'electricidad', 'energia', 'electricidad', consumo_retail_kwh,
+                ajuste=ajuste_horario(retail, perfiles))
+
+    # 7. Uso y fin de vida (un renglón por empaque y tratamiento)
+    uso_fin_vida = datos.get('uso_fin_vida') or {}
+    if uso_fin_vida.get('energia_uso_kwh', 0) > 0:
+        agregar('fin_vida', 'uso', 'energia', 'energia', 'electricidad', uso_fin_vida['energia_uso_kwh'])
+    if uso_fin_vida.get('agua_uso_m3', 0) > 0:
+        agregar('fin_vida', 'uso', 'agua', 'agua', None, uso_fin_vida['agua_uso_m3'])
+
+    items_por_material = {}
+    for gestion in uso_fin_vida.get('gestion_empaques') or []:
+        if not gestion or gestion.get('peso_kg', 0) <= 0:
+            continue
+        material = gestion.get('material', '')
+        if material not in items_por_material:
+            items_por_material[material] = items_tratamiento_material(factores_df, material)
+        porcentajes = gestion.get('porcentajes') or {}
+        for tratamiento in TRATAMIENTOS_FIN_VIDA:
+            fraccion = float(porcentajes.get(f'porcentaje_{tratamiento}', 0) or 0) / 100
+            if fraccion != 0:
+                masa_kg = gestion['peso_kg'] * fraccion
+                agregar('fin_vida', 'fin_vida', gestion.get('nombre_empaque', 'empaque'), 'residuo',
+                        items_por_material[material][tratamiento], masa_kg, masa_kg, exacto=True)
+
+    partidas = pd.DataFrame(filas, columns=COLUMNAS_PARTIDAS)
+
+    # 8. Coproductos: fracción del producto principal o crédito por los productos sustituidos
+    coproductos = leer_coproductos(datos) if asignar_coproductos else None
+    if coproductos is not None:
+        if coproductos['metodo'] == 'sustitucion':
+            partidas = pd.concat([partidas, partidas_credito_coproductos(coproductos, anio)], ignore_index=True)
+        else:
+            fraccion = fracciones_asignacion(coproductos['masas'], coproductos['precios'], coproductos['metodo'])[0]
+            compartidas = partidas['etapa'].isin(coproductos['etapas'])
+            partidas.loc[compartidas, 'ajuste'] = partidas.loc[compartidas, 'ajuste'] * fraccion
+    return partidas
+
+def partidas_credito_coproductos(coproductos, anio=0):
+    """Partidas (negativas) de los productos que sustituye cada coproducto, en procesamiento"""
+    return pd.DataFrame({
+        'etapa': 'procesamiento',
+        'fuente': FUENTE_CREDITO,
+        'subfuente': coproductos['nombres'][1:],
+        'categoria': [categoria for categoria, _ in coproductos['sustituidos']],
+        'item': [item for _, item in coproductos['sustituidos']],
+        'exacto': False,
+        'cantidad': -coproductos['masas'][1:],
+        'masa_kg': 0.0,
+        'region': '',
+        'anio': anio,
+        'ajuste': 1.0,
+        'ruta': ''
+    }, columns=COLUMNAS_PARTIDAS)
+
+def totales_coproductos(datos, factores_df, matriz_factores=None):
+    """
+    Reparte los totales del proceso entre el producto principal y sus coproductos
+    con una matriz de asignación (coproductos × etapas) en una sola operación.
+    Con sustitución, el producto principal recibe el crédito de todos ellos.
+
+    Returns:
+        (nombres, array (coproductos × ETAPAS × categorías)); la fila 0 coincide con
+        los totales de construir_partidas
+    """
+    if matriz_factores is None:
+        matriz_factores = preparar_matriz_factores(factores_df)
+    partidas = construir_partidas(datos, factores_df, asignar_coproductos=False)
+    totales = totales_lote([partidas], factores_df, matriz_factores)[0]
+    coproductos = leer_coproductos(datos)
+    if coproductos is None:
+        return [(datos.get('producto') or {}).get('nombre') or 'Producto principal'], totales[None]
+
+    repartidos = repartir_totales(totales, matriz_asignacion(coproductos, ETAPAS))
+    if coproductos['metodo'] == 'sustitucion':
+        anio = int(partidas['anio'].iloc[0]) if len(partidas) else 0
+        repartidos[0] += totales_lote([partidas_credito_coproductos(coproductos, anio)], factores_df,
+                                      matriz_factores)[0]
+    return coproductos['nombres'], repartidos
+
+def cantidades_efectivas(partidas):
+    """Cantidad de cada partida por la que se multiplica su factor (con el ajuste horario si lo hay)"""
+    cantidades = partidas['cantidad'].to_numpy(dtype=float)
+    if 'ajuste' in partidas.columns:
+        cantidades = cantidades * partidas['ajuste'].to_numpy(dtype=float)
+    return cantidades
+
+def calcular_impactos(partidas, factores_df, matriz_factores=None):
+    """
+    Evalúa todas las categorías de impacto de todas las partidas en una sola
+    operación: cantidad (N×1) ⊙ factores (N×K).
+
+    Returns:
+        Copia de las partidas con 'indice_factor' y una columna por categoría de impacto
+    """
+    if matriz_factores is None:
+        matriz_factores = preparar_matriz_factores(factores_df)
+    indices = resolver_indices(matriz_factores, partidas)
+    impactos = cantidades_efectivas(partidas)[:, None] * matriz_factores['matriz'][indices]
+
+    tabla = partidas.copy()
+    tabla['indice_factor'] = indices
+    for j, clave in enumerate(matriz_factores['categorias']):
+        tabla[clave] = impactos[:, j]
+    return tabla
+
+def calcular_impactos_producto(datos, factores_df, matriz_factores=None):
+    """Atajo: construye las partidas de un producto y evalúa sus impactos"""
+    return calcular_impactos(construir_partidas(datos, factores_df), factores_df, matriz_factores)
+
+def totales_lote(partidas_por_producto, factores_df, matriz_factores=None):
+    """
+    Evalúa varios productos en una sola pasada: partidas concatenadas, una sola
+    resolución de factores y una suma por (producto, etapa).
+
+    Args:
+        partidas_por_producto: lista de tablas de partidas (ver construir_partidas)
+
+    Returns:
+        Array (productos × ETAPAS × categorías) con los totales por etapa
+    """
+    tamanos = [len(p) for p in partidas_por_producto]
+    partidas = pd.concat(partidas_por_producto, ignore_index=True) if sum(tamanos) else None
+    return totales_partidas(partidas, np.repeat(np.arange(len(partidas_por_producto)), tamanos),
+                            len(partidas_por_producto), factores_df, matriz_factores)
+
+def totales_partidas(partidas, productos, n_productos, factores_df, matriz_factores=None):
+    """
+    Totales por (producto, etapa) de una tabla de partidas ya concatenada, con el
+    producto de cada partida en 'productos' (0..n_productos-1).
+
+    Returns:
+        Array (productos × ETAPAS × categorías) con los totales por etapa
+    """
+    if matriz_factores is None:
+        matriz_factores = preparar_matriz_factores(factores_df)
+    totales = np.zeros((n_productos, len(ETAPAS), len(matriz_factores['categorias'])))
+    if partidas is None or len(partidas) == 0:
+        return totales
+
+    impactos = (cantidades_efectivas(partidas)[:, None]
+                * matriz_factores['matriz'][resolver_indices(matriz_factores, partidas)])
+    etapas = pd.Categorical(partidas['etapa'], categories=ETAPAS).codes
+    grupos = np.asarray(productos, dtype=np.int64) * len(ETAPAS) + etapas
+    return sumar_por_grupo(grupos, impactos, totales.shape[0] * len(ETAPAS)).reshape(totales.shape)
+
+def totales_por_anio(partidas_por_producto, factores_df, anios, matriz_factores=None):
+    """
+    Recalcula una cartera para varios años de producción: la búsqueda de cada
+    partida y su región se hace una vez y la versión vigente del factor de todas
+    las partidas en todos los años se resuelve en una sola búsqueda binaria.
+
+    Returns:
+        Array (años × productos × ETAPAS × categorías) con los totales por etapa
+    """
+    if matriz_factores is None:
+        matriz_factores = preparar_matriz_factores(factores_df)
+    anios = np.asarray(list(anios), dtype=np.int64)
+    totales = np.zeros((len(anios), len(partidas_por_producto), len(ETAPAS), len(matriz_factores['categorias'])))
+    tamanos = [len(p) for p in partidas_por_producto]
+    n_partidas = sum(tamanos)
+    if n_partidas == 0 or len(anios) == 0:
+        return totales
+
+    partidas = pd.concat(partidas_por_producto, ignore_index=True)
+    filas = _filas_vigentes(matriz_factores, np.tile(_filas_regionales(matriz_factores, partidas), len(anios)),
+                            np.repeat(anios, n_partidas))
+    impactos = np.tile(cantidades_efectivas(partidas), len(anios))[:, None] * matriz_factores['matriz'][filas]
+    productos = np.repeat(np.arange(len(partidas_por_producto)), tamanos)
+    etapas = pd.Categorical(partidas['etapa'], categories=ETAPAS).codes
+    grupos = ((np.repeat(np.arange(len(anios)), n_partidas) * len(partidas_por_producto)
+               + np.tile(productos, len(anios))) * len(ETAPAS) + np.tile(etapas, len(anios)))
+    return sumar_por_grupo(grupos, impactos, totales[..., 0].size).reshape(totales.shape)
+
+def totales_por_etapa(tabla_impactos, categorias=None):
+    """
+    Suma las columnas de impacto por etapa del ciclo de vida.
+
+    Returns:
+        DataFrame (ETAPAS × categorías)
+    """
+    if categorias is None:
+        categorias = [c for c in tabla_impactos.columns if c not in COLUMNAS_PARTIDAS and c != 'indice_factor']
+    return (tabla_impactos.groupby('etapa')[list(categorias)].sum()
+            .reindex(ETAPAS, fill_value=0.0))
+
+def matriz_gwp(tabla_impactos):
+    """
+    Reorganiza las sub-columnas de GWP de la tabla de impactos como una pequeña
+    matriz por partida.
+
+    Returns:
+        Array (partidas × horizontes × orígenes) en kg CO₂e; las combinaciones sin
+        columna en la tabla de factores quedan en cero
+    """
+    matriz = np.zeros((len(tabla_impactos), len(HORIZONTES_GWP), len(ORIGENES_CARBONO)))
+    for i, horizonte in enumerate(HORIZONTES_GWP):
+        for j, origen in enumerate(ORIGENES_CARBONO):
+            clave = f'{horizonte}_{origen}'
+            if clave in tabla_impactos.columns:
+                matriz[:, i, j] = tabla_impactos[clave].to_numpy(dtype=float)
+    return matriz
+
+def tiene_desglose_gwp(tabla_impactos):
+    """Indica si la tabla de factores usada tenía alguna sub-columna de GWP"""
+    return any(f'{h}_{o}' in tabla_impactos.columns for h in HORIZONTES_GWP for o in ORIGENES_CARBONO)
+
+def desglose_gwp_por_etapa(tabla_impactos):
+    """
+    Desglose fósil / biogénico / cambio de uso de suelo bajo cada horizonte GWP,
+    por etapa. La columna ('gwp100', 'sin_desglose') recoge la parte del total
+    GWP100 (factor_kgCO2e_per_unit) sin sub-columnas en la tabla de factores.
+
+    Returns:
+        DataFrame (ETAPAS × (horizonte, origen))
+    """
+    matriz = matriz_gwp(tabla_impactos)
+    columnas = [(h, o) for h in HORIZONTES_GWP for o in ORIGENES_CARBONO]
+    valores = matriz.reshape(len(tabla_impactos), len(columnas))
+    if 'gwp' in tabla_impactos.columns:
+        # Junto a las columnas de GWP100
+        posicion = (list(HORIZONTES_GWP).index('gwp100') + 1) * len(ORIGENES_CARBONO)
+        columnas.insert(posicion, ('gwp100', 'sin_desglose'))
+        sin_desglose = (tabla_impactos['gwp'].to_numpy(dtype=float)
+                        - matriz[:, list(HORIZONTES_GWP).index('gwp100'), :].sum(axis=1))
+        valores = np.insert(valores, posicion, sin_desglose, axis=1)
+
+    por_etapa = (pd.DataFrame(valores, index=tabla_impactos['etapa'].to_numpy())
+                 .groupby(level=0).sum()
+                 .reindex(ETAPAS, fill_value=0.0))
+    por_etapa.columns = pd.MultiIndex.from_tuples(columnas, names=['horizonte', 'origen'])
+    return por_etapa
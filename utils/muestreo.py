@@ -0,0 +1,132 @@
+"""
+Muestreo por hipercubo latino y cuasi-Monte Carlo (secuencias de Sobol)
+Varias réplicas aleatorizadas independientes dan el error estándar del total y de
+cada etapa; el muestreo se detiene cuando todos quedan por debajo de la tolerancia
+MISMA PRECISIÓN CON MUCHAS MENOS ITERACIONES
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+from scipy.stats import qmc
+from utils.incertidumbre import gsd_modelo
+from utils.motor import ETAPAS
+
+METODOS_MUESTREO = {
+    'sobol': 'Cuasi-Monte Carlo (Sobol aleatorizado)',
+    'lhs': 'Hipercubo latino',
+    'aleatorio': 'Monte Carlo simple'
+}
+
+N_REPLICAS = 8
+LOTE_INICIAL = 64
+TOLERANCIA_DEFECTO = 0.005
+
+def _muestreador(metodo, dimension, rng):
+    """Función n -> muestras uniformes (n × dimension) de una réplica"""
+    if metodo == 'sobol':
+        motor = qmc.Sobol(dimension, scramble=True, rng=rng)
+        return motor.random
+    if metodo == 'lhs':
+        # Cada lote es un hipercubo latino nuevo e independiente
+        return lambda n: qmc.LatinHypercube(dimension, rng=rng).random(n)
+    if metodo == 'aleatorio':
+        return lambda n: rng.random((n, dimension))
+    raise ValueError(f"Método de muestreo no soportado: {metodo}")
+
+def _evaluar_uniformes(u, cantidades, factores, posiciones, sigma_q, sigma_f, por_etapa):
+    """Totales por etapa (n × ETAPAS) de muestras uniformes transformadas a lognormales"""
+    z = ndtri(np.clip(u, 1e-12, 1 - 1e-12))
+    n_partidas = len(cantidades)
+    q = cantidades * np.exp(sigma_q * z[:, :n_partidas])
+    f = factores * np.exp(sigma_f * z[:, n_partidas:])
+    return (q * f[:, posiciones]) @ por_etapa
+
+def simular_adaptativo(modelo, metodo='sobol', tolerancia=TOLERANCIA_DEFECTO, tolerancia_absoluta=0.0,
+                       max_iteraciones=1_000_000, n_replicas=N_REPLICAS, lote_inicial=LOTE_INICIAL,
+                       gsd_cantidades=None, gsd_factores=None, categoria='gwp', semilla=0,
+                       factores_df=None, percentil_control=95, percentiles=(2.5, 5, 50, 95, 97.5)):
+    """
+    Simulación con parada adaptativa.
+
+    Cada ronda duplica las muestras de cada réplica (potencias de 2, que conservan
+    el equilibrio de las secuencias de Sobol). El error estándar se estima con la
+    dispersión de las medias de las réplicas, válido también para QMC, y la
+    simulación termina cuando, para el total y para cada etapa,
+    error estándar <= max(tolerancia · |media|, tolerancia_absoluta), y el error
+    estándar del percentil de control del total (P95 por defecto) cumple la
+    tolerancia relativa.
+
+    Args:
+        metodo: 'sobol', 'lhs' o 'aleatorio' (ver METODOS_MUESTREO)
+        tolerancia: error estándar relativo objetivo
+        max_iteraciones: tope de iteraciones sumando todas las réplicas
+        percentil_control: percentil del total que también debe estabilizarse (None = solo medias)
+
+    Returns:
+        Diccionario con 'metodo', 'n_iteraciones', 'convergido', 'media',
+        'error_estandar', 'desviacion', 'percentiles', 'etapas' (DataFrame con
+        media y error estándar por etapa) e 'historial' de la convergencia
+    """
+    gsd_q_defecto, gsd_f_defecto = gsd_modelo(modelo, factores_df=factores_df)
+    sigma_q = np.log(gsd_q_defecto if gsd_cantidades is None else np.asarray(gsd_cantidades, dtype=float))
+    sigma_f = np.log(gsd_f_defecto if gsd_factores is None else np.asarray(gsd_factores, dtype=float))
+    j = modelo['categorias'].index(categoria)
+    por_etapa = np.zeros((len(modelo['cantidades']), len(ETAPAS)))
+    por_etapa[np.arange(len(modelo['cantidades'])), modelo['etapas']] = 1.0
+    argumentos = (modelo['cantidades'], modelo['factores'][:, j], modelo['posiciones'], sigma_q, sigma_f, por_etapa)
+
+    dimension = max(len(modelo['cantidades']) + len(modelo['factores']), 1)
+    muestreadores = [_muestreador(metodo, dimension, np.random.default_rng(s))
+                     for s in np.random.SeedSequence(semilla).spawn(n_replicas)]
+
+    etapas_por_replica = [[] for _ in range(n_replicas)]
+    historial = []
+    lote = lote_inicial
+    n_por_replica = 0
+    convergido = False
+    while True:
+        for r, muestrear in enumerate(muestreadores):
+            etapas_por_replica[r].append(_evaluar_uniformes(muestrear(lote), *argumentos))
+        n_por_replica += lote
+
+        # Medias por réplica de cada etapa y del total: (réplicas × (ETAPAS + total))
+        medias = np.array([np.concatenate(bloques).mean(axis=0) for bloques in etapas_por_replica])
+        medias = np.column_stack([medias, medias.sum(axis=1)])
+        media = medias.mean(axis=0)
+        error = medias.std(axis=0, ddof=1) / np.sqrt(n_replicas)
+        umbral = np.maximum(tolerancia * np.abs(media), tolerancia_absoluta)
+        cumple = np.all(error <= umbral)
+        registro = {'n_iteraciones': n_por_replica * n_replicas,
+                    'error_relativo_total': error[-1] / abs(media[-1]) if media[-1] else 0.0}
+
+        if percentil_control is not None:
+            cuantiles = np.array([np.percentile(np.concatenate(bloques).sum(axis=1), percentil_control)
+                                  for bloques in etapas_por_replica])
+            error_cuantil = cuantiles.std(ddof=1) / np.sqrt(n_replicas)
+            cumple &= error_cuantil <= max(tolerancia * abs(cuantiles.mean()), tolerancia_absoluta)
+            registro[f'error_relativo_p{percentil_control:g}'] = \
+                error_cuantil / abs(cuantiles.mean()) if cuantiles.mean() else 0.0
+        historial.append(registro)
+
+        if cumple:
+            convergido = True
+            break
+        if 2 * n_por_replica * n_replicas > max_iteraciones:
+            break
+        lote = n_por_replica
+
+    etapas = np.concatenate([np.concatenate(bloques) for bloques in etapas_por_replica])
+    totales = etapas.sum(axis=1)
+    return {
+        'metodo': metodo,
+        'n_iteraciones': len(totales),
+        'convergido': convergido,
+        'media': float(media[-1]),
+        'error_estandar': float(error[-1]),
+        'desviacion': float(totales.std(ddof=1)),
+        'percentiles': dict(zip(percentiles, np.percentile(totales, percentiles).tolist())),
+        'etapas': pd.DataFrame({'media': media[:-1], 'error_estandar': error[:-1]},
+                               index=pd.Index(ETAPAS, name='etapa')),
+        'historial': pd.DataFrame(historial)
+    }
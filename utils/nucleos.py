@@ -0,0 +1,133 @@
+"""
+Núcleos numéricos de los bucles más pesados del motor
+Suma por grupos (producto, etapa), fin de vida con porcentajes dispersos y
+acumulación de los totales de Monte Carlo. Con Numba instalado se compilan
+(JIT); sin él, o con CLEARPRINT_NUMBA=0, se usan las versiones NumPy
+MISMOS RESULTADOS CON Y SIN NUMBA
+"""
+
+import os
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # dependencia opcional: sin ella se usan las versiones NumPy
+    numba = None
+
+NUMBA_DISPONIBLE = numba is not None
+_estado = {'numba': NUMBA_DISPONIBLE and os.environ.get('CLEARPRINT_NUMBA', '1') != '0'}
+
+def usar_numba(activar=True):
+    """
+    Activa o desactiva los núcleos compilados con Numba.
+
+    Returns:
+        El estado anterior (para restaurarlo)
+    """
+    if activar and not NUMBA_DISPONIBLE:
+        raise ImportError("Los núcleos compilados necesitan numba: pip install numba")
+    anterior = _estado['numba']
+    _estado['numba'] = bool(activar)
+    return anterior
+
+def numba_activo():
+    return _estado['numba']
+
+# --- Versiones en Python puro: Numba las compila; sin Numba no se usan ---
+
+def _sumar_por_grupo_bucle(grupos, valores, n_grupos):
+    totales = np.zeros((n_grupos, valores.shape[1]))
+    for i in range(valores.shape[0]):
+        for k in range(valores.shape[1]):
+            totales[grupos[i], k] += valores[i, k]
+    return totales
+
+def _fin_vida_bucle(masas, porcentajes, factores_material, materiales):
+    emisiones = np.zeros(masas.shape[0])
+    for i in range(masas.shape[0]):
+        suma = 0.0
+        for t in range(porcentajes.shape[1]):
+            if porcentajes[i, t] != 0.0:
+                suma += porcentajes[i, t] * factores_material[materiales[i], t]
+        emisiones[i] = masas[i] * suma
+    return emisiones
+
+def _totales_montecarlo_bucle(cantidades, factores, posiciones, sigma_cantidades, sigma_factores,
+                              normales_cantidades, normales_factores):
+    n, n_partidas = normales_cantidades.shape
+    totales = np.zeros(n)
+    factor_muestra = np.empty(factores.shape[0])
+    for s in range(n):
+        for j in range(factores.shape[0]):
+            factor_muestra[j] = factores[j] * np.exp(sigma_factores[j] * normales_factores[s, j])
+        suma = 0.0
+        for i in range(n_partidas):
+            suma += cantidades[i] * np.exp(sigma_cantidades[i] * normales_cantidades[s, i]) * factor_muestra[posiciones[i]]
+        totales[s] = suma
+    return totales
+
+if NUMBA_DISPONIBLE:
+    _sumar_por_grupo_jit = numba.njit(cache=True)(_sumar_por_grupo_bucle)
+    _fin_vida_jit = numba.njit(cache=True)(_fin_vida_bucle)
+    _totales_montecarlo_jit = numba.njit(cache=True)(_totales_montecarlo_bucle)
+
+# --- API ---
+
+def sumar_por_grupo(grupos, valores, n_grupos):
+    """
+    Suma las filas de `valores` (N × K) por grupo (0..n_grupos-1), en el orden
+    de las filas.
+
+    Returns:
+        Array (n_grupos × K)
+    """
+    grupos = np.ascontiguousarray(grupos, dtype=np.int64)
+    valores = np.ascontiguousarray(valores, dtype=float)
+    if _estado['numba']:
+        return _sumar_por_grupo_jit(grupos, valores, n_grupos)
+    totales = np.zeros((n_grupos, valores.shape[1]))
+    np.add.at(totales, grupos, valores)
+    return totales
+
+def emisiones_fin_vida(masas_kg, matriz_porcentajes, factores_material, materiales):
+    """
+    Emisiones de fin de vida de N empaques: masa × Σ porcentaje × factor del
+    tratamiento para su material. El núcleo compilado solo visita los
+    porcentajes distintos de cero y no copia la matriz de factores por empaque.
+
+    Args:
+        factores_material: matriz (materiales × tratamientos)
+        materiales: fila de factores_material de cada empaque
+
+    Returns:
+        Vector (N,) de emisiones en kg CO₂e
+    """
+    masas_kg = np.ascontiguousarray(masas_kg, dtype=float)
+    matriz_porcentajes = np.ascontiguousarray(matriz_porcentajes, dtype=float)
+    materiales = np.ascontiguousarray(materiales, dtype=np.int64)
+    if _estado['numba']:
+        return _fin_vida_jit(masas_kg, matriz_porcentajes, np.ascontiguousarray(factores_material, dtype=float),
+                             materiales)
+    return masas_kg * np.einsum('ij,ij->i', matriz_porcentajes, factores_material[materiales])
+
+def totales_montecarlo(cantidades, factores, posiciones, sigma_cantidades, sigma_factores,
+                       normales_cantidades, normales_factores):
+    """
+    Total de cada iteración con cantidades y factores lognormales a partir de
+    sus normales estándar (n × partidas y n × factores). El núcleo compilado
+    acumula iteración a iteración sin matrices intermedias (n × partidas).
+
+    Returns:
+        Vector (n,) de totales
+    """
+    if _estado['numba']:
+        return _totales_montecarlo_jit(
+            np.ascontiguousarray(cantidades, dtype=float), np.ascontiguousarray(factores, dtype=float),
+            np.ascontiguousarray(posiciones, dtype=np.int64),
+            np.ascontiguousarray(np.broadcast_to(sigma_cantidades, np.shape(cantidades)), dtype=float),
+            np.ascontiguousarray(np.broadcast_to(sigma_factores, np.shape(factores)), dtype=float),
+            np.ascontiguousarray(normales_cantidades, dtype=float),
+            np.ascontiguousarray(normales_factores, dtype=float))
+    q = cantidades * np.exp(sigma_cantidades * normales_cantidades)
+    f = factores * np.exp(sigma_factores * normales_factores)
+    return (q * f[:, posiciones]).sum(axis=1)
@@ -0,0 +1,369 @@
+"""
+Optimizador de sustituciones para reducir la huella
+Cada partida sustituible (material de empaque, modo de transporte, fuente de
+energía y, si se permite, materia prima) es una decisión con varias opciones de
+factors.csv; el conjunto se resuelve como programa entero mixto con HiGHS
+FRONTERA DE PARETO HUELLA × NÚMERO DE CAMBIOS
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import csr_matrix
+from utils.calculos import TRATAMIENTOS_FIN_VIDA, items_tratamiento_material
+from utils.motor import resolver_indice
+
+# Partidas sustituibles por defecto: (etapa, categoría de factor)
+DECISIONES_SUSTITUCION = [
+    ('materias_primas', 'material_empaque'),
+    ('empaques', 'material_empaque'),
+    ('transporte', 'transporte'),
+    ('distribucion', 'transporte'),
+    ('procesamiento', 'energia')
+]
+
+# Categorías cuyas alternativas por defecto se limitan a la misma subcategoría
+# (un camión se sustituye por otro vehículo terrestre, la electricidad por otra electricidad)
+MISMA_SUBCATEGORIA = {'transporte', 'energia'}
+
+def _items_categoria(factores_df, categoria):
+    """Ítems y subcategoría de cada fila de una categoría de factores.csv"""
+    filas = factores_df[factores_df['category'].astype(str).str.lower() == categoria]
+    return list(zip(filas['item'].astype(str), filas['subcategory'].astype(str).str.lower()))
+
+def _opciones_por_defecto(factores_df, categoria, actual):
+    """Alternativas de una partida cuando el usuario no las restringe"""
+    items = _items_categoria(factores_df, categoria)
+    if categoria not in MISMA_SUBCATEGORIA:
+        return [item for item, _ in items]
+    subcategoria = next((s for item, s in items if item.lower() == str(actual).lower()), None)
+    if subcategoria is None:
+        subcategoria = next((s for item, s in items if str(actual).lower() in item.lower()), None)
+    return [item for item, s in items if s == subcategoria]
+
+def construir_decisiones(modelo, matriz_factores, factores_df, permitidas=None, bloqueadas=None,
+                         costos=None, masa_relativa=None, tipos=None, categoria='gwp'):
+    """
+    Decisiones de sustitución del producto y el valor de cada opción.
+
+    La opción 0 es siempre el ítem actual. Cambiar el material de un empaque del
+    producto también cambia los factores de sus partidas de fin de vida.
+
+    Args:
+        modelo: modelo compilado del producto
+        permitidas: {categoria de factor: [ítems]} que restringe las alternativas;
+            incluir 'materia_prima' habilita la sustitución de ingredientes
+        bloqueadas: ítems actuales o fuentes (nombre de materia prima, empaque,
+            canal) que no se pueden cambiar
+        costos: {ítem: coste por unidad del factor (kg, t-km, kWh)}
+        masa_relativa: {material: masa relativa para cumplir la misma función}
+        tipos: lista de (etapa, categoria de factor) sustituibles (por defecto
+            DECISIONES_SUSTITUCION)
+
+    Returns:
+        Lista de decisiones {'etapa', 'fuente', 'subfuente', 'categoria', 'opciones',
+        'huella', 'costo', 'masa'} con un valor por opción
+    """
+    permitidas = permitidas or {}
+    bloqueadas = set(bloqueadas or [])
+    costos = costos or {}
+    masa_relativa = masa_relativa or {}
+    partidas = modelo['partidas']
+    cantidades = modelo['cantidades']
+    j = modelo['categorias'].index(categoria)
+    factor_actual = modelo['factores'][modelo['posiciones'], j]
+    matriz = matriz_factores['matriz']
+
+    decisiones_permitidas = list(DECISIONES_SUSTITUCION if tipos is None else tipos)
+    if 'materia_prima' in permitidas:
+        decisiones_permitidas.append(('materias_primas', 'materia_prima'))
+
+    # Partidas de fin de vida de cada empaque del producto: (índice, tratamiento)
+    fin_vida = partidas[(partidas['etapa'] == 'fin_vida') & (partidas['categoria'] == 'residuo')]
+    items_por_material = {}
+
+    def tratamientos(material):
+        if material not in items_por_material:
+            items_por_material[material] = items_tratamiento_material(factores_df, material)
+        return items_por_material[material]
+
+    # Las alternativas se resuelven en la región y el año de la partida, como su factor actual
+    columnas_factor = {columna: partidas[columna].tolist() for columna in ('region', 'anio') if columna in partidas.columns}
+
+    def region_anio(k):
+        return {columna: valores[k] for columna, valores in columnas_factor.items()}
+
+    opciones_por_partida = {}
+
+    def opciones_defecto(categoria, actual):
+        if (categoria, actual) not in opciones_por_partida:
+            opciones_por_partida[categoria, actual] = _opciones_por_defecto(factores_df, categoria, actual)
+        return opciones_por_partida[categoria, actual]
+
+    decisiones = []
+    for i, partida in partidas.iterrows():
+        if (partida['etapa'], partida['categoria']) not in decisiones_permitidas:
+            continue
+        if partida['item'] in bloqueadas or partida['fuente'] in bloqueadas or partida['subfuente'] in bloqueadas:
+            continue
+        actual = partida['item']
+        opciones = permitidas.get(partida['categoria']) or opciones_defecto(partida['categoria'], actual)
+        opciones = [actual] + [o for o in opciones if str(o).lower() != str(actual).lower()]
+        if len(opciones) == 1:
+            continue
+
+        masa_base = masa_relativa.get(actual, 1.0)
+        escala = np.array([masa_relativa.get(o, 1.0) / masa_base for o in opciones])
+        factores = np.array([factor_actual[i]] + [
+            matriz[resolver_indice(matriz_factores, partida['categoria'], o, **region_anio(i)), j]
+            for o in opciones[1:]])
+        huella = cantidades[i] * escala * factores
+        costo = cantidades[i] * escala * np.array([float(costos.get(o, 0.0)) for o in opciones])
+        masa = partida['masa_kg'] * escala
+
+        # El material de un empaque del producto arrastra su fin de vida
+        if partida['etapa'] == 'empaques':
+            items_actuales = tratamientos(actual)
+            for k in fin_vida.index[fin_vida['subfuente'] == partida['fuente']]:
+                tratamiento = next((t for t in TRATAMIENTOS_FIN_VIDA if items_actuales[t] == partidas.at[k, 'item']), None)
+                if tratamiento is None:
+                    continue
+                huella = huella + cantidades[k] * escala * np.array([factor_actual[k]] + [
+                    matriz[resolver_indice(matriz_factores, 'residuo', tratamientos(o)[tratamiento], exacto=True,
+                                           **region_anio(k)), j]
+                    for o in opciones[1:]])
+
+        decisiones.append({
+            'partida': i,
+            'etapa': partida['etapa'],
+            'fuente': partida['fuente'],
+            'subfuente': partida['subfuente'],
+            'categoria': partida['categoria'],
+            'opciones': opciones,
+            'huella': huella,
+            'costo': costo,
+            'masa': masa
+        })
+    return decisiones
+
+def _resolver(decisiones, max_cambios=None, huella_maxima=None, presupuesto=None, incremento_masa_kg=None,
+              objetivo='huella', desempate=True):
+    """
+    Programa entero: una variable binaria por (decisión, opción), exactamente una
+    opción por decisión. Devuelve la opción elegida en cada decisión o None si
+    no hay solución factible. Con desempate, entre las soluciones óptimas la de
+    menos cambios (un segundo programa entero).
+    """
+    tamanos = [len(d['opciones']) for d in decisiones]
+    inicio = np.concatenate([[0], np.cumsum(tamanos)])
+    n = int(inicio[-1])
+    huella = np.concatenate([d['huella'] for d in decisiones])
+    costo = np.concatenate([d['costo'] - d['costo'][0] for d in decisiones])
+    masa = np.concatenate([d['masa'] - d['masa'][0] for d in decisiones])
+    es_cambio = np.ones(n)
+    es_cambio[inicio[:-1]] = 0.0
+
+    filas = np.repeat(np.arange(len(decisiones)), tamanos)
+    restricciones = [LinearConstraint(csr_matrix((np.ones(n), (filas, np.arange(n))), shape=(len(decisiones), n)), 1, 1)]
+    if max_cambios is not None:
+        restricciones.append(LinearConstraint(es_cambio[None, :], 0, max_cambios))
+    if huella_maxima is not None:
+        restricciones.append(LinearConstraint(huella[None, :], -np.inf, huella_maxima))
+    if presupuesto is not None:
+        restricciones.append(LinearConstraint(costo[None, :], -np.inf, presupuesto))
+    if incremento_masa_kg is not None:
+        restricciones.append(LinearConstraint(masa[None, :], -np.inf, incremento_masa_kg))
+
+    c = huella if objetivo == 'huella' else costo
+    argumentos = dict(integrality=np.ones(n), bounds=Bounds(0, 1), options={'mip_rel_gap': 0})
+    solucion = milp(c, constraints=restricciones, **argumentos)
+    if solucion.x is None:
+        return None
+    if not desempate:
+        return [int(np.argmax(solucion.x[a:b])) for a, b in zip(inicio[:-1], inicio[1:])]
+
+    # Desempate lexicográfico: entre las soluciones óptimas, la de menos cambios
+    holgura = 1e-9 * max(1.0, abs(solucion.fun))
+    restricciones.append(LinearConstraint(c[None, :], -np.inf, solucion.fun + holgura))
+    desempate = milp(es_cambio, constraints=restricciones, **argumentos)
+    if desempate.x is not None:
+        solucion = desempate
+    return [int(np.argmax(solucion.x[a:b])) for a, b in zip(inicio[:-1], inicio[1:])]
+
+def _plan(modelo, decisiones, elegidas, categoria):
+    """Resumen de una solución: huella total, coste y masa adicionales y tabla de cambios"""
+    j = modelo['categorias'].index(categoria)
+    total_actual = float(modelo['totales_etapa'][:, j].sum())
+    huella = total_actual + float(sum(d['huella'][o] - d['huella'][0] for d, o in zip(decisiones, elegidas)))
+    cambios = pd.DataFrame([{
+        'etapa': d['etapa'],
+        'fuente': d['fuente'],
+        'subfuente': d['subfuente'],
+        'actual': d['opciones'][0],
+        'nuevo': d['opciones'][o],
+        'reduccion': d['huella'][0] - d['huella'][o],
+        'costo_adicional': d['costo'][o] - d['costo'][0]
+    } for d, o in zip(decisiones, elegidas) if o != 0],
+        columns=['etapa', 'fuente', 'subfuente', 'actual', 'nuevo', 'reduccion', 'costo_adicional'])
+    return {
+        'cambios': len(cambios),
+        'huella': huella,
+        'reduccion_pct': (total_actual - huella) / total_actual * 100 if total_actual else 0.0,
+        'costo_adicional': float(cambios['costo_adicional'].sum()),
+        'incremento_masa_kg': float(sum(d['masa'][o] - d['masa'][0] for d, o in zip(decisiones, elegidas))),
+        'detalle': cambios.sort_values('reduccion', ascending=False).reset_index(drop=True)
+    }
+
+def optimizar_sustituciones(modelo, matriz_factores, factores_df, decisiones=None, max_cambios=None,
+                            reduccion_objetivo_pct=None, presupuesto=None, incremento_masa_kg=None,
+                            objetivo='huella', categoria='gwp', **opciones_decisiones):
+    """
+    Mejor conjunto de sustituciones con las restricciones del usuario.
+
+    Con objetivo='huella' minimiza la huella; con objetivo='costo' minimiza el
+    coste adicional para alcanzar reduccion_objetivo_pct ("la forma más barata de
+    reducir un 20 %").
+
+    Args:
+        decisiones: decisiones ya construidas (si no, construir_decisiones con
+            **opciones_decisiones)
+        presupuesto: coste adicional máximo
+        incremento_masa_kg: aumento máximo de masa de las partidas sustituidas
+            (0 = no aumentar la masa de empaques)
+
+    Returns:
+        Plan ('cambios', 'huella', 'reduccion_pct', 'costo_adicional', 'incremento_masa_kg',
+        'detalle') o None si las restricciones no tienen solución
+    """
+    if decisiones is None:
+        decisiones = construir_decisiones(modelo, matriz_factores, factores_df, categoria=categoria,
+                                          **opciones_decisiones)
+    if not decisiones:
+        return _plan(modelo, [], [], categoria)
+
+    huella_maxima = None
+    if reduccion_objetivo_pct is not None:
+        total_actual = float(modelo['totales_etapa'][:, modelo['categorias'].index(categoria)].sum())
+        base = sum(d['huella'][0] for d in decisiones)
+        huella_maxima = base - total_actual * reduccion_objetivo_pct / 100
+
+    elegidas = _resolver(decisiones, max_cambios, huella_maxima, presupuesto, incremento_masa_kg, objetivo)
+    return None if elegidas is None else _plan(modelo, decisiones, elegidas, categoria)
+
+def frontera_pareto(modelo, matriz_factores, factores_df, presupuesto=None, incremento_masa_kg=None,
+                    categoria='gwp', **opciones_decisiones):
+    """
+    Frontera de Pareto huella × número de cambios: para k = 0, 1, 2... la menor
+    huella alcanzable cambiando como mucho k partidas, hasta el óptimo sin límite.
+
+    Sin presupuesto ni límite de masa las decisiones son independientes y la
+    frontera es exacta ordenando el mayor ahorro de cada una (sin programa
+    entero). Con esas restricciones, los puntos de esa frontera que las cumplen
+    siguen siendo óptimos y el programa entero solo se resuelve, por bisección,
+    en los k donde no las cumplen.
+
+    Returns:
+        DataFrame con una fila por punto ('cambios', 'huella', 'reduccion_pct',
+        'costo_adicional', 'incremento_masa_kg', 'detalle')
+    """
+    decisiones = construir_decisiones(modelo, matriz_factores, factores_df, categoria=categoria,
+                                      **opciones_decisiones)
+    puntos = _frontera_ordenada(modelo, decisiones, categoria)
+    if presupuesto is not None or incremento_masa_kg is not None:
+        puntos = _frontera_biseccion(modelo, decisiones, puntos, presupuesto, incremento_masa_kg, categoria)
+    return pd.DataFrame(puntos, columns=['cambios', 'huella', 'reduccion_pct', 'costo_adicional',
+                                         'incremento_masa_kg', 'detalle'])
+
+def _frontera_ordenada(modelo, decisiones, categoria):
+    """Frontera sin restricciones acopladas: los k mayores ahorros, cada uno con la mejor opción de su decisión"""
+    mejores = [int(np.argmin(d['huella'])) for d in decisiones]
+    ahorros = np.array([d['huella'][0] - d['huella'][o] for d, o in zip(decisiones, mejores)])
+    holgura = 1e-12 * max(1.0, float(np.abs(ahorros).max(initial=0.0)))
+    orden = [i for i in np.argsort(-ahorros, kind='stable') if ahorros[i] > holgura]
+
+    elegidas = [0] * len(decisiones)
+    puntos = [_plan(modelo, decisiones, elegidas, categoria)]
+    for i in orden:
+        elegidas[i] = mejores[i]
+        puntos.append(_plan(modelo, decisiones, elegidas, categoria))
+    return puntos
+
+def _opciones_eficientes(decision):
+    """
+    La decisión sin las opciones dominadas: otra opción tiene huella, coste y masa
+    menores o iguales (la opción actual se conserva siempre). Cambiar una opción
+    dominada por la que la domina no empeora ninguna restricción ni añade cambios,
+    así que el óptimo de cada k no cambia y el programa entero es mucho menor.
+    """
+    valores = np.column_stack([decision['huella'], decision['costo'], decision['masa']])
+    conservar = [0]
+    for o in range(1, len(valores)):
+        dominada = any(np.all(valores[otra] <= valores[o]) and (otra < o or np.any(valores[otra] < valores[o]))
+                       for otra in range(len(valores)) if otra != o)
+        if not dominada:
+            conservar.append(o)
+    if len(conservar) == len(valores):
+        return decision
+    return dict(decision, opciones=[decision['opciones'][o] for o in conservar],
+                **{clave: decision[clave][conservar] for clave in ('huella', 'costo', 'masa')})
+
+def _frontera_biseccion(modelo, decisiones, puntos_ordenados, presupuesto, incremento_masa_kg, categoria):
+    """
+    Frontera con presupuesto o límite de masa. Los puntos de la frontera sin
+    restricciones que las cumplen son óptimos (su huella es una cota inferior).
+    Para el resto se usa que la huella mínima con k cambios no crece con k y que
+    el plan de k con c ≤ k cambios también es el de c: entre dos k con la misma
+    huella no hay puntos nuevos, así que solo se resuelven los intervalos donde
+    la huella baja.
+    """
+    def cumple(plan):
+        return ((presupuesto is None or plan['costo_adicional'] <= presupuesto + 1e-9)
+                and (incremento_masa_kg is None or plan['incremento_masa_kg'] <= incremento_masa_kg + 1e-9))
+
+    planes = {plan['cambios']: plan for plan in puntos_ordenados if cumple(plan)}
+    eficientes = [_opciones_eficientes(d) for d in decisiones]
+
+    # Sin desempate: el plan de un k donde la huella baja ya tiene exactamente k cambios
+    def resolver(k=None):
+        elegidas = _resolver(eficientes, k, None, presupuesto, incremento_masa_kg, desempate=False)
+        plan = None if elegidas is None else _plan(modelo, eficientes, elegidas, categoria)
+        if k is not None:
+            planes[k] = plan
+        if plan is not None:
+            planes[plan['cambios']] = plan
+        return plan
+
+    def huella(k):
+        return np.inf if planes[k] is None else planes[k]['huella']
+
+    def barrer(menor, mayor):
+        if mayor - menor <= 1 or huella(menor) <= huella(mayor) + 1e-12:
+            return
+        medio = (menor + mayor) // 2
+        if medio in planes:
+            barrer(menor, medio)
+        else:
+            plan = resolver(medio)
+            barrer(menor, medio if plan is None else plan['cambios'])
+        barrer(medio, mayor)
+
+    ultimo = len(puntos_ordenados) - 1
+    if ultimo not in planes:
+        optimo = resolver()
+        if optimo is None:
+            return []
+        ultimo = optimo['cambios']
+    if 0 not in planes:
+        resolver(0)
+    conocidos = [k for k in sorted(planes) if k <= ultimo]
+    for menor, mayor in zip(conocidos[:-1], conocidos[1:]):
+        barrer(menor, mayor)
+
+    puntos = []
+    for k in sorted(planes):
+        plan = planes[k]
+        if k > ultimo:
+            break
+        if plan is not None and plan['cambios'] == k and (not puntos or plan['huella'] < puntos[-1]['huella'] - 1e-12):
+            puntos.append(plan)
+    return puntos
@@ -0,0 +1,123 @@
+"""
+Perfiles horarios (8.760 h) de intensidad de la red y de carga de las instalaciones
+La energía de producción y retail se pondera por la intensidad de la red en las
+horas en que realmente se consume (turnos de noche, autoconsumo solar, horario comercial)
+PERFILES EN FLOAT32 MAPEABLES EN MEMORIA
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+
+HORAS_ANIO = 8760
+
+# Perfiles guardados: matriz (perfiles × 8.760) float32 en .npy y sus nombres en .json
+RUTA_PERFILES_DEFECTO = os.path.join(os.path.dirname(__file__), '..', 'data', 'perfiles_horarios')
+
+# Bloques de energía de un producto que pueden llevar perfiles horarios
+BLOQUES_CON_PERFIL = ('produccion', 'retail')
+
+# Hora del día y día de la semana de cada hora del año (el año empieza en lunes)
+_HORA = np.arange(HORAS_ANIO) % 24
+_DIA = (np.arange(HORAS_ANIO) // 24) % 7
+
+# Perfiles de carga por turno (1 = hora con consumo, repartido a partes iguales)
+PERFILES_CARGA = {
+    'Continuo 24/7': np.ones(HORAS_ANIO, dtype=np.float32),
+    'Turno diurno (6-22 h, lun-vie)': ((_HORA >= 6) & (_HORA < 22) & (_DIA < 5)).astype(np.float32),
+    'Turno nocturno (22-6 h)': ((_HORA >= 22) | (_HORA < 6)).astype(np.float32),
+    'Horario comercial (9-21 h, lun-sáb)': ((_HORA >= 9) & (_HORA < 21) & (_DIA < 6)).astype(np.float32)
+}
+
+def guardar_perfiles(perfiles, ruta=RUTA_PERFILES_DEFECTO):
+    """Guarda {nombre: 8.760 valores} como matriz float32 (ruta.npy) y sus nombres (ruta.json)"""
+    nombres = list(perfiles)
+    matriz = np.zeros((len(nombres), HORAS_ANIO), dtype=np.float32)
+    for i, nombre in enumerate(nombres):
+        valores = np.asarray(perfiles[nombre], dtype=np.float32)
+        if valores.shape != (HORAS_ANIO,):
+            raise ValueError(f"El perfil '{nombre}' debe tener {HORAS_ANIO} valores horarios")
+        matriz[i] = valores
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    np.save(f'{ruta}.npy', matriz)
+    with open(f'{ruta}.json', 'w', encoding='utf-8') as archivo:
+        json.dump(nombres, archivo, ensure_ascii=False)
+
+def cargar_perfiles(ruta=None):
+    """
+    Perfiles guardados (por defecto RUTA_PERFILES_DEFECTO) mapeados en memoria: solo
+    se leen del disco las horas de los perfiles que se usan. Sin archivo de perfiles
+    devuelve una colección vacía.
+    """
+    ruta = ruta or RUTA_PERFILES_DEFECTO
+    if not os.path.exists(f'{ruta}.npy'):
+        return {'nombres': [], 'indice': {}, 'matriz': np.zeros((0, HORAS_ANIO), dtype=np.float32)}
+    with open(f'{ruta}.json', encoding='utf-8') as archivo:
+        nombres = json.load(archivo)
+    return {'nombres': nombres, 'indice': {n: i for i, n in enumerate(nombres)},
+            'matriz': np.load(f'{ruta}.npy', mmap_mode='r')}
+
+def _fila_perfil(nombre, perfiles, incluir_carga=False):
+    """Valores horarios de un perfil guardado (o de carga por turno); None si no existe"""
+    if incluir_carga and nombre in PERFILES_CARGA:
+        return PERFILES_CARGA[nombre]
+    if nombre in perfiles['indice']:
+        return perfiles['matriz'][perfiles['indice'][nombre]]
+    return None
+
+def emisiones_horarias(energia_kwh, intensidades, cargas):
+    """
+    kg CO2e de cada instalación: energía × Σₕ cargaₕ·intensidadₕ / Σₕ cargaₕ,
+    un producto punto por instalación sobre matrices (instalaciones × 8.760).
+    """
+    ponderadas = np.einsum('fh,fh->f', cargas, intensidades, dtype=np.float64)
+    totales_carga = cargas.sum(axis=1, dtype=np.float64)
+    intensidad = np.divide(ponderadas, totales_carga, out=np.zeros_like(ponderadas), where=totales_carga > 0)
+    return np.asarray(energia_kwh, dtype=float) * intensidad
+
+def ajustes_horarios(perfiles_red, perfiles_carga, perfiles=None):
+    """
+    Corrección temporal de cada instalación: intensidad de la red ponderada por su
+    carga / intensidad media anual de esa red. Multiplica el factor anual de
+    factors.csv (que ya recoge región y año). Instalaciones sin perfiles: 1.0.
+    """
+    if perfiles is None:
+        perfiles = cargar_perfiles()
+    ajustes = np.ones(len(perfiles_red))
+    con_perfil, intensidades, cargas = [], [], []
+    for i, (red, carga) in enumerate(zip(perfiles_red, perfiles_carga)):
+        fila_red = _fila_perfil(red, perfiles) if red else None
+        fila_carga = _fila_perfil(carga, perfiles, incluir_carga=True) if carga else None
+        if fila_red is not None and fila_carga is not None:
+            con_perfil.append(i)
+            intensidades.append(fila_red)
+            cargas.append(fila_carga)
+    if not con_perfil:
+        return ajustes
+
+    intensidades, cargas = np.vstack(intensidades), np.vstack(cargas)
+    medias = intensidades.mean(axis=1, dtype=np.float64)
+    horarias = emisiones_horarias(1.0, intensidades, cargas)
+    ajustes[con_perfil] = np.divide(horarias, medias, out=np.ones_like(horarias), where=medias > 0)
+    return ajustes
+
+def ajuste_horario(datos_energia, perfiles=None):
+    """Corrección temporal de un bloque de energía con claves 'perfil_red' y 'perfil_carga'"""
+    datos_energia = datos_energia or {}
+    if not (datos_energia.get('perfil_red') and datos_energia.get('perfil_carga')):
+        return 1.0
+    return float(ajustes_horarios([datos_energia.get('perfil_red')], [datos_energia.get('perfil_carga')], perfiles)[0])
+
+def usa_perfiles(datos):
+    """True si algún bloque de energía del producto tiene perfil de red y de carga"""
+    return any((datos.get(bloque) or {}).get('perfil_red') and (datos.get(bloque) or {}).get('perfil_carga')
+               for bloque in BLOQUES_CON_PERFIL)
+
+def version_perfiles(perfiles=None):
+    """Versión de una colección de perfiles (por defecto, la del archivo): hash de sus nombres y valores"""
+    if perfiles is None:
+        perfiles = cargar_perfiles()
+    contenido = hashlib.sha256(json.dumps(perfiles['nombres'], ensure_ascii=False).encode('utf-8'))
+    contenido.update(np.ascontiguousarray(perfiles['matriz'], dtype=np.float32).tobytes())
+    return contenido.hexdigest()[:16]
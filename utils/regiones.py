@@ -0,0 +1,98 @@
+"""
+Regiones de los factores de emisión y cadenas de respaldo
+Un factor se busca primero para el país, luego para su región y por último Global;
+las cadenas se precalculan en una tabla plana al preparar la matriz de factores
+PAÍS → REGIÓN → GLOBAL
+"""
+
+import numpy as np
+import pandas as pd
+
+REGION_GLOBAL = 'Global'
+
+# Región de la que depende cada país o región (la raíz es Global)
+REGION_PADRE = {
+    'UE': REGION_GLOBAL,
+    'Latinoamérica': REGION_GLOBAL,
+    'Norteamérica': REGION_GLOBAL,
+    'Asia-Pacífico': REGION_GLOBAL,
+    'África': REGION_GLOBAL,
+    'Alemania': 'UE',
+    'España': 'UE',
+    'Francia': 'UE',
+    'Italia': 'UE',
+    'Países Bajos': 'UE',
+    'Polonia': 'UE',
+    'Portugal': 'UE',
+    'Argentina': 'Latinoamérica',
+    'Brasil': 'Latinoamérica',
+    'Chile': 'Latinoamérica',
+    'Colombia': 'Latinoamérica',
+    'México': 'Latinoamérica',
+    'Perú': 'Latinoamérica',
+    'Uruguay': 'Latinoamérica',
+    'Canadá': 'Norteamérica',
+    'Estados Unidos': 'Norteamérica',
+    'Australia': 'Asia-Pacífico',
+    'China': 'Asia-Pacífico',
+    'India': 'Asia-Pacífico',
+    'Japón': 'Asia-Pacífico',
+    'Nueva Zelanda': 'Asia-Pacífico',
+    'Sudáfrica': 'África'
+}
+
+def cadena_regiones(region, padres=REGION_PADRE):
+    """Regiones en orden de preferencia para un país o región: [región, ..., Global]"""
+    cadena = []
+    while region and region not in cadena:
+        cadena.append(region)
+        region = padres.get(region, REGION_GLOBAL)
+    if REGION_GLOBAL not in cadena:
+        cadena.append(REGION_GLOBAL)
+    return cadena
+
+def regiones_conocidas(factores_df, padres=REGION_PADRE):
+    """Regiones de la tabla de factores más las de la jerarquía, con Global primero"""
+    regiones = [REGION_GLOBAL] + list(padres) + list(padres.values())
+    if 'region' in factores_df.columns:
+        regiones += factores_df['region'].dropna().astype(str).tolist()
+    return list(dict.fromkeys(regiones))
+
+def tabla_regional(factores_df, regiones, n_filas_matriz, padres=REGION_PADRE):
+    """
+    Tabla plana (filas de la matriz × (regiones + 1)): para cada fila y región
+    pedida, la fila del mismo ítem cuya región aparece antes en la cadena de
+    respaldo. La última columna (sin región) deja la fila sin cambios, igual que
+    sin filas regionales para el ítem. La validez del factor elegido se comprueba
+    después, al resolver las partidas.
+    """
+    n_filas = len(factores_df)
+    tabla = np.tile(np.arange(n_filas_matriz, dtype=np.int64)[:, None], (1, len(regiones) + 1))
+    if n_filas == 0 or 'region' not in factores_df.columns:
+        return tabla
+
+    categorias = factores_df['category'].astype(str).str.lower()
+    grupos = pd.factorize(pd.Series(list(zip(categorias, factores_df['item'].astype(str).str.lower()))))[0]
+    region_fila = factores_df['region'].astype(str).to_numpy()
+    filas = np.arange(n_filas)
+
+    for r, region in enumerate(regiones):
+        prioridad = {nombre: i for i, nombre in enumerate(cadena_regiones(region, padres))}
+        rango = np.array([prioridad.get(nombre, np.inf) for nombre in region_fila])
+        # Mejor fila de cada grupo: menor rango y, a igualdad, la primera del archivo
+        orden = np.lexsort((filas, rango, grupos))
+        primeras = orden[np.r_[True, grupos[orden][1:] != grupos[orden][:-1]]]
+        mejor = np.full(grupos.max() + 1, -1, dtype=np.int64)
+        encontradas = np.isfinite(rango[primeras])
+        mejor[grupos[primeras][encontradas]] = primeras[encontradas]
+        tabla[:n_filas, r] = np.where(mejor[grupos] >= 0, mejor[grupos], filas)
+    return tabla
+
+def codigos_region(matriz_factores, regiones_partidas):
+    """Columna de la tabla regional de cada partida ('' = sin región, desconocida = Global)"""
+    regiones = matriz_factores['regiones']
+    valores = pd.Series(regiones_partidas, dtype=object).fillna('').astype(str)
+    codigos = pd.Index(regiones).get_indexer(valores).astype(np.int64)
+    codigos[(codigos < 0) & (valores != '').to_numpy()] = regiones.index(REGION_GLOBAL)
+    codigos[codigos < 0] = len(regiones)
+    return codigos
@@ -0,0 +1,172 @@
+"""
+Resultado de la huella de un producto como una tabla por partida
+Una fila por partida (las columnas de motor.construir_partidas y una por categoría
+de impacto); las vistas por etapa o por fuente, las principales contribuciones y
+la pestaña de resultados son agrupaciones de esa tabla, y a_desglose() reconstruye
+el diccionario anidado de calcular_emisiones_detalladas_completas para el código
+que aún lo usa
+UNA TABLA EN LUGAR DE DICCIONARIOS ANIDADOS
+"""
+
+import pandas as pd
+from utils.motor import COLUMNAS_PARTIDAS, ETAPAS, calcular_impactos, construir_partidas
+
+class ResultadoHuella:
+    """
+    Resultado de un producto respaldado por una tabla de columnas
+    (COLUMNAS_PARTIDAS + una columna por categoría de impacto; 'gwp' en kg CO₂e).
+    """
+    __slots__ = ('tabla', 'categorias', '_detalle')
+
+    def __init__(self, tabla_impactos, categorias=None):
+        if categorias is None:
+            categorias = [c for c in tabla_impactos.columns if c not in COLUMNAS_PARTIDAS and c != 'indice_factor']
+        self.categorias = list(categorias)
+        tabla = tabla_impactos[COLUMNAS_PARTIDAS + self.categorias].reset_index(drop=True)
+        tabla['etapa'] = pd.Categorical(tabla['etapa'], categories=ETAPAS)
+        self.tabla = tabla
+        self._detalle = None
+
+    def __repr__(self):
+        return f"ResultadoHuella({len(self.tabla)} partidas, {self.total():.6g} kg CO₂e)"
+
+    def a_tabla(self):
+        """La tabla del resultado (sin copiarla)"""
+        return self.tabla
+
+    def partidas(self):
+        """Las partidas del resultado (para compilar su modelo lineal, ver modelo_lineal.compilar_partidas)"""
+        return self.tabla[COLUMNAS_PARTIDAS]
+
+    def total(self, categoria='gwp'):
+        return float(self.tabla[categoria].sum())
+
+    def agrupar(self, *columnas, categoria=None):
+        """
+        Totales agrupados por las columnas indicadas, en el orden de aparición
+        (las etapas en el orden de ETAPAS).
+
+        Returns:
+            Series si se pide una categoría; DataFrame con todas si no
+        """
+        seleccion = self.categorias if categoria is None else categoria
+        return self.tabla.groupby(list(columnas), observed=True, sort=False)[seleccion].sum()
+
+    def por_etapa(self, categoria='gwp'):
+        """Total de cada etapa de ETAPAS (cero las que no tienen partidas); con una lista de categorías, un DataFrame"""
+        return self.tabla.groupby('etapa', observed=False)[categoria].sum().reindex(ETAPAS, fill_value=0.0)
+
+    def principales(self, n=10, por=('etapa', 'fuente'), categoria='gwp'):
+        """Las n mayores contribuciones agrupadas por 'por', con su porcentaje del total"""
+        totales = self.agrupar(*por, categoria=categoria).nlargest(n)
+        total = self.total(categoria)
+        return pd.DataFrame({categoria: totales, 'porcentaje': totales / total * 100 if total else 0.0})
+
+    def detalle_etapas(self):
+        """
+        Vistas de GWP del detalle de cada etapa, calculadas una sola vez por resultado:
+            - 'materias_primas': por material (índice), 'cantidad_kg', 'gwp_material',
+              'gwp_empaque' y 'gwp'
+            - 'empaques': una fila por partida ('fuente', 'subfuente' = material, 'masa_kg', 'gwp')
+            - 'transporte': una fila por ruta ('fuente' = origen, 'subfuente', 'ruta', 'item',
+              'distancia_km', 'masa_kg', 'gwp')
+            - 'procesamiento', 'distribucion', 'retail': Series con la huella por fuente
+            - 'fin_vida': por ('fuente', 'subfuente'), con 'masa_kg' y 'gwp'
+        """
+        if self._detalle is not None:
+            return self._detalle
+        columnas = ['fuente', 'subfuente', 'item', 'ruta', 'cantidad', 'masa_kg', 'gwp']
+        filas = {etapa: grupo[columnas].reset_index(drop=True)
+                 for etapa, grupo in self.tabla.groupby('etapa', observed=True, sort=False)}
+        vacia = self.tabla[columnas].iloc[0:0]
+        filas = {etapa: filas.get(etapa, vacia) for etapa in ETAPAS}
+
+        materias = filas['materias_primas']
+        es_material = materias['subfuente'] == 'material'
+        por_material = pd.DataFrame({
+            'fuente': materias['fuente'],
+            'cantidad_kg': materias['masa_kg'].where(es_material, 0.0),
+            'gwp_material': materias['gwp'].where(es_material, 0.0),
+            'gwp_empaque': materias['gwp'].where(materias['subfuente'] == 'empaque', 0.0)
+        }).groupby('fuente', sort=False).sum()
+        por_material['gwp'] = por_material['gwp_material'] + por_material['gwp_empaque']
+
+        # cantidad en t·km y masa en kg: distancia = cantidad × 1000 / masa
+        rutas = filas['transporte']
+        distancias = (rutas['cantidad'] * 1000.0).div(rutas['masa_kg'].where(rutas['masa_kg'] > 0))
+        rutas = rutas.drop(columns='cantidad').assign(distancia_km=distancias.fillna(0.0))
+
+        self._detalle = {
+            'materias_primas': por_material,
+            'empaques': filas['empaques'][['fuente', 'subfuente', 'masa_kg', 'gwp']],
+            'transporte': rutas[['fuente', 'subfuente', 'ruta', 'item', 'distancia_km', 'masa_kg', 'gwp']],
+            **{etapa: filas[etapa].groupby('fuente', sort=False)['gwp'].sum()
+               for etapa in ('procesamiento', 'distribucion', 'retail')},
+            'fin_vida': filas['fin_vida'].groupby(['fuente', 'subfuente'], sort=False)[['masa_kg', 'gwp']].sum()
+        }
+        return self._detalle
+
+    def a_desglose(self):
+        """
+        Compatibilidad: (emisiones_totales, desglose_detallado) con la forma de
+        calcular_emisiones_detalladas_completas. Los totales y las emisiones de
+        cada fuente y ruta son los de la tabla; los campos solo descriptivos que
+        no están en ella (porcentajes de fin de vida, detalles de retail) quedan
+        vacíos.
+        """
+        por_etapa = self.por_etapa()
+        detalle = self.detalle_etapas()
+        desglose = {etapa: {'total': float(por_etapa[etapa]), 'fuentes': {}} for etapa in ETAPAS}
+
+        desglose['materias_primas']['fuentes'] = {
+            producto: {
+                'emisiones_material': float(fila.gwp_material),
+                'emisiones_empaque': float(fila.gwp_empaque),
+                'total': float(fila.gwp),
+                'cantidad_kg': float(fila.cantidad_kg)
+            } for producto, fila in zip(detalle['materias_primas'].index, detalle['materias_primas'].itertuples())}
+
+        for nombre, grupo in detalle['empaques'].groupby('fuente', sort=False):
+            desglose['empaques']['fuentes'][nombre] = {
+                'emisiones': float(grupo['gwp'].sum()),
+                'peso_kg': float(grupo['masa_kg'].sum()),
+                'material': grupo['subfuente'].iloc[0]
+            }
+
+        transporte = {origen: {'emisiones': 0.0, 'detalle': []} for origen in ('materias_primas', 'empaques')}
+        for (origen, nombre), grupo in detalle['transporte'].groupby(['fuente', 'subfuente'], sort=False):
+            rutas = [{
+                'ruta': j + 1,
+                'origen': ruta.ruta.split(' → ')[0],
+                'destino': ruta.ruta.split(' → ')[-1],
+                'tipo_transporte': ruta.item,
+                'distancia_km': ruta.distancia_km,
+                'carga_kg': ruta.masa_kg,
+                'carga_ton': ruta.masa_kg / 1000.0,
+                'emisiones': ruta.gwp
+            } for j, ruta in enumerate(grupo.itertuples(index=False))]
+            emisiones = float(grupo['gwp'].sum())
+            clave_nombre = 'producto' if origen == 'materias_primas' else 'nombre'
+            transporte[origen]['detalle'].append({'id': len(transporte[origen]['detalle']) + 1,
+                                                  clave_nombre: nombre, 'total_emisiones': emisiones,
+                                                  'rutas': rutas})
+            transporte[origen]['emisiones'] += emisiones
+        desglose['transporte']['fuentes'] = transporte
+
+        for etapa in ('procesamiento', 'distribucion', 'retail'):
+            desglose[etapa]['fuentes'] = {fuente: float(valor) for fuente, valor in detalle[etapa].items()}
+
+        fin_vida = {'uso': {'energia': 0.0, 'agua': 0.0}, 'fin_vida': {}}
+        for (fuente, subfuente), fila in zip(detalle['fin_vida'].index, detalle['fin_vida'].itertuples()):
+            if fuente == 'uso':
+                fin_vida['uso'][subfuente] = float(fila.gwp)
+            else:
+                fin_vida['fin_vida'][subfuente] = {'peso_kg': float(fila.masa_kg), 'emisiones': float(fila.gwp),
+                                                   'porcentajes': {}}
+        desglose['fin_vida']['fuentes'] = fin_vida
+
+        return float(por_etapa.sum()), desglose
+
+def calcular_resultado(datos, factores_df, matriz_factores=None):
+    """Resultado de un producto (estructura de session_state) en una sola pasada del motor"""
+    return ResultadoHuella(calcular_impactos(construir_partidas(datos, factores_df), factores_df, matriz_factores))
@@ -0,0 +1,130 @@
+"""
+Análisis de sensibilidad global sobre el modelo lineal compilado
+Índices de Sobol (muestreo de Saltelli) y efectos elementales de Morris
+para las cantidades de cada partida y los factores usados
+TODAS LAS MUESTRAS EN EVALUACIONES POR LOTES
+"""
+
+import numpy as np
+import pandas as pd
+from utils.modelo_lineal import evaluar_lote
+
+# Variación relativa por defecto de cada entrada (±10 % alrededor del valor actual)
+RANGO_RELATIVO_DEFECTO = 0.1
+
+def entradas_modelo(modelo, rango_cantidades=RANGO_RELATIVO_DEFECTO, rango_factores=RANGO_RELATIVO_DEFECTO):
+    """
+    Entradas del análisis: una por partida (cantidad) y una por factor usado.
+
+    Los rangos pueden ser un escalar o un array por partida / por factor.
+
+    Returns:
+        DataFrame con 'entrada', 'tipo', 'minimo' y 'maximo' (multiplicadores
+        sobre el valor actual)
+    """
+    partidas = modelo['partidas']
+    n_partidas = len(partidas)
+    n_factores = len(modelo['ids_factor'])
+    rangos = np.concatenate([
+        np.broadcast_to(np.asarray(rango_cantidades, dtype=float), (n_partidas,)),
+        np.broadcast_to(np.asarray(rango_factores, dtype=float), (n_factores,))
+    ])
+    nombres = partidas['etapa'] + '/' + partidas['fuente'].astype(str) + '/' + partidas['subfuente'].astype(str)
+    item = partidas['item'].astype(str)
+    redundante = (item == '') | (item == partidas['subfuente'].astype(str)) | (item == partidas['fuente'].astype(str))
+    nombres = nombres.where(redundante, nombres + ' (' + item + ')')
+    repeticion = nombres.groupby(nombres).cumcount()
+    nombres = nombres.where(repeticion == 0, nombres + ' #' + (repeticion + 1).astype(str)).tolist()
+    return pd.DataFrame({
+        'entrada': nombres + list(modelo['etiquetas_factor']),
+        'tipo': ['cantidad'] * n_partidas + ['factor'] * n_factores,
+        'minimo': 1.0 - rangos,
+        'maximo': 1.0 + rangos
+    })
+
+def _evaluar_unitarias(modelo, entradas, muestras, categoria):
+    """Evalúa muestras del hipercubo unitario (S × D) escaladas a los rangos de las entradas"""
+    minimo = entradas['minimo'].to_numpy()
+    multiplicadores = minimo + muestras * (entradas['maximo'].to_numpy() - minimo)
+    n_partidas = len(modelo['cantidades'])
+    return evaluar_lote(modelo, multiplicadores[:, :n_partidas], multiplicadores[:, n_partidas:], categoria)
+
+def indices_sobol(modelo, n_muestras=1024, rango_cantidades=RANGO_RELATIVO_DEFECTO,
+                  rango_factores=RANGO_RELATIVO_DEFECTO, categoria='gwp', semilla=None):
+    """
+    Índices de Sobol de primer orden (S1) y totales (ST) de cada entrada.
+
+    Usa el esquema de Saltelli con las matrices A, B y A_B^(i): n_muestras × (D + 2)
+    evaluaciones, con los estimadores de Saltelli (2010) para S1 y de Jansen para ST.
+    Las entradas son uniformes e independientes dentro de su rango.
+
+    Returns:
+        DataFrame indexado por entrada con 'tipo', 'S1' y 'ST', ordenado por ST;
+        el número de evaluaciones queda en attrs['evaluaciones']
+    """
+    entradas = entradas_modelo(modelo, rango_cantidades, rango_factores)
+    d = len(entradas)
+    rng = np.random.default_rng(semilla)
+    a = rng.random((n_muestras, d))
+    b = rng.random((n_muestras, d))
+
+    # Salidas centradas: con ±10 % la media domina y el estimador de S1 pierde precisión
+    y_a = _evaluar_unitarias(modelo, entradas, a, categoria)
+    y_b = _evaluar_unitarias(modelo, entradas, b, categoria)
+    media = np.concatenate([y_a, y_b]).mean()
+    y_a, y_b = y_a - media, y_b - media
+    varianza = np.var(np.concatenate([y_a, y_b]))
+
+    s1 = np.zeros(d)
+    st = np.zeros(d)
+    if varianza > 0:
+        for i in range(d):
+            a_b = a.copy()
+            a_b[:, i] = b[:, i]
+            y_ab = _evaluar_unitarias(modelo, entradas, a_b, categoria) - media
+            s1[i] = np.mean(y_b * (y_ab - y_a)) / varianza
+            st[i] = 0.5 * np.mean((y_a - y_ab) ** 2) / varianza
+
+    resultado = pd.DataFrame({'tipo': entradas['tipo'].to_numpy(), 'S1': s1, 'ST': st},
+                             index=pd.Index(entradas['entrada'], name='entrada'))
+    resultado.attrs['evaluaciones'] = n_muestras * (d + 2)
+    return resultado.sort_values('ST', ascending=False)
+
+def efectos_morris(modelo, n_trayectorias=50, niveles=4, rango_cantidades=RANGO_RELATIVO_DEFECTO,
+                   rango_factores=RANGO_RELATIVO_DEFECTO, categoria='gwp', semilla=None):
+    """
+    Efectos elementales de Morris: cribado barato con n_trayectorias × (D + 1)
+    evaluaciones, todas las trayectorias en un solo lote.
+
+    Returns:
+        DataFrame indexado por entrada con 'tipo', 'mu', 'mu_star' y 'sigma'
+        (efectos en unidades del impacto por el rango completo de la entrada),
+        ordenado por mu_star
+    """
+    entradas = entradas_modelo(modelo, rango_cantidades, rango_factores)
+    d = len(entradas)
+    rng = np.random.default_rng(semilla)
+    delta = niveles / (2 * (niveles - 1))
+
+    # Punto base en la rejilla de niveles que permite avanzar +delta sin salir de [0, 1]
+    base = rng.integers(0, niveles // 2, size=(n_trayectorias, 1, d)) / (niveles - 1)
+    orden = np.argsort(rng.random((n_trayectorias, d)), axis=1)
+    pasos = np.zeros((n_trayectorias, d + 1, d))
+    filas = np.arange(n_trayectorias)
+    for k in range(d):
+        pasos[:, k + 1] = pasos[:, k]
+        pasos[filas, k + 1, orden[:, k]] = delta
+    puntos = base + pasos
+
+    y = _evaluar_unitarias(modelo, entradas, puntos.reshape(-1, d), categoria).reshape(n_trayectorias, d + 1)
+    efectos = np.empty((n_trayectorias, d))
+    efectos[filas[:, None], orden] = np.diff(y, axis=1) / delta
+
+    resultado = pd.DataFrame({
+        'tipo': entradas['tipo'].to_numpy(),
+        'mu': efectos.mean(axis=0),
+        'mu_star': np.abs(efectos).mean(axis=0),
+        'sigma': efectos.std(axis=0, ddof=1) if n_trayectorias > 1 else np.zeros(d)
+    }, index=pd.Index(entradas['entrada'], name='entrada'))
+    resultado.attrs['evaluaciones'] = n_trayectorias * (d + 1)
+    return resultado.sort_values('mu_star', ascending=False)
@@ -0,0 +1,203 @@
+"""
+Servicio HTTP local de cálculo de huella (aiohttp)
+POST /footprint con los datos de un producto (misma estructura que session_state);
+las peticiones que llegan en la misma ventana de milisegundos se evalúan como un
+solo lote vectorizado. GET /metrics informa peticiones/s e histogramas de latencia
+USO: python -m utils.servicio --puerto 8080
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+import numpy as np
+from utils.motor import ETAPAS, construir_partidas, leer_factores, preparar_matriz_factores, totales_lote
+
+try:
+    from aiohttp import web
+except ImportError:  # dependencia opcional: solo la necesita el servicio
+    web = None
+
+RUTA_FACTORES_DEFECTO = os.path.join(os.path.dirname(__file__), '..', 'data', 'factors.csv')
+
+VENTANA_LOTE_MS = 5
+MAX_LOTE = 256
+
+# Límites superiores (ms) de las cubetas del histograma de latencia
+CUBETAS_LATENCIA_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+CUBETAS_LOTE = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+# Ventana (s) para las peticiones por segundo recientes
+VENTANA_TASA_S = 60
+
+def calcular_lote(productos, factores_df, matriz_factores):
+    """
+    Huella de varios productos en una sola evaluación.
+
+    Returns:
+        Lista con un resultado por producto: {'total_kgCO2e', 'etapas', 'impactos'}
+        o {'error'} si sus datos no se pudieron interpretar
+    """
+    partidas, errores = [], {}
+    for i, datos in enumerate(productos):
+        try:
+            partidas.append(construir_partidas(datos, factores_df))
+        except (AttributeError, TypeError, ValueError, KeyError) as e:
+            errores[i] = f"Datos de producto no válidos: {e}"
+            partidas.append(construir_partidas({}, factores_df))
+
+    totales = totales_lote(partidas, factores_df, matriz_factores)
+    categorias = list(matriz_factores['categorias'])
+    j = categorias.index('gwp')
+    resultados = []
+    for i, por_etapa in enumerate(totales):
+        if i in errores:
+            resultados.append({'error': errores[i]})
+            continue
+        resultados.append({
+            'total_kgCO2e': float(por_etapa[:, j].sum()),
+            'etapas': {etapa: {'total': float(por_etapa[e, j])} for e, etapa in enumerate(ETAPAS)},
+            'impactos': {clave: float(por_etapa[:, k].sum()) for k, clave in enumerate(categorias)}
+        })
+    return resultados
+
+def _nuevas_metricas():
+    return {
+        'inicio': time.time(),
+        'peticiones': 0,
+        'errores': 0,
+        'lotes': 0,
+        'recientes': deque(),
+        'latencia_ms': np.zeros(len(CUBETAS_LATENCIA_MS) + 1, dtype=np.int64),
+        'suma_latencia_ms': 0.0,
+        'tamano_lote': np.zeros(len(CUBETAS_LOTE) + 1, dtype=np.int64)
+    }
+
+def _registrar_peticion(metricas, latencia_ms, error=False):
+    ahora = time.time()
+    metricas['peticiones'] += 1
+    metricas['errores'] += int(error)
+    metricas['suma_latencia_ms'] += latencia_ms
+    metricas['latencia_ms'][np.searchsorted(CUBETAS_LATENCIA_MS, latencia_ms)] += 1
+    metricas['recientes'].append(ahora)
+    while metricas['recientes'] and metricas['recientes'][0] < ahora - VENTANA_TASA_S:
+        metricas['recientes'].popleft()
+
+def resumen_metricas(metricas):
+    """Métricas del servicio como diccionario serializable"""
+    ahora = time.time()
+    activo_s = max(ahora - metricas['inicio'], 1e-9)
+    recientes = sum(1 for t in metricas['recientes'] if t >= ahora - VENTANA_TASA_S)
+    etiquetas_latencia = [f"<={c}" for c in CUBETAS_LATENCIA_MS] + [f">{CUBETAS_LATENCIA_MS[-1]}"]
+    etiquetas_lote = [f"<={c}" for c in CUBETAS_LOTE] + [f">{CUBETAS_LOTE[-1]}"]
+    return {
+        'activo_s': activo_s,
+        'peticiones': metricas['peticiones'],
+        'errores': metricas['errores'],
+        'lotes': metricas['lotes'],
+        'peticiones_por_s': metricas['peticiones'] / activo_s,
+        'peticiones_por_s_recientes': recientes / min(activo_s, VENTANA_TASA_S),
+        'latencia_media_ms': metricas['suma_latencia_ms'] / metricas['peticiones'] if metricas['peticiones'] else 0.0,
+        'histograma_latencia_ms': dict(zip(etiquetas_latencia, metricas['latencia_ms'].tolist())),
+        'histograma_tamano_lote': dict(zip(etiquetas_lote, metricas['tamano_lote'].tolist()))
+    }
+
+async def _vaciar_lote(estado):
+    """Evalúa todas las peticiones pendientes como un lote"""
+    if estado['temporizador'] is not None:
+        estado['temporizador'].cancel()
+        estado['temporizador'] = None
+    pendientes, estado['pendientes'] = estado['pendientes'], []
+    if not pendientes:
+        return
+
+    metricas = estado['metricas']
+    metricas['lotes'] += 1
+    metricas['tamano_lote'][np.searchsorted(CUBETAS_LOTE, len(pendientes))] += 1
+    loop = asyncio.get_running_loop()
+    try:
+        resultados = await loop.run_in_executor(
+            None, calcular_lote, [datos for datos, _ in pendientes], estado['factores'], estado['matriz_factores'])
+    except Exception as e:
+        for _, futuro in pendientes:
+            if not futuro.done():
+                futuro.set_exception(e)
+        return
+    for (_, futuro), resultado in zip(pendientes, resultados):
+        if not futuro.done():
+            futuro.set_result(resultado)
+
+async def calcular_agrupado(estado, datos):
+    """
+    Encola un producto y espera a que se evalúe su lote. El lote se evalúa al
+    cumplirse la ventana desde la primera petición pendiente o al llenarse.
+    """
+    loop = asyncio.get_running_loop()
+    futuro = loop.create_future()
+    estado['pendientes'].append((datos, futuro))
+    if len(estado['pendientes']) >= estado['max_lote']:
+        asyncio.ensure_future(_vaciar_lote(estado))
+    elif estado['temporizador'] is None:
+        estado['temporizador'] = loop.call_later(
+            estado['ventana_ms'] / 1000, lambda: asyncio.ensure_future(_vaciar_lote(estado)))
+    return await futuro
+
+def crear_estado(factores_df, ventana_ms=VENTANA_LOTE_MS, max_lote=MAX_LOTE):
+    """Estado del servicio: factores preparados en memoria, cola del lote y métricas"""
+    return {
+        'factores': factores_df,
+        'matriz_factores': preparar_matriz_factores(factores_df),
+        'ventana_ms': ventana_ms,
+        'max_lote': max_lote,
+        'pendientes': [],
+        'temporizador': None,
+        'metricas': _nuevas_metricas()
+    }
+
+def crear_aplicacion(factores_df=None, ruta_factores=RUTA_FACTORES_DEFECTO, ventana_ms=VENTANA_LOTE_MS,
+                     max_lote=MAX_LOTE):
+    """
+    Crea la aplicación aiohttp con la tabla de factores ya cargada y preparada en
+    memoria (se comparte entre todas las peticiones).
+    """
+    if web is None:
+        raise ImportError("El servicio HTTP necesita aiohttp: pip install aiohttp")
+    estado = crear_estado(leer_factores(ruta_factores) if factores_df is None else factores_df,
+                          ventana_ms, max_lote)
+
+    async def manejar_huella(request):
+        inicio = time.perf_counter()
+        try:
+            datos = await request.json()
+        except ValueError:
+            _registrar_peticion(estado['metricas'], (time.perf_counter() - inicio) * 1000, error=True)
+            return web.json_response({'error': 'El cuerpo debe ser JSON'}, status=400)
+
+        resultado = await calcular_agrupado(estado, datos if isinstance(datos, dict) else None)
+        error = 'error' in resultado
+        _registrar_peticion(estado['metricas'], (time.perf_counter() - inicio) * 1000, error=error)
+        return web.json_response(resultado, status=400 if error else 200)
+
+    async def manejar_metricas(request):
+        return web.json_response(resumen_metricas(estado['metricas']))
+
+    app = web.Application()
+    app.router.add_post('/footprint', manejar_huella)
+    app.router.add_get('/metrics', manejar_metricas)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio local de cálculo de huella de carbono")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    parser.add_argument('--factores', default=RUTA_FACTORES_DEFECTO)
+    parser.add_argument('--ventana-ms', type=float, default=VENTANA_LOTE_MS)
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE)
+    argumentos = parser.parse_args()
+    web.run_app(crear_aplicacion(ruta_factores=argumentos.factores, ventana_ms=argumentos.ventana_ms,
+                                 max_lote=argumentos.max_lote),
+                host=argumentos.host, port=argumentos.puerto)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Base de datos versionada de tablas de factores (SQLite)
+Cada tabla se guarda una sola vez, identificada por el hash de su contenido, junto
+con un hash por fila que permite comparar versiones sin volver a leerlas
+CADA RESULTADO SABE CON QUÉ FACTORES SE CALCULÓ
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import zlib
+import pandas as pd
+from utils.motor import claves_filas_factores, detectar_categorias_impacto, leer_factores, version_factores
+
+RUTA_HISTORIAL_DEFECTO = os.path.join(os.path.dirname(__file__), '..', 'data', 'historial_factores.sqlite')
+
+def abrir_historial(ruta=RUTA_HISTORIAL_DEFECTO):
+    """Abre (o crea) el historial de versiones de factores"""
+    if ruta != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    conexion = sqlite3.connect(ruta, check_same_thread=False)
+    conexion.executescript("""
+        CREATE TABLE IF NOT EXISTS versiones (
+            version TEXT PRIMARY KEY,
+            fecha TEXT NOT NULL,
+            origen TEXT NOT NULL,
+            n_filas INTEGER NOT NULL,
+            contenido BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS filas (
+            version TEXT NOT NULL,
+            fila TEXT NOT NULL,
+            hash_valores TEXT NOT NULL,
+            gwp REAL,
+            PRIMARY KEY (version, fila)
+        );
+    """)
+    conexion.commit()
+    return {'conexion': conexion, 'bloqueo': threading.Lock()}
+
+def hashes_filas(factores_df):
+    """
+    Hash de los valores de impacto de cada fila. Solo cuentan las celdas con dato,
+    así que añadir una categoría vacía no cambia el hash de las filas existentes
+    (misma regla que diferencia_factores).
+    """
+    texto = pd.Series('', index=factores_df.index)
+    for meta in detectar_categorias_impacto(factores_df).values():
+        valores = pd.to_numeric(factores_df[meta['columna']], errors='coerce').astype(float)
+        texto = texto + (meta['columna'] + '=' + valores.astype(str) + ';').where(valores.notna(), '')
+    return [hashlib.blake2b(t.encode('utf-8'), digest_size=8).hexdigest() for t in texto]
+
+def registrar_version(historial, factores_df, origen=''):
+    """
+    Guarda una tabla de factores en el historial si su contenido es nuevo.
+
+    Returns:
+        Versión (hash del contenido) de la tabla
+    """
+    version = version_factores(factores_df)
+    with historial['bloqueo']:
+        conexion = historial['conexion']
+        if conexion.execute("SELECT 1 FROM versiones WHERE version = ?", (version,)).fetchone():
+            return version
+        contenido = zlib.compress(factores_df.to_csv(index=False).encode('utf-8'))
+        conexion.execute("INSERT INTO versiones VALUES (?, ?, ?, ?, ?)",
+                         (version, pd.Timestamp.now().isoformat(timespec='seconds'), origen,
+                          len(factores_df), contenido))
+        gwp = pd.to_numeric(factores_df['factor_kgCO2e_per_unit'], errors='coerce')
+        conexion.executemany("INSERT INTO filas VALUES (?, ?, ?, ?)", zip(
+            [version] * len(factores_df), claves_filas_factores(factores_df)[:len(factores_df)],
+            hashes_filas(factores_df), [None if pd.isna(v) else float(v) for v in gwp]))
+        conexion.commit()
+    return version
+
+def cargar_factores_versionados(ruta, historial, origen=None):
+    """Lee un archivo de factores y lo registra en el historial: (factores_df, versión)"""
+    factores = leer_factores(ruta)
+    return factores, registrar_version(historial, factores, origen if origen is not None else str(ruta))
+
+def cargar_version(historial, version):
+    """Tabla de factores de una versión del historial"""
+    with historial['bloqueo']:
+        fila = historial['conexion'].execute(
+            "SELECT contenido FROM versiones WHERE version = ?", (version,)).fetchone()
+    if fila is None:
+        raise KeyError(f"Versión de factores no encontrada: {version}")
+    return leer_factores(io.BytesIO(zlib.decompress(fila[0])))
+
+def listar_versiones(historial):
+    """Versiones registradas, de la más reciente a la más antigua"""
+    with historial['bloqueo']:
+        return pd.read_sql_query(
+            "SELECT version, fecha, origen, n_filas FROM versiones ORDER BY fecha DESC, rowid DESC",
+            historial['conexion'])
+
+def diferencia_versiones(historial, anterior, nueva):
+    """
+    Diferencia fila a fila entre dos versiones usando los hashes guardados (sin
+    cargar las tablas). Mismo formato que diferencia_factores.
+    """
+    with historial['bloqueo']:
+        conexion = historial['conexion']
+        for version in (anterior, nueva):
+            if not conexion.execute("SELECT 1 FROM versiones WHERE version = ?", (version,)).fetchone():
+                raise KeyError(f"Versión de factores no encontrada: {version}")
+        cambios = pd.read_sql_query("""
+            SELECT a.fila, CASE WHEN n.fila IS NULL THEN 'eliminada' ELSE 'modificada' END AS cambio,
+                   a.gwp AS gwp_anterior, n.gwp AS gwp_nuevo
+            FROM filas a LEFT JOIN filas n ON n.version = ? AND n.fila = a.fila
+            WHERE a.version = ? AND (n.fila IS NULL OR n.hash_valores != a.hash_valores)
+            UNION ALL
+            SELECT n.fila, 'nueva', NULL, n.gwp
+            FROM filas n LEFT JOIN filas a ON a.version = ? AND a.fila = n.fila
+            WHERE n.version = ? AND a.fila IS NULL
+        """, conexion, params=(nueva, anterior, anterior, nueva))
+    return cambios.set_index('fila')
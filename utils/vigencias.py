@@ -0,0 +1,76 @@
+"""
+Vigencia anual de los factores de emisión
+Cada fila de factors.csv vale desde su año hasta el año de la siguiente fila del
+mismo ítem y región; antes del primer año disponible se usa la fila más antigua
+FACTOR VIGENTE POR AÑO (BÚSQUEDA BINARIA SOBRE CLAVES ORDENADAS)
+"""
+
+import numpy as np
+import pandas as pd
+
+def grupos_vigencia(factores_df):
+    """Grupo (categoría, ítem, región) de cada fila: las filas de un grupo son versiones anuales"""
+    columnas = [factores_df['category'].astype(str).str.lower(), factores_df['item'].astype(str).str.lower()]
+    if 'region' in factores_df.columns:
+        columnas.append(factores_df['region'].astype(str))
+    return pd.factorize(pd.Series(list(zip(*columnas)), dtype=object))[0].astype(np.int64)
+
+def anios_factores(factores_df):
+    """Año de cada fila de factores (0 si no hay columna 'year' o no es numérico)"""
+    if 'year' not in factores_df.columns:
+        return np.zeros(len(factores_df), dtype=np.int64)
+    return pd.to_numeric(factores_df['year'], errors='coerce').fillna(0).astype(np.int64).to_numpy()
+
+def tabla_vigencias(factores_df):
+    """
+    Índice de vigencias: claves grupo × escala + año ordenadas (para búsqueda
+    binaria), la fila de cada clave y la posición de la primera clave de cada
+    grupo. Si un grupo repite año vale la primera fila del archivo.
+    """
+    n_filas = len(factores_df)
+    grupos = grupos_vigencia(factores_df)
+    anios = anios_factores(factores_df)
+    escala = int(max(anios.max(initial=0), 0)) + 1
+    if n_filas == 0:
+        return {'grupos': grupos, 'escala': escala, 'claves': np.zeros(0, dtype=np.int64),
+                'filas': np.zeros(0, dtype=np.int64), 'inicio_grupo': np.zeros(0, dtype=np.int64)}
+
+    orden = np.lexsort((np.arange(n_filas), anios, grupos))
+    claves = grupos[orden] * escala + np.maximum(anios[orden], 0)
+    primeras = np.r_[True, claves[1:] != claves[:-1]]
+    orden, claves = orden[primeras], claves[primeras]
+    return {
+        'grupos': grupos,
+        'escala': escala,
+        'claves': claves,
+        'filas': orden,
+        'inicio_grupo': np.searchsorted(claves // escala, np.arange(grupos.max() + 1))
+    }
+
+def resolver_anios(vigencias, filas, anios):
+    """
+    Fila vigente en el año pedido para cada fila de la matriz de factores
+    (vectorizado). Las filas por defecto y las partidas sin año (0) no cambian.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    anios = np.broadcast_to(np.asarray(anios, dtype=np.int64), filas.shape)
+    resultado = filas.copy()
+    aplicar = (filas < len(vigencias['grupos'])) & (anios > 0)
+    if not aplicar.any():
+        return resultado
+
+    grupos = vigencias['grupos'][filas[aplicar]]
+    escala = vigencias['escala']
+    posiciones = np.searchsorted(vigencias['claves'], grupos * escala + np.minimum(anios[aplicar], escala - 1),
+                                 side='right') - 1
+    # Año anterior a la primera versión del grupo: se usa la más antigua
+    posiciones = np.maximum(posiciones, vigencias['inicio_grupo'][grupos])
+    resultado[aplicar] = vigencias['filas'][posiciones]
+    return resultado
+
+def factores_del_anio(factores_df, anio):
+    """Tabla de factores con solo la fila vigente en 'anio' de cada ítem y región"""
+    if not anio or len(factores_df) == 0:
+        return factores_df
+    filas = resolver_anios(tabla_vigencias(factores_df), np.arange(len(factores_df)), int(anio))
+    return factores_df.iloc[np.unique(filas)]